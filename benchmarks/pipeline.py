@@ -0,0 +1,390 @@
+"""
+Benchmarks for the load -> analyze -> render pipeline on synthetic data
+
+Series of 1k to 10M bars are generated with providers.synthetic_ohlcv for
+each timeframe, then every stage is timed (best and median of --repeat
+runs) and run once more under tracemalloc for its peak memory. Chart
+stages also report the size of the serialized figure. Before timing,
+TrendEngine is checked against calculate_trend on a series with missing
+closes; any mismatch fails the run.
+
+    python -m benchmarks.pipeline
+    python -m benchmarks.pipeline --sizes 1000 100000 --timeframes 1m 1d
+    python -m benchmarks.pipeline --baseline benchmarks/baseline.json
+
+Results are written as JSON (default benchmarks/results/pipeline-<time>.json).
+With --baseline, every matching entry is compared and the run exits with
+status 1 when any stage got slower, or used more memory or payload bytes,
+by more than --threshold. --update-baseline writes this run as the new
+baseline instead.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from modules.data_store import OHLCVStore
+from modules.downsampling import DEFAULT_PIXEL_WIDTH
+from modules.indicators import TrendEngine
+from modules.providers import session_timestamps, synthetic_ohlcv
+from modules.resampler import INTRADAY_TIMEFRAMES, resample_ohlcv
+from modules.technical_analysis import calculate_support_resistance, calculate_trend
+from modules.trendlines import detect_trendlines
+from modules.visualization import create_price_chart
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+DEFAULT_TIMEFRAMES = ['1m', '5m', '1h', '1d']
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 1.25
+
+# Full-detail charts send every bar to the browser (100k bars take tens of
+# seconds); beyond this many bars only the screen-resolution chart is measured
+DEFAULT_FULL_DETAIL_MAX = 10_000
+
+# Bars in the throwaway series run first to pay for imports and warm-up
+WARMUP_BARS = 500
+
+# Timing differences below this are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.005
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Synthetic prices are anchored at this date; series run forward from it
+SERIES_ORIGIN = pd.Timestamp('2000-01-03')
+# Stay clear of the end of the datetime64[ns] range
+SERIES_LIMIT = pd.Timestamp('2260-01-01')
+CHUNK_DAYS = 3650
+
+METRICS = ['seconds', 'peak_bytes', 'payload_bytes']
+
+# Bars in the series TrendEngine is checked on, and every how many bars a
+# close is missing
+PARITY_BARS = 2_000
+PARITY_GAP_EVERY = 97
+
+
+def bars_per_day(timeframe: str) -> float:
+    """
+    Average bars per calendar day, measured on the synthetic session grid
+    """
+    sample = session_timestamps(SERIES_ORIGIN, SERIES_ORIGIN + pd.Timedelta(days=364), timeframe)
+    return len(sample) / 364
+
+
+def synthetic_series(n_bars: int, timeframe: str, symbol: str = "BENCH") -> pd.DataFrame:
+    """
+    n_bars consecutive synthetic bars starting at SERIES_ORIGIN
+
+    Generated in chunks of CHUNK_DAYS so the intermediate minute grids stay
+    small; bars are hashed from their timestamps, so chunking does not
+    change the result. Raises ValueError when the series would not fit in
+    the datetime64[ns] range.
+    """
+    days_needed = n_bars / bars_per_day(timeframe)
+    if days_needed * 1.01 > (SERIES_LIMIT - SERIES_ORIGIN).days:
+        raise ValueError(f"{n_bars} {timeframe} bars span {days_needed / 365.25:,.0f} years, "
+                         f"past {SERIES_LIMIT.date()}")
+
+    chunks = []
+    collected = 0
+    start = SERIES_ORIGIN
+    while collected < n_bars:
+        end = min(start + pd.Timedelta(days=CHUNK_DAYS), SERIES_LIMIT)
+        chunk = synthetic_ohlcv(symbol, start.to_pydatetime(), end.to_pydatetime(), timeframe)
+        chunks.append(chunk)
+        collected += len(chunk)
+        start = end
+    return pd.concat(chunks, ignore_index=True).iloc[:n_bars].reset_index(drop=True)
+
+
+def measure(fn, repeat: int = DEFAULT_REPEAT, trace_memory: bool = True):
+    """
+    Run fn repeat times and once more under tracemalloc
+
+    Returns (last result, metrics). Timed runs are kept separate from the
+    traced one because tracing slows allocation-heavy code considerably.
+    """
+    times = []
+    result = None
+    for _ in range(max(1, repeat)):
+        result = None
+        gc.collect()
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+
+    metrics = {
+        'seconds': min(times),
+        'median_seconds': statistics.median(times),
+        'runs': len(times)
+    }
+    if trace_memory:
+        result = None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = fn()
+            metrics['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, metrics
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    import plotly
+    import scipy
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scipy': scipy.__version__,
+        'plotly': plotly.__version__,
+        'git_commit': _git_commit()
+    }
+
+
+def trend_parity(timeframe: str, n_bars: int = PARITY_BARS) -> list:
+    """
+    Series where TrendEngine and calculate_trend disagree, on a synthetic
+    series with single missing closes, one longer run of them and a few
+    zero closes
+
+    Returns the names of the mismatching series ('trend' for the label).
+    """
+    df = synthetic_series(n_bars, timeframe)
+    close = df['Close'].to_numpy(dtype=np.float64, copy=True)
+    close[::PARITY_GAP_EVERY] = np.nan
+    close[n_bars // 2:n_bars // 2 + 5] = np.nan
+    close[n_bars // 3::n_bars // 4] = 0.0
+    df['Close'] = close
+
+    expected = calculate_trend(df, timeframe)
+    actual = TrendEngine.from_frame(df, timeframe).result(index=df.index)
+    mismatches = []
+    for name in ('sma_fast', 'sma_slow', 'volatility'):
+        a = expected[name].to_numpy()
+        b = actual[name].to_numpy()
+        if not np.array_equal(np.isnan(a), np.isnan(b)) or \
+                not np.allclose(a[~np.isnan(a)], b[~np.isnan(b)], rtol=1e-9, atol=1e-12):
+            mismatches.append(name)
+    if expected['trend'] != actual['trend']:
+        mismatches.append('trend')
+    return mismatches
+
+
+def benchmark_series(df: pd.DataFrame, timeframe: str, repeat: int = DEFAULT_REPEAT,
+                     full_detail_max: int = DEFAULT_FULL_DETAIL_MAX, source: pd.DataFrame = None,
+                     trace_memory: bool = True):
+    """
+    Time every pipeline stage on one series
+
+    source, if given, is the base-interval series the timeframe is resampled
+    from. Yields one result dict per stage.
+    """
+    bars = len(df)
+
+    def entry(stage, metrics, **extra):
+        return {'stage': stage, 'timeframe': timeframe, 'bars': bars, **metrics, **extra}
+
+    # Storage: one full write, then a memory-mapped load of everything
+    with tempfile.TemporaryDirectory() as root:
+        store = OHLCVStore(root)
+        ranges = [(df['Date'].iloc[0].to_pydatetime().replace(tzinfo=None),
+                   df['Date'].iloc[-1].to_pydatetime().replace(tzinfo=None))]
+
+        def write():
+            store.clear("BENCH", timeframe)
+            store.append_ranges("BENCH", timeframe, df, ranges)
+
+        _, metrics = measure(write, repeat, trace_memory)
+        yield entry('store_write', metrics)
+        _, metrics = measure(lambda: store.load("BENCH", timeframe), repeat, trace_memory)
+        yield entry('store_load', metrics)
+
+    if source is not None:
+        _, metrics = measure(lambda: resample_ohlcv(source, timeframe), repeat, trace_memory)
+        yield entry('resample', metrics, source_bars=len(source))
+
+    support_resistance, metrics = measure(lambda: calculate_support_resistance(df, timeframe), repeat, trace_memory)
+    yield entry('support_resistance', metrics)
+    trend_data, metrics = measure(lambda: calculate_trend(df, timeframe), repeat, trace_memory)
+    yield entry('trend', metrics)
+    trendlines, metrics = measure(lambda: detect_trendlines(df, support_resistance), repeat, trace_memory)
+    yield entry('trendlines', metrics)
+
+    # Screen resolution only differs from full detail once bars are aggregated
+    modes = [('screen', DEFAULT_PIXEL_WIDTH)] if bars > DEFAULT_PIXEL_WIDTH else []
+    if bars <= full_detail_max:
+        modes.append(('full', None))
+    for mode, max_points in modes:
+        fig, metrics = measure(
+            lambda: create_price_chart(df, "BENCH", support_resistance, trend_data, timeframe,
+                                       trendlines=trendlines, max_points=max_points),
+            repeat, trace_memory
+        )
+        yield entry('chart', metrics, mode=mode)
+        payload, metrics = measure(fig.to_json, repeat, trace_memory)
+        yield entry('chart_json', metrics, mode=mode, payload_bytes=len(payload.encode()))
+
+
+def run(sizes=DEFAULT_SIZES, timeframes=DEFAULT_TIMEFRAMES, repeat: int = DEFAULT_REPEAT,
+        full_detail_max: int = DEFAULT_FULL_DETAIL_MAX, trace_memory: bool = True, report=print) -> dict:
+    """
+    Benchmark every (size, timeframe) combination and return the result document
+    """
+    document = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'config': {
+            'sizes': list(sizes),
+            'timeframes': list(timeframes),
+            'repeat': repeat,
+            'full_detail_max': full_detail_max,
+            'trace_memory': trace_memory
+        },
+        'results': [],
+        'skipped': [],
+        'parity_failures': []
+    }
+
+    for timeframe in timeframes:
+        mismatches = trend_parity(timeframe)
+        if mismatches:
+            document['parity_failures'].append({'timeframe': timeframe, 'series': mismatches})
+            report(f"PARITY {timeframe:>4}: TrendEngine differs from calculate_trend in {', '.join(mismatches)}")
+
+    for _ in benchmark_series(synthetic_series(WARMUP_BARS, '1d'), '1d', repeat=1, trace_memory=False):
+        pass
+
+    for n_bars in sizes:
+        for timeframe in timeframes:
+            try:
+                df = synthetic_series(n_bars, timeframe)
+                # Derived timeframes are resampled from their base interval
+                base = '1m' if timeframe in INTRADAY_TIMEFRAMES else '1d'
+                source = None
+                if base != timeframe:
+                    bars_ratio = bars_per_day(base) / bars_per_day(timeframe)
+                    source = synthetic_series(int(n_bars * bars_ratio), base)
+            except ValueError as e:
+                document['skipped'].append({'timeframe': timeframe, 'bars': n_bars, 'reason': str(e)})
+                report(f"skip {timeframe:>4} {n_bars:>10,}: {e}")
+                continue
+
+            for result in benchmark_series(df, timeframe, repeat, full_detail_max, source, trace_memory):
+                document['results'].append(result)
+                report(format_result(result))
+            del df, source
+    return document
+
+
+def format_result(result: dict) -> str:
+    stage = result['stage'] + (f"[{result['mode']}]" if 'mode' in result else "")
+    line = f"{result['timeframe']:>4} {result['bars']:>10,} {stage:<20} {result['seconds'] * 1000:>10.2f} ms"
+    if 'peak_bytes' in result:
+        line += f" {result['peak_bytes'] / 2**20:>9.1f} MiB peak"
+    if 'payload_bytes' in result:
+        line += f" {result['payload_bytes'] / 2**10:>10.1f} KiB payload"
+    return line
+
+
+def _result_key(result: dict):
+    return result['stage'], result.get('mode'), result['timeframe'], result['bars']
+
+
+def compare(document: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD):
+    """
+    Compare a run against a baseline run
+
+    Returns a list of (key, metric, baseline value, current value, ratio)
+    for every metric that grew by more than threshold. Timings are only
+    compared when the difference exceeds MIN_REGRESSION_SECONDS.
+    """
+    previous = {_result_key(result): result for result in baseline.get('results', [])}
+    regressions = []
+    for result in document['results']:
+        before = previous.get(_result_key(result))
+        if before is None:
+            continue
+        for metric in METRICS:
+            if metric not in result or not before.get(metric):
+                continue
+            ratio = result[metric] / before[metric]
+            if metric == 'seconds' and result[metric] - before[metric] < MIN_REGRESSION_SECONDS:
+                continue
+            if ratio > threshold:
+                regressions.append((_result_key(result), metric, before[metric], result[metric], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the data, analysis and chart pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Series lengths in bars")
+    parser.add_argument("--timeframes", nargs="+", default=DEFAULT_TIMEFRAMES)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per stage")
+    parser.add_argument("--full-detail-max", type=int, default=DEFAULT_FULL_DETAIL_MAX,
+                        help="Largest series also charted without downsampling")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run of each stage")
+    parser.add_argument("--out", default=None, help="JSON file to write (default: benchmarks/results/)")
+    parser.add_argument("--baseline", default=None, help="Earlier results file to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run to --baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Ratio over the baseline reported as a regression")
+    args = parser.parse_args(argv)
+
+    document = run(args.sizes, args.timeframes, args.repeat, args.full_detail_max, not args.no_memory)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {out}")
+    if document['parity_failures']:
+        return 1
+
+    if args.baseline is None:
+        return 0
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(document, baseline, args.threshold)
+    for (stage, mode, timeframe, bars), metric, before, after, ratio in regressions:
+        name = stage + (f"[{mode}]" if mode else "")
+        print(f"REGRESSION {timeframe} {bars:,} {name} {metric}: {before:,.4g} -> {after:,.4g} ({ratio:.2f}x)")
+    print(f"{len(regressions)} regression(s) against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,155 @@
 import streamlit as st
 from modules.data_handler import fetch_stock_data, cache_data
-from modules.technical_analysis import calculate_support_resistance, calculate_trend
-from modules.visualization import create_price_chart
+from modules.analysis_cache import cached_analysis, cached_chart_payload, cached_pyramid, data_fingerprint
+from modules import instrumentation
+from modules.instrumentation import record_cache, span
+from modules.visualization import apply_chart_layout
+from modules.downsampling import DEFAULT_PIXEL_WIDTH
+from modules.resampler import INTRADAY_TIMEFRAMES, max_history_days
+from modules.live import LIVE_POLL_SECONDS, LiveChart, LiveSeries
 from modules.utils import setup_page
 import datetime
+import os
+import time
+import pandas as pd
+
+# How long a session reuses its loaded series across reruns, in seconds
+DATA_REFRESH_SECONDS = 60
+
+@st.cache_resource
+def start_metrics_endpoint(port: int):
+    """
+    Serve Prometheus metrics on the given port, once per process
+    """
+    instrumentation.enable()
+    return instrumentation.start_metrics_server(port, host="0.0.0.0")
+
+def render_diagnostics():
+    """
+    Sidebar panel with span timings, cache hit rates and counters
+    """
+    stats = instrumentation.snapshot()
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        if stats['spans']:
+            st.caption("Spans")
+            st.dataframe(pd.DataFrame([
+                {
+                    'span': row['name'],
+                    'labels': ", ".join(f"{k}={v}" for k, v in row['labels'].items()),
+                    'calls': row['count'],
+                    'mean ms': row['mean_seconds'] * 1000,
+                    'max ms': row['max_seconds'] * 1000,
+                    'total ms': row['total_seconds'] * 1000
+                }
+                for row in stats['spans']
+            ]), hide_index=True)
+        if stats['caches']:
+            st.caption("Caches")
+            st.dataframe(pd.DataFrame(stats['caches']), hide_index=True)
+        if stats['gauges']:
+            st.caption("Gauges")
+            st.dataframe(pd.DataFrame([
+                {'gauge': row['name'], 'labels': ", ".join(f"{k}={v}" for k, v in row['labels'].items()),
+                 'value': row['value']}
+                for row in stats['gauges']
+            ]), hide_index=True)
+        counters = [row for row in stats['counters'] if row['name'] not in ("cache_requests", "cache_misses")]
+        if counters:
+            st.caption("Counters")
+            st.dataframe(pd.DataFrame([
+                {'counter': row['name'], 'labels': ", ".join(f"{k}={v}" for k, v in row['labels'].items()),
+                 'value': row['value']}
+                for row in counters
+            ]), hide_index=True)
+        if not stats['spans'] and not stats['counters']:
+            st.caption("Nothing recorded yet")
+
+        st.download_button("Export JSON lines", instrumentation.to_jsonl(), "diagnostics.jsonl",
+                           mime="application/x-ndjson")
+        st.download_button("Export Prometheus text", instrumentation.prometheus_text(), "metrics.txt",
+                           mime="text/plain")
+        if st.button("Reset diagnostics"):
+            instrumentation.reset()
+
+def render_metrics(df, trend_data):
+    """
+    Price, volume, trend and volatility of the last bar
+    """
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric(
+            "Current Price",
+            f"${df['Close'].iloc[-1]:.2f}",
+            f"{((df['Close'].iloc[-1] / df['Close'].iloc[-2]) - 1) * 100:.2f}%"
+        )
+    with col2:
+        st.metric(
+            "Volume",
+            f"{df['Volume'].iloc[-1]:,.0f}"
+        )
+    with col3:
+        st.metric(
+            "Trend",
+            trend_data['trend']
+        )
+    with col4:
+        if 'volatility' in trend_data:
+            st.metric(
+                "Volatility",
+                f"{trend_data['volatility'].iloc[-1]*100:.2f}%"
+            )
+
+def stop_live():
+    """
+    Write the live series' unsaved bars to the store and forget it
+    """
+    live = st.session_state.pop('live', None)
+    if live:
+        live['series'].flush()
+
+@st.fragment(run_every=LIVE_POLL_SECONDS)
+def render_live(symbol, timeframe, start_date, layout):
+    """
+    Live chart, rerun on its own every LIVE_POLL_SECONDS
+
+    Each run fetches only the bars after the last one held and patches
+    the session's chart payload with them; the rest of the page is not
+    rerun.
+    """
+    request = (symbol, timeframe, start_date)
+    live = st.session_state.get('live')
+    if live is None or live['request'] != request:
+        stop_live()
+        try:
+            with st.spinner("Fetching stock data..."):
+                series = LiveSeries(symbol, timeframe, start_date)
+        except Exception as e:
+            st.error(f"Unable to fetch data for {symbol}: {str(e)}")
+            return
+        live = st.session_state['live'] = {'request': request, 'series': series, 'chart': LiveChart(series)}
+    else:
+        try:
+            live['chart'].apply(live['series'].poll())
+        except Exception as e:
+            st.warning(f"Live update failed, retrying: {str(e)}")
+
+    chart = apply_chart_layout(live['chart'].payload, symbol, timeframe, as_dict=True, **layout)
+    # Keep the user's zoom and pan across updates
+    chart['layout']['uirevision'] = symbol
+    with span("chart.render", timeframe=timeframe):
+        st.plotly_chart(chart, use_container_width=True, key="live_chart")
+
+    series = live['series']
+    render_metrics(series.frame(2), series.trend_data(tail=1))
 
 def main():
     setup_page()
 
+    # Optional Prometheus scrape endpoint, e.g. STOCKCHART_METRICS_PORT=9100
+    metrics_port = os.environ.get("STOCKCHART_METRICS_PORT")
+    if metrics_port:
+        start_metrics_endpoint(int(metrics_port))
+
     # Sidebar inputs
     st.sidebar.title("Settings")
     symbol = st.sidebar.text_input("Stock Symbol", value="AAPL").upper()
@@ -27,6 +169,26 @@ def main():
     grid_width = st.sidebar.slider("Grid Width", 1, 3, 1)
     grid_style = st.sidebar.selectbox("Grid Style", ["solid", "dot", "dash", "longdash"], index=1)
 
+    # Rendering options for long histories
+    render_mode = st.sidebar.selectbox(
+        "Render Mode",
+        ["Screen resolution", "Full detail"],
+        help="Screen resolution aggregates candles to the chart's pixel width "
+             "and draws overlays with WebGL; Full detail sends every bar"
+    )
+
+    # The checkbox only shows or hides this session's panel. Collection is
+    # process-wide, so it is switched on here but never off: other sessions,
+    # STOCKCHART_INSTRUMENTATION and the metrics endpoint may rely on it
+    diagnostics = st.sidebar.checkbox(
+        "Diagnostics",
+        value=False,
+        key="diagnostics",
+        help="Record timings of data loading, analysis and chart building"
+    )
+    if diagnostics:
+        instrumentation.enable()
+
     grid_config = {
         'color': grid_color,
         'width': grid_width,
@@ -36,90 +198,137 @@ def main():
     # Updated timeframe selection with supported intervals
     timeframe = st.sidebar.selectbox(
         "Timeframe",
-        ["1m", "3m", "15m", "1d", "1mo", "max"],
-        index=3,
-        help="1m = 1 Minute (last 7 days)\n"
-             "3m = 3 Minutes (last 60 days)\n"
+        ["1m", "3m", "5m", "15m", "1h", "1d", "1mo", "max"],
+        index=5,
+        help="1m = 1 Minute (last 29 days)\n"
+             "3m = 3 Minutes (last 29 days)\n"
+             "5m = 5 Minutes (last 60 days)\n"
              "15m = 15 Minutes (last 60 days)\n"
+             "1h = 1 Hour (last 730 days)\n"
              "1d = Daily\n"
              "1mo = Monthly\n"
              "max = Maximum available history"
     )
 
-    # Adjust date picker based on timeframe
-    if timeframe == '1m':
-        # For 1-minute data, limit to last 7 days
-        min_date = end_date - datetime.timedelta(days=7)
-        start_date = max(start_date, min_date)
-    elif timeframe in ['3m', '15m']:
-        # For intraday data, limit to last 60 days
-        min_date = end_date - datetime.timedelta(days=60)
+    # Follow the latest bars of intraday timeframes without reloading the history
+    live_mode = False
+    if timeframe in INTRADAY_TIMEFRAMES:
+        live_mode = st.sidebar.checkbox(
+            "Live mode",
+            help=f"Poll for new bars every {LIVE_POLL_SECONDS} seconds and update the "
+                 "last part of the chart in place"
+        )
+    if not live_mode:
+        stop_live()
+
+    # Levels agreed on by several timeframes, derived from the loaded series
+    confluence = st.sidebar.checkbox(
+        "Confluence levels",
+        help="Draw support/resistance zones where swing levels of this and "
+             "higher timeframes coincide"
+    )
+
+    # Adjust date picker based on how much history the timeframe's base data has
+    history_days = max_history_days(timeframe)
+    if history_days is not None:
+        min_date = end_date - datetime.timedelta(days=history_days)
         start_date = max(start_date, min_date)
 
     date_range = st.sidebar.date_input(
         "Date Range",
         value=(start_date.date(), end_date.date()),
-        min_value=start_date.date() if timeframe in ['1m', '3m', '15m'] else None,
+        min_value=start_date.date() if history_days is not None else None,
         max_value=end_date.date()
     )
 
     # Main content
     st.title("Stock Technical Analysis")
 
-    if len(date_range) == 2:
+    if live_mode and len(date_range) == 2:
+        start_date = datetime.datetime.combine(date_range[0], datetime.datetime.min.time())
+        render_live(symbol, timeframe, start_date, {
+            'chart_height': chart_height,
+            'price_volume_ratio': price_volume_ratio,
+            'vertical_spacing': vertical_spacing,
+            'grid_style': grid_config
+        })
+    elif len(date_range) == 2:
         start_date, end_date = date_range
         start_date = datetime.datetime.combine(start_date, datetime.datetime.min.time())
         end_date = datetime.datetime.combine(end_date, datetime.datetime.max.time())
 
-        # Fetch and cache data
-        with st.spinner("Fetching stock data..."):
-            df = cache_data(symbol, start_date, end_date, timeframe)
+        # Reuse this session's loaded series while only presentation
+        # controls change, instead of deserializing the cached copy again
+        request = (symbol, timeframe, start_date, end_date)
+        loaded = st.session_state.get('loaded_data')
+        reuse = loaded and loaded['request'] == request and time.time() - loaded['loaded_at'] < DATA_REFRESH_SECONDS
+        record_cache("session_series", hit=bool(reuse))
+        if reuse:
+            df, fingerprint = loaded['df'], loaded['fingerprint']
+        else:
+            # Fetch and cache data
+            with st.spinner("Fetching stock data..."):
+                df = cache_data(symbol, start_date, end_date, timeframe)
+            fingerprint = data_fingerprint(df) if df is not None else (0,)
+            st.session_state['loaded_data'] = {
+                'request': request,
+                'df': df,
+                'fingerprint': fingerprint,
+                'loaded_at': time.time()
+            }
 
         if df is not None and not df.empty:
-            # Calculate technical indicators with timeframe parameter
-            support_resistance = calculate_support_resistance(df, timeframe)
-            trend_data = calculate_trend(df, timeframe)
+            # Visible window: re-aggregated at finer resolution when narrowed
+            x_range = None
+            if render_mode == "Screen resolution" and len(df) > DEFAULT_PIXEL_WIDTH:
+                first_bar = df['Date'].iloc[0].to_pydatetime().replace(tzinfo=None)
+                last_bar = df['Date'].iloc[-1].to_pydatetime().replace(tzinfo=None)
+                x_range = st.sidebar.slider(
+                    "Visible Window",
+                    min_value=first_bar,
+                    max_value=last_bar,
+                    value=(first_bar, last_bar),
+                    format="YYYY-MM-DD HH:mm"
+                )
+
+            # Calculate technical indicators with timeframe parameter,
+            # memoized on the data so styling changes skip this
+            analysis = cached_analysis(symbol, timeframe, fingerprint, df, confluence)
+            trend_data = analysis['trend_data']
+
+            # Traces are cached per data and view; a styling change only
+            # reapplies layout properties. Screen-resolution views read
+            # their bars from the series' pyramid of aggregated levels
+            max_points = None
+            pyramid = None
+            if render_mode == "Screen resolution":
+                max_points = DEFAULT_PIXEL_WIDTH
+                pyramid = cached_pyramid(symbol, timeframe, fingerprint, df)
+            payload = cached_chart_payload(symbol, timeframe, fingerprint, max_points, x_range, df, analysis,
+                                           confluence, pyramid)
 
             # Create main price chart with user configuration
-            fig = create_price_chart(
-                df,
+            chart = apply_chart_layout(
+                payload,
                 symbol,
-                support_resistance,
-                trend_data,
                 timeframe,
                 chart_height=chart_height,
                 price_volume_ratio=price_volume_ratio,
                 vertical_spacing=vertical_spacing,
-                grid_style=grid_config
+                grid_style=grid_config,
+                as_dict=True
             )
-            st.plotly_chart(fig, use_container_width=True)
+            # Streamlit validates and serializes the figure here
+            with span("chart.render", timeframe=timeframe):
+                st.plotly_chart(chart, use_container_width=True)
 
             # Display additional metrics
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric(
-                    "Current Price",
-                    f"${df['Close'].iloc[-1]:.2f}",
-                    f"{((df['Close'].iloc[-1] / df['Close'].iloc[-2]) - 1) * 100:.2f}%"
-                )
-            with col2:
-                st.metric(
-                    "Volume",
-                    f"{df['Volume'].iloc[-1]:,.0f}"
-                )
-            with col3:
-                st.metric(
-                    "Trend",
-                    trend_data['trend']
-                )
-            with col4:
-                if 'volatility' in trend_data:
-                    st.metric(
-                        "Volatility",
-                        f"{trend_data['volatility'].iloc[-1]*100:.2f}%"
-                    )
+            render_metrics(df, trend_data)
         else:
             st.error(f"Unable to fetch data for {symbol}. Please verify the symbol and try again.")
 
+    if diagnostics:
+        render_diagnostics()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
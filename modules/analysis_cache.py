@@ -0,0 +1,106 @@
+import pandas as pd
+import streamlit as st
+from modules.confluence import confluence_levels
+from modules.instrumentation import record_cache
+from modules.pyramid import BarPyramid
+from modules.technical_analysis import calculate_support_resistance, calculate_trend
+from modules.trendlines import detect_trendlines
+from modules.visualization import build_chart_payload
+
+def data_fingerprint(df: pd.DataFrame) -> tuple:
+    """
+    Cheap identity of a loaded series
+
+    Between two rewrites of the stored series only its tail changes, so
+    the store revision, the length, the first and last timestamps and the
+    last bar's values identify the content without hashing every row.
+    Corporate actions and re-fetches that rewrite interior bars change the
+    revision.
+    """
+    if df.empty:
+        return (0,)
+    last = df.iloc[-1]
+    return (
+        df.attrs.get('store_revision'),
+        len(df),
+        str(df['Date'].iloc[0]),
+        str(last['Date']),
+        float(last['Open']),
+        float(last['High']),
+        float(last['Low']),
+        float(last['Close']),
+        float(last['Volume'])
+    )
+
+def cached_analysis(symbol: str, timeframe: str, fingerprint: tuple, df: pd.DataFrame,
+                    confluence: bool = False) -> dict:
+    """
+    Support/resistance, trend and trendline results for one series
+
+    Keyed on (symbol, timeframe, fingerprint, confluence); the DataFrame
+    itself is not hashed. With confluence, levels are the multi-timeframe
+    zones of modules/confluence.py. Results are shared between sessions
+    and must not be mutated.
+    """
+    computed = []
+    analysis = _compute_analysis(symbol, timeframe, fingerprint, confluence, df, computed)
+    record_cache("analysis", hit=not computed)
+    return analysis
+
+def cached_pyramid(symbol: str, timeframe: str, fingerprint: tuple, df: pd.DataFrame) -> BarPyramid:
+    """
+    Bar pyramid of one series, built once and shared by every zoom and pan
+    """
+    computed = []
+    pyramid = _build_pyramid(symbol, timeframe, fingerprint, df, computed)
+    record_cache("pyramid", hit=not computed)
+    return pyramid
+
+def cached_chart_payload(symbol: str, timeframe: str, fingerprint: tuple, max_points, x_range,
+                         df: pd.DataFrame, analysis: dict, confluence: bool = False,
+                         pyramid: BarPyramid = None) -> dict:
+    """
+    Trace payload for one series and view, reused across styling changes
+    """
+    computed = []
+    payload = _build_payload(symbol, timeframe, fingerprint, max_points, x_range, confluence,
+                             df, analysis, pyramid, computed)
+    record_cache("chart_payload", hit=not computed)
+    return payload
+
+# Arguments starting with an underscore are not part of the cache key;
+# _computed collects a marker whenever the cached function actually runs
+
+@st.cache_resource(max_entries=64)
+def _compute_analysis(symbol: str, timeframe: str, fingerprint: tuple, confluence: bool,
+                      _df: pd.DataFrame, _computed: list) -> dict:
+    _computed.append(True)
+    if confluence:
+        support_resistance = confluence_levels(_df, timeframe)
+    else:
+        support_resistance = calculate_support_resistance(_df, timeframe)
+    return {
+        'support_resistance': support_resistance,
+        'trend_data': calculate_trend(_df, timeframe),
+        'trendlines': detect_trendlines(_df, support_resistance)
+    }
+
+@st.cache_resource(max_entries=16)
+def _build_pyramid(symbol: str, timeframe: str, fingerprint: tuple,
+                   _df: pd.DataFrame, _computed: list) -> BarPyramid:
+    _computed.append(True)
+    return BarPyramid.from_frame(_df)
+
+@st.cache_resource(max_entries=64)
+def _build_payload(symbol: str, timeframe: str, fingerprint: tuple, max_points, x_range, confluence: bool,
+                   _df: pd.DataFrame, _analysis: dict, _pyramid: BarPyramid, _computed: list) -> dict:
+    _computed.append(True)
+    return build_chart_payload(
+        _df,
+        _analysis['support_resistance'],
+        _analysis['trend_data'],
+        _analysis['trendlines'],
+        max_points=max_points,
+        x_range=x_range,
+        pyramid=_pyramid
+    )
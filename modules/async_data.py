@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from modules.data_handler import load_timeframe
+from modules.instrumentation import increment
+from modules.providers import DataProvider, get_provider
+from modules.scheduler import INTERACTIVE
+
+# Symbols loaded at once; each load mostly waits on the provider's scheduler
+ASYNC_MAX_LOADS = 32
+
+# Seconds one symbol may take, store and backfill included
+DEFAULT_LOAD_TIMEOUT = 30.0
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _loads() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ASYNC_MAX_LOADS, thread_name_prefix="async-load")
+        return _executor
+
+
+async def fetch_async(symbol: str, start_date: datetime, end_date: datetime, timeframe: str,
+                      provider: DataProvider = None, timeout: float = DEFAULT_LOAD_TIMEOUT,
+                      priority: int = INTERACTIVE) -> pd.DataFrame:
+    """
+    Awaitable load_timeframe for one symbol
+
+    The load runs on a shared thread pool, so the event loop stays free
+    while the store is read and the provider's scheduler fetches what is
+    missing. Raises TimeoutError after timeout seconds (None: no limit).
+    A timeout only stops waiting: the load cannot be cancelled, so it
+    keeps its thread, and spends provider quota, until it finishes, and
+    whatever it fetched still lands in the store.
+    """
+    provider = provider or get_provider()
+    loop = asyncio.get_running_loop()
+    load = loop.run_in_executor(_loads(), load_timeframe, symbol, start_date, end_date,
+                                timeframe, provider, priority)
+    try:
+        return await asyncio.wait_for(load, timeout)
+    except TimeoutError:
+        increment("load_timeouts", provider=provider.name)
+        raise TimeoutError(f"Loading {symbol} {timeframe} took longer than {timeout}s") from None
+
+
+async def gather_async(symbols, start_date: datetime = None, end_date: datetime = None, timeframe: str = "1d",
+                       provider: DataProvider = None, timeout: float = DEFAULT_LOAD_TIMEOUT,
+                       priority: int = INTERACTIVE) -> dict:
+    """
+    Load every symbol concurrently, returning {symbol: df or exception}
+    in input order
+
+    A symbol listed more than once is loaded once. One symbol failing or
+    timing out does not affect the others. All
+    requests share the provider's scheduler, so its worker count and rate
+    limit, not the number of symbols, bound how many are in flight.
+    """
+    end_date = end_date or datetime.now()
+    start_date = start_date or end_date - timedelta(days=365)
+    provider = provider or get_provider()
+    symbols = list(dict.fromkeys(symbols))
+    results = await asyncio.gather(
+        *(fetch_async(symbol, start_date, end_date, timeframe, provider, timeout, priority)
+          for symbol in symbols),
+        return_exceptions=True
+    )
+    return dict(zip(symbols, results))
+
+
+def fetch_many(symbols, start_date: datetime = None, end_date: datetime = None, timeframe: str = "1d",
+               provider: DataProvider = None, timeout: float = DEFAULT_LOAD_TIMEOUT,
+               priority: int = INTERACTIVE) -> dict:
+    """
+    gather_async for synchronous callers such as a Streamlit script
+
+    Must not be called from a running event loop; await gather_async there.
+    """
+    return asyncio.run(gather_async(symbols, start_date, end_date, timeframe, provider, timeout, priority))
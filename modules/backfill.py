@@ -0,0 +1,100 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from modules.instrumentation import increment, span
+
+# Longest range the provider serves in a single request, in days
+PROVIDER_REQUEST_DAYS = {
+    '1m': 7,
+    '5m': 60,
+    '15m': 60,
+    '1h': 730,
+}
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+
+def split_range(start_date: datetime, end_date: datetime, interval: str):
+    """
+    Split [start_date, end_date] into consecutive provider-sized windows
+    """
+    window_days = PROVIDER_REQUEST_DAYS.get(interval)
+    if window_days is None:
+        return [(start_date, end_date)]
+
+    window = timedelta(days=window_days)
+    chunks = []
+    chunk_start = start_date
+    while chunk_start < end_date:
+        chunk_end = min(chunk_start + window, end_date)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks
+
+
+def fetch_with_retry(fetch, symbol: str, start_date: datetime, end_date: datetime, interval: str,
+                     retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF) -> pd.DataFrame:
+    """
+    Call fetch, retrying failures with exponential backoff and jitter
+    """
+    for attempt in range(retries + 1):
+        try:
+            with span("provider.fetch", interval=interval):
+                return fetch(symbol, start_date, end_date, interval)
+        except Exception:
+            if attempt == retries:
+                raise
+            increment("provider_retries", interval=interval)
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+
+
+def backfill(fetch, store, symbol: str, start_date: datetime, end_date: datetime, interval: str,
+             max_workers: int = DEFAULT_MAX_WORKERS, retries: int = DEFAULT_RETRIES,
+             backoff: float = DEFAULT_BACKOFF) -> pd.DataFrame:
+    """
+    Fetch a long range as concurrent provider-sized chunks and merge them
+    into the store
+
+    Chunks are fetched through a bounded thread pool, stitched together and
+    de-duplicated on timestamp, then written with a single store update.
+    If some chunks still fail after their retries, the ones that succeeded
+    are kept and the first error is raised.
+    """
+    chunks = split_range(start_date, end_date, interval)
+    frames = []
+    fetched_ranges = []
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        futures = {
+            pool.submit(fetch_with_retry, fetch, symbol, chunk_start, chunk_end, interval, retries, backoff):
+                (chunk_start, chunk_end)
+            for chunk_start, chunk_end in chunks
+        }
+        for future in as_completed(futures):
+            try:
+                chunk_df = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            fetched_ranges.append(futures[future])
+            if chunk_df is not None and not chunk_df.empty:
+                frames.append(chunk_df)
+
+    stitched = pd.DataFrame()
+    if frames:
+        stitched = (pd.concat(frames, ignore_index=True)
+                      .drop_duplicates(subset='Date', keep='last')
+                      .sort_values('Date')
+                      .reset_index(drop=True))
+    if fetched_ranges:
+        store.append_ranges(symbol, interval, stitched, fetched_ranges)
+    if errors:
+        raise errors[0]
+    return stitched
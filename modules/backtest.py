@@ -0,0 +1,229 @@
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from modules.indicators import trend_windows
+
+# Largest (fast, slow, time) block of signals held at once
+CHUNK_ELEMENTS = 1 << 22
+
+DEFAULT_FAST_WINDOWS = list(range(5, 55, 5))
+DEFAULT_SLOW_WINDOWS = list(range(10, 210, 10))
+DEFAULT_VOLATILITY_WINDOWS = list(range(5, 55, 5))
+
+GRID_COLUMNS = ['fast', 'slow', 'volatility_window']
+COUNT_COLUMNS = [
+    'signals', 'hits', 'total_return',
+    'strong_signals', 'strong_hits', 'strong_total_return'
+]
+RESULT_COLUMNS = ['symbol'] + GRID_COLUMNS + [
+    'signals', 'hits', 'hit_rate', 'mean_return', 'total_return',
+    'strong_signals', 'strong_hits', 'strong_hit_rate', 'strong_mean_return', 'strong_total_return'
+]
+
+
+def rolling_means(values: np.ndarray, windows, min_start: int = 0) -> np.ndarray:
+    """
+    Trailing means of values over each window, one row per window
+
+    All windows come from one prefix sum, so the cost is O(len(windows) * n)
+    array arithmetic. Windows starting before min_start are NaN. Sums are
+    taken relative to the first value to keep the prefix small.
+    """
+    windows = np.asarray(windows, dtype=np.int64)[:, None]
+    offset = float(values[0]) if len(values) else 0.0
+    prefix = np.concatenate([[0.0], np.cumsum(values - offset, dtype=np.float64)])
+    ends = np.arange(1, len(values) + 1)
+    starts = ends - windows
+    means = (prefix[ends] - prefix[np.maximum(starts, 0)]) / windows + offset
+    means[starts < min_start] = np.nan
+    return means
+
+
+def rolling_stds(values: np.ndarray, windows, min_start: int = 0) -> np.ndarray:
+    """
+    Trailing sample standard deviations over each window, from prefix sums
+    of the values and their squares
+
+    Values are centered on their mean first, which keeps the
+    sum-of-squares difference well conditioned for returns.
+    """
+    windows = np.asarray(windows, dtype=np.int64)
+    centered = values - (values[min_start:].mean() if len(values) > min_start else 0.0)
+    centered[:min_start] = 0.0
+    mean = rolling_means(centered, windows, min_start)
+    mean_square = rolling_means(centered * centered, windows, min_start)
+    ratio = (windows / np.maximum(windows - 1, 1))[:, None]
+    variance = np.maximum(mean_square - mean * mean, 0.0) * ratio
+    variance[windows < 2] = np.nan
+    return np.sqrt(variance)
+
+
+def trend_signals(close: np.ndarray, sma_fast: np.ndarray, sma_slow: np.ndarray) -> np.ndarray:
+    """
+    Direction of classify_trend for every (fast, slow) pair and bar:
+    1 for up, -1 for down, 0 for sideways
+
+    sma_fast is (F, n) and sma_slow (S, n); the result is (F, S, n).
+    """
+    fast = sma_fast[:, None, :]
+    slow = sma_slow[None, :, :]
+    up = (close > fast) & (fast > slow)
+    down = (close < fast) & (fast < slow)
+    return up.astype(np.int8) - down.astype(np.int8)
+
+
+def backtest_series(close, fast_windows=None, slow_windows=None, volatility_windows=None,
+                    horizon: int = 1) -> pd.DataFrame:
+    """
+    Evaluate the trend classifier on one close series over a parameter grid
+
+    A bar's signal is the direction classify_trend gives it with a (fast,
+    slow) moving average pair, scored against the return over the next
+    horizon bars. The classifier calls a trend strong when volatility over
+    the volatility window exceeds its mean so far (the batch path uses the
+    mean of the whole series, which would look ahead), so strong signals
+    are scored separately for every volatility window. Pairs with fast >=
+    slow are skipped.
+
+    Returns one row per combination with signal and hit counts, hit rate
+    and the mean and summed simple return of following the signal.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    fast_windows = np.asarray(DEFAULT_FAST_WINDOWS if fast_windows is None else fast_windows, dtype=np.int64)
+    slow_windows = np.asarray(DEFAULT_SLOW_WINDOWS if slow_windows is None else slow_windows, dtype=np.int64)
+    volatility_windows = np.asarray(DEFAULT_VOLATILITY_WINDOWS if volatility_windows is None else volatility_windows,
+                                    dtype=np.int64)
+    n = len(close)
+    shape = (len(fast_windows), len(slow_windows), len(volatility_windows))
+
+    sma_fast = rolling_means(close, fast_windows)
+    sma_slow = rolling_means(close, slow_windows)
+
+    # Percentage changes start at the second bar
+    changes = np.zeros(n)
+    if n > 1:
+        changes[1:] = close[1:] / close[:-1] - 1
+    volatility = rolling_stds(changes, volatility_windows, min_start=1)
+    valid = ~np.isnan(volatility)
+    seen = np.maximum(np.cumsum(valid, axis=1), 1)
+    running_mean = np.cumsum(np.where(valid, volatility, 0.0), axis=1) / seen
+    strong = (volatility > running_mean).astype(np.float64).T  # (n, V)
+
+    forward = np.full(n, np.nan)
+    if n > horizon:
+        forward[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    scored = ~np.isnan(forward)
+    forward = np.where(scored, forward, 0.0)
+
+    counts = {name: np.zeros(shape) for name in COUNT_COLUMNS}
+    pairs = len(fast_windows) * len(slow_windows)
+    step = max(1, CHUNK_ELEMENTS // max(pairs, 1))
+    for start in range(0, n, step):
+        stop = min(n, start + step)
+        signal = trend_signals(close[start:stop], sma_fast[:, start:stop], sma_slow[:, start:stop])
+        signal = signal * scored[start:stop]
+        returns = signal * forward[start:stop]
+        active = (signal != 0).reshape(pairs, -1).astype(np.float64)
+        hits = (returns > 0).reshape(pairs, -1).astype(np.float64)
+        returns = returns.reshape(pairs, -1)
+        window_strong = strong[start:stop]
+
+        for name, values in (('signals', active), ('hits', hits), ('total_return', returns)):
+            counts[name] += values.sum(axis=1).reshape(shape[:2])[:, :, None]
+            counts[f'strong_{name}'] += (values @ window_strong).reshape(shape)
+
+    fast, slow, vol = np.meshgrid(fast_windows, slow_windows, volatility_windows, indexing='ij')
+    keep = (fast < slow).ravel()
+    result = pd.DataFrame({
+        'fast': fast.ravel()[keep],
+        'slow': slow.ravel()[keep],
+        'volatility_window': vol.ravel()[keep],
+        **{name: values.ravel()[keep] for name, values in counts.items()}
+    })
+    return _add_rates(result)
+
+
+def _add_rates(result: pd.DataFrame) -> pd.DataFrame:
+    for prefix in ('', 'strong_'):
+        signals = result[f'{prefix}signals'].replace(0, np.nan)
+        result[f'{prefix}hit_rate'] = result[f'{prefix}hits'] / signals
+        result[f'{prefix}mean_return'] = result[f'{prefix}total_return'] / signals
+    for name in ('signals', 'hits', 'strong_signals', 'strong_hits'):
+        result[name] = result[name].round().astype(np.int64)
+    return result
+
+
+def backtest_grid(series, fast_windows=None, slow_windows=None, volatility_windows=None,
+                  horizon: int = 1) -> pd.DataFrame:
+    """
+    backtest_series for every symbol in series, a mapping of symbol to a
+    DataFrame (or close array), concatenated with a 'symbol' column
+    """
+    frames = []
+    for symbol, data in series.items():
+        close = data['Close'].to_numpy(dtype=np.float64) if isinstance(data, pd.DataFrame) else data
+        result = backtest_series(close, fast_windows, slow_windows, volatility_windows, horizon)
+        result.insert(0, 'symbol', symbol)
+        frames.append(result)
+    if not frames:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)[RESULT_COLUMNS]
+
+
+def pool_results(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    Combine per-symbol rows into one row per parameter combination
+    """
+    pooled = results.groupby(GRID_COLUMNS, as_index=False)[COUNT_COLUMNS].sum()
+    pooled.insert(0, 'symbol', 'ALL')
+    return _add_rates(pooled)[RESULT_COLUMNS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the trend classifier over a grid of window lengths")
+    parser.add_argument("symbols", nargs="+", help="Symbols to test")
+    parser.add_argument("--timeframe", default="1d")
+    parser.add_argument("--days", type=int, default=3650, help="History to test, in days")
+    parser.add_argument("--provider", default=None, help="Data provider name (default: STOCKCHART_PROVIDER)")
+    parser.add_argument("--fast", type=int, nargs="+", default=DEFAULT_FAST_WINDOWS)
+    parser.add_argument("--slow", type=int, nargs="+", default=DEFAULT_SLOW_WINDOWS)
+    parser.add_argument("--volatility", type=int, nargs="+", default=DEFAULT_VOLATILITY_WINDOWS)
+    parser.add_argument("--horizon", type=int, default=1, help="Bars ahead each signal is scored on")
+    parser.add_argument("--per-symbol", action="store_true", help="Report every symbol instead of pooled results")
+    parser.add_argument("--sort-by", default="hit_rate", choices=RESULT_COLUMNS)
+    parser.add_argument("--top", type=int, default=None, help="Only write the best rows")
+    parser.add_argument("--out", default=None, help="CSV file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    from modules.data_handler import load_timeframe
+    from modules.providers import get_provider
+
+    provider = get_provider(args.provider)
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=args.days)
+    series = {}
+    for symbol in args.symbols:
+        df = load_timeframe(symbol.upper(), start_date, end_date, args.timeframe, provider=provider)
+        if len(df) > 1:
+            series[symbol.upper()] = df
+
+    results = backtest_grid(series, args.fast, args.slow, args.volatility, args.horizon)
+    if not args.per_symbol:
+        results = pool_results(results)
+    results = results.sort_values(args.sort_by, ascending=False)
+
+    # Flag the windows calculate_trend uses today for comparison
+    fast_ma, slow_ma = trend_windows(args.timeframe)
+    results['current'] = (results['fast'] == fast_ma) & (results['slow'] == slow_ma) & \
+                         (results['volatility_window'] == fast_ma)
+    if args.top:
+        results = results.head(args.top)
+    results.to_csv(args.out or sys.stdout, index=False)
+
+
+if __name__ == "__main__":
+    main()
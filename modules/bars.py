@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class Bars:
+    """
+    Compact OHLCV series backed by contiguous NumPy arrays
+
+    Timestamps are int64 counts of unit ('ns', 'us', ...) since the epoch
+    in UTC, in whatever unit the source used, and tz keeps the display
+    timezone. Prices and volume are float64 or, to halve memory
+    on long intraday histories, float32. Slicing returns a Bars of views
+    into the same arrays, so windows cost no copy. The arrays are treated
+    as read-only; nothing in the analysis path writes to them.
+    """
+
+    __slots__ = ('dates', 'open', 'high', 'low', 'close', 'volume', 'tz', 'unit')
+
+    def __init__(self, dates, open, high, low, close, volume, tz=None, unit: str = 'ns'):
+        self.dates = dates
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.tz = tz
+        self.unit = unit
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dtype=np.float64) -> "Bars":
+        """
+        Bars sharing df's column buffers where their dtype already matches
+
+        The Date column is optional; frames without it give dates=None.
+        """
+        dates, tz, unit = None, None, 'ns'
+        if 'Date' in df.columns:
+            index = pd.DatetimeIndex(df['Date'])
+            tz, unit = index.tz, index.unit
+            dates = index.asi8
+        columns = [df[column].to_numpy(dtype=dtype, copy=False) for column in PRICE_COLUMNS]
+        return cls(dates, *columns, tz=tz, unit=unit)
+
+    def __len__(self):
+        return len(self.close)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError("Bars only support contiguous slices")
+        return Bars(
+            self.dates[key] if self.dates is not None else None,
+            self.open[key], self.high[key], self.low[key], self.close[key], self.volume[key],
+            tz=self.tz, unit=self.unit
+        )
+
+    def window(self, start: int, stop: int = None) -> "Bars":
+        return self[start:stop]
+
+    def tail(self, n: int) -> "Bars":
+        return self[max(0, len(self) - n):]
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.dates, self.open, self.high, self.low, self.close, self.volume)
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def astype(self, dtype) -> "Bars":
+        """
+        Copy with prices and volume converted to dtype, dates shared
+        """
+        return Bars(self.dates, *(np.ascontiguousarray(values, dtype=dtype) for values in
+                                  (self.open, self.high, self.low, self.close, self.volume)),
+                    tz=self.tz, unit=self.unit)
+
+    def timestamps(self) -> pd.DatetimeIndex:
+        """
+        Dates as a DatetimeIndex viewing the int64 array
+        """
+        if self.dates is None:
+            raise ValueError("Bars were built without dates")
+        index = pd.DatetimeIndex(self.dates.view(f'M8[{self.unit}]'))
+        return index.tz_localize('UTC').tz_convert(self.tz) if self.tz is not None else index
+
+    def to_frame(self) -> pd.DataFrame:
+        data = {'Date': self.timestamps()} if self.dates is not None else {}
+        for column, values in zip(PRICE_COLUMNS, (self.open, self.high, self.low, self.close, self.volume)):
+            data[column] = values
+        return pd.DataFrame(data, copy=False)
+
+
+def as_bars(data, dtype=None) -> Bars:
+    """
+    data as Bars: returned as is (or cast) when already Bars, otherwise
+    viewed from a DataFrame's columns
+    """
+    if isinstance(data, Bars):
+        return data if dtype is None or data.close.dtype == dtype else data.astype(dtype)
+    return Bars.from_frame(data, dtype=dtype or np.float64)
@@ -0,0 +1,217 @@
+import argparse
+import json
+import math
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from modules.confluence import confluence_levels
+from modules.data_handler import load_timeframe
+from modules.providers import get_provider
+from modules.technical_analysis import calculate_support_resistance, calculate_trend
+from modules.trendlines import detect_trendlines
+
+# Streamlit and Plotly are never imported here; scipy loads on first analysis
+
+OUTPUT_FORMATS = ('json', 'jsonl', 'parquet')
+
+DEFAULT_FETCH_WORKERS = 8
+
+
+def analyze_symbol(symbol: str, df: pd.DataFrame, timeframe: str = "1d", confluence: bool = False) -> dict:
+    """
+    Levels, trend and trendlines of one symbol's bars as a plain dict
+    """
+    trend_data = calculate_trend(df, timeframe)
+    if confluence:
+        support_resistance = confluence_levels(df, timeframe)
+    else:
+        support_resistance = calculate_support_resistance(df, timeframe)
+    trendlines = detect_trendlines(df, support_resistance)
+
+    def line_row(side, line):
+        return {
+            'side': side,
+            'start': line['x0'].isoformat(),
+            'end': line['x1'].isoformat(),
+            'y0': line['y0'],
+            'y1': line['y1'],
+            'slope': line['slope'],
+            'touches': line['touches'],
+            'broken': line['broken'],
+            'broken_at': line['broken_at'].isoformat() if line['broken_at'] is not None else None
+        }
+
+    return {
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'bars': len(df),
+        'first_bar': df['Date'].iloc[0].isoformat(),
+        'last_bar': df['Date'].iloc[-1].isoformat(),
+        'close': float(df['Close'].iloc[-1]),
+        'trend': trend_data['trend'],
+        'sma_fast': float(trend_data['sma_fast'].iloc[-1]),
+        'sma_slow': float(trend_data['sma_slow'].iloc[-1]),
+        'volatility': float(trend_data['volatility'].iloc[-1]),
+        'support': [float(level) for level in support_resistance['support']],
+        'resistance': [float(level) for level in support_resistance['resistance']],
+        'support_levels': support_resistance['support_levels'],
+        'resistance_levels': support_resistance['resistance_levels'],
+        'trendlines': [line_row(side, line)
+                       for side in ('support', 'resistance')
+                       for line in trendlines[f'{side}_lines']],
+        'error': None
+    }
+
+
+def load_symbols(symbols, timeframe: str = "1d", start_date: datetime = None, end_date: datetime = None,
+                 provider=None, fetch_workers: int = DEFAULT_FETCH_WORKERS, loader=None):
+    """
+    Load every symbol on a thread pool, yielding (symbol, df, error) in
+    input order as soon as each one and those before it are ready
+
+    Loads go through the store and the provider's scheduler. error is set
+    (and df None) when a symbol fails or has fewer than two bars.
+    """
+    if loader is None:
+        def loader(symbol, start, end, tf):
+            return load_timeframe(symbol, start, end, tf, provider=provider)
+
+    end_date = end_date or datetime.now()
+    start_date = start_date or end_date - timedelta(days=365)
+
+    def load(symbol):
+        try:
+            return loader(symbol, start_date, end_date, timeframe), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+        for symbol, (df, error) in zip(symbols, pool.map(load, symbols)):
+            if error is None and (df is None or len(df) < 2):
+                error = f"No {timeframe} data"
+            yield symbol, (df if error is None else None), error
+
+
+def run_batch(symbols, timeframe: str = "1d", start_date: datetime = None, end_date: datetime = None,
+              provider=None, fetch_workers: int = DEFAULT_FETCH_WORKERS, loader=None, confluence: bool = False):
+    """
+    Load and analyze every symbol, yielding one result dict per symbol in
+    input order
+
+    Symbols are loaded by load_symbols while earlier ones are analyzed. A
+    symbol that cannot be loaded or analyzed yields a row with only
+    'symbol', 'timeframe' and 'error' set.
+    """
+    for symbol, df, error in load_symbols(symbols, timeframe, start_date, end_date,
+                                          provider, fetch_workers, loader):
+        if error is None:
+            try:
+                yield analyze_symbol(symbol, df, timeframe, confluence)
+                continue
+            except Exception as e:
+                error = e
+        yield {'symbol': symbol, 'timeframe': timeframe, 'error': str(error)}
+
+
+def read_symbols(items) -> list:
+    """
+    Upper-cased symbols from command-line items: symbols themselves, or
+    files with one symbol per line ('-' reads stdin, '#' starts a comment)
+    """
+    symbols = []
+    for item in items:
+        if item == "-" or os.path.isfile(item):
+            f = sys.stdin if item == "-" else open(item)
+            with f:
+                symbols.extend(line.strip().upper() for line in f if line.strip() and not line.startswith('#'))
+        else:
+            symbols.append(item.upper())
+    return symbols
+
+
+def _jsonable(value):
+    # NaN is not valid JSON
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def write_results(results, out=None, fmt: str = "json"):
+    """
+    Write result dicts as a JSON array, JSON lines or a Parquet table
+
+    JSON goes to out or stdout; Parquet needs an output path and keeps the
+    level and trendline lists as nested columns.
+    """
+    if fmt == "parquet":
+        if out is None:
+            raise ValueError("Parquet output needs --out")
+        pd.DataFrame(list(results)).to_parquet(out, index=False)
+        return
+
+    f = open(out, "w") if out else sys.stdout
+    try:
+        if fmt == "jsonl":
+            for result in results:
+                f.write(json.dumps(_jsonable(result)) + "\n")
+        else:
+            json.dump([_jsonable(result) for result in results], f, indent=2)
+            f.write("\n")
+    finally:
+        if out:
+            f.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compute support/resistance levels, trends and trendlines without the web app"
+    )
+    parser.add_argument("symbols", nargs="+",
+                        help="Symbols, or files with one symbol per line ('-' reads stdin)")
+    parser.add_argument("--timeframe", default="1d")
+    parser.add_argument("--days", type=int, default=365, help="History to analyze, in days")
+    parser.add_argument("--provider", default=None, help="Data provider name (default: STOCKCHART_PROVIDER)")
+    parser.add_argument("--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS)
+    parser.add_argument("--confluence", action="store_true",
+                        help="Report multi-timeframe confluence zones instead of single-timeframe levels")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=None,
+                        help="Output format (default: from the --out extension, else json)")
+    parser.add_argument("--out", default=None, help="File to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    symbols = read_symbols(args.symbols)
+
+    fmt = args.format
+    if fmt is None:
+        extension = os.path.splitext(args.out or "")[1].lstrip(".").lower()
+        fmt = extension if extension in OUTPUT_FORMATS else "json"
+
+    end_date = datetime.now()
+    results = list(run_batch(
+        symbols,
+        timeframe=args.timeframe,
+        start_date=end_date - timedelta(days=args.days),
+        end_date=end_date,
+        provider=get_provider(args.provider),
+        fetch_workers=args.fetch_workers,
+        confluence=args.confluence
+    ))
+    write_results(results, args.out, fmt)
+
+    failed = [result['symbol'] for result in results if result['error']]
+    if failed:
+        print(f"No results for {', '.join(failed)}", file=sys.stderr)
+    # Fail the run only when nothing could be analyzed
+    return 1 if symbols and len(failed) == len(symbols) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
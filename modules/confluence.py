@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+from modules.instrumentation import timed
+from modules.resampler import resample_ohlcv
+from modules.technical_analysis import find_swing_points, level_count, swing_window
+
+# Timeframes each base is compared with, each one derivable from the previous
+CONFLUENCE_LADDERS = {
+    '1m': ['1m', '5m', '15m', '1h'],
+    '3m': ['3m', '15m', '1h', '1d'],
+    '5m': ['5m', '15m', '1h', '1d'],
+    '15m': ['15m', '1h', '1d'],
+    '1h': ['1h', '1d', '1mo'],
+    '1d': ['1d', '1mo'],
+    'max': ['1d', '1mo'],
+}
+
+# Approximate bar length of each timeframe in minutes, for weighting
+TIMEFRAME_MINUTES = {'1m': 1, '3m': 3, '5m': 5, '15m': 15, '1h': 60, '1d': 390, '1mo': 390 * 21}
+
+
+def derive_timeframes(df: pd.DataFrame, timeframes) -> list:
+    """
+    [(timeframe, frame)] for df and every coarser timeframe, each derived
+    from the previous one so the cost shrinks along the ladder
+    """
+    frames = [(timeframes[0], df)]
+    for timeframe in timeframes[1:]:
+        derived = resample_ohlcv(frames[-1][1], timeframe)
+        # Stop once a level would have too few bars to hold a swing
+        if len(derived) < 3:
+            break
+        frames.append((timeframe, derived))
+    return frames
+
+
+@timed("analysis.confluence")
+def confluence_levels(df: pd.DataFrame, timeframe: str = "1d", timeframes=None, order: int = None,
+                      tolerance: float = None, num_levels: int = None):
+    """
+    Support/resistance zones where swing levels of several timeframes agree
+
+    The higher timeframes are derived from df in memory, and swing points
+    of all of them are found in one pass: their lows and highs are laid
+    end to end, separated by order + 1 padding values that can never be a
+    swing, and filtered together. All swing prices are then clustered into
+    zones (prices within tolerance, by default an average base bar's
+    range). A zone's strength sums its touches weighted by timeframe
+    (1 + log2 of the bar length relative to the base) and recency, and
+    zones confirmed on more timeframes rank first.
+
+    Returns the format of calculate_support_resistance, with the base
+    timeframe's swings, so it can stand in for it; each level also carries
+    its 'low'/'high' bounds and 'timeframes', and 'zones' lists them all.
+    """
+    timeframes = timeframes or CONFLUENCE_LADDERS.get(timeframe, [timeframe])
+    order = order or swing_window(timeframe)
+    if num_levels is None:
+        num_levels = level_count(timeframe)
+
+    frames = derive_timeframes(df, timeframes)
+    base_dates = pd.DatetimeIndex(df['Date'])
+    pad = order + 1
+
+    # Lay every timeframe out in one array, separated by padding
+    lengths = np.array([len(frame) for _, frame in frames])
+    starts = np.concatenate([[0], np.cumsum(lengths + pad)[:-1]])
+    total = int(starts[-1] + lengths[-1])
+    lows = np.full(total, np.inf)
+    highs = np.full(total, -np.inf)
+    for (_, frame), start, length in zip(frames, starts, lengths):
+        lows[start:start + length] = frame['Low'].to_numpy(dtype=np.float64)
+        highs[start:start + length] = frame['High'].to_numpy(dtype=np.float64)
+
+    swing_lows = find_swing_points(lows, order, "low")
+    swing_highs = find_swing_points(highs, order, "high")
+
+    positions = np.concatenate([swing_lows, swing_highs])
+    prices = np.concatenate([lows[swing_lows], highs[swing_highs]])
+    segment = np.searchsorted(starts, positions, side='right') - 1
+    local = positions - starts[segment]
+
+    # Base bar of each swing, for recency and last touch
+    base_index = np.empty(len(positions), dtype=np.int64)
+    for level, (_, frame) in enumerate(frames):
+        in_level = segment == level
+        if level == 0:
+            base_index[in_level] = local[in_level]
+        else:
+            dates = pd.DatetimeIndex(frame['Date']).as_unit(base_dates.unit).asi8
+            base_index[in_level] = np.searchsorted(base_dates.asi8, dates[local[in_level]], side='left')
+    base_index = np.minimum(base_index, len(df) - 1)
+
+    minutes = np.array([TIMEFRAME_MINUTES.get(tf, 1) for tf, _ in frames], dtype=np.float64)
+    weights = 1.0 + np.log2(minutes / minutes[0])
+    recency = 1.0 + base_index / max(len(df) - 1, 1)
+    strength = weights[segment] * recency
+
+    if tolerance is None:
+        tolerance = float(np.nanmean(df['High'].to_numpy(dtype=np.float64) - df['Low'].to_numpy(dtype=np.float64))) \
+            if len(df) else 0.0
+
+    zones = []
+    if len(prices):
+        sort = np.argsort(prices, kind='stable')
+        sorted_prices = prices[sort]
+        cluster = np.r_[0, np.cumsum(np.diff(sorted_prices) > tolerance)]
+        bounds = np.flatnonzero(np.r_[True, np.diff(cluster) != 0])
+        n_zones = len(bounds)
+
+        zone_strength = np.bincount(cluster, weights=strength[sort], minlength=n_zones)
+        zone_mean = np.bincount(cluster, weights=sorted_prices * strength[sort], minlength=n_zones) / zone_strength
+        zone_touches = np.bincount(cluster, minlength=n_zones)
+        zone_low = sorted_prices[bounds]
+        zone_high = np.maximum.reduceat(sorted_prices, bounds)
+        zone_last = np.maximum.reduceat(base_index[sort], bounds)
+        zone_mask = np.bitwise_or.reduceat(np.left_shift(1, segment[sort]), bounds)
+
+        # Member price nearest the strength-weighted mean represents the zone
+        nearest = np.lexsort((np.abs(sorted_prices - zone_mean[cluster]), cluster))
+        zone_price = sorted_prices[nearest[np.r_[True, np.diff(cluster[nearest]) != 0]]]
+
+        zone_timeframes = [[tf for level, (tf, _) in enumerate(frames) if mask >> level & 1] for mask in zone_mask]
+        ranking = sorted(range(n_zones), key=lambda z: (-len(zone_timeframes[z]), -zone_strength[z]))
+        zones = [
+            {
+                'price': float(zone_price[z]),
+                'low': float(zone_low[z]),
+                'high': float(zone_high[z]),
+                'touches': int(zone_touches[z]),
+                'strength': float(zone_strength[z]),
+                'last_touch': int(zone_last[z]),
+                'timeframes': zone_timeframes[z]
+            }
+            for z in ranking
+        ]
+
+    close = float(df['Close'].iloc[-1]) if len(df) else np.nan
+    support_levels = [zone for zone in zones if zone['price'] <= close][:num_levels]
+    resistance_levels = [zone for zone in zones if zone['price'] > close][:num_levels]
+
+    base_lows = swing_lows[swing_lows < lengths[0]]
+    base_highs = swing_highs[swing_highs < lengths[0]]
+    return {
+        'swing_lows': base_lows,
+        'swing_highs': base_highs,
+        'support': np.array([zone['price'] for zone in support_levels]),
+        'resistance': np.array([zone['price'] for zone in resistance_levels]),
+        'support_levels': support_levels,
+        'resistance_levels': resistance_levels,
+        'zones': zones,
+        'timeframes': [tf for tf, _ in frames]
+    }
@@ -1,78 +1,54 @@
-import yfinance as yf
 import pandas as pd
-import streamlit as st
 from datetime import datetime, timedelta
-
-@st.cache_data(ttl=3600)
-def fetch_stock_data(symbol: str, start_date, end_date, interval: str = "1d") -> pd.DataFrame:
+from modules.backfill import DEFAULT_MAX_WORKERS, backfill
+from modules.data_store import get_store
+from modules.instrumentation import record_cache, span
+from modules.providers import DataProvider, get_provider
+from modules.resampler import PROVIDER_INTERVALS, base_interval, get_resampled
+from modules.scheduler import INTERACTIVE, SingleFlight, get_scheduler
+from modules.series_cache import get_series_cache
+
+# Sessions needing the same symbol's gaps filled wait for one backfill
+_backfills = SingleFlight("backfill")
+
+def fetch_stock_data(symbol: str, start_date, end_date, interval: str = "1d", provider: str = None) -> pd.DataFrame:
     """
-    Fetch stock data from Yahoo Finance with caching and proper handling of intraday data
+    Fetch stock data from the named provider (Yahoo Finance by default) with
+    caching and proper handling of intraday data
+
+    Results are kept in the process-wide series cache, so every session
+    asking for the same range shares one read-only copy of the bars, and
+    concurrent requests for it are loaded once.
     """
-    try:
-        # Debug logging
-        st.write(f"Debug: Fetching {interval} data for {symbol}")
-        st.write(f"Debug: Start date: {start_date}, End date: {end_date}")
+    provider_name = get_provider(provider).name
+    key = (provider_name, symbol.upper(), str(start_date), str(end_date), interval)
+    with span("fetch_stock_data", timeframe=interval):
+        return get_series_cache().get_or_load(
+            key, lambda: _fetch_stock_data(symbol, start_date, end_date, interval, provider_name)
+        )
 
+def _fetch_stock_data(symbol: str, start_date, end_date, interval: str = "1d", provider: str = None) -> pd.DataFrame:
+    # Only the app reports through Streamlit; batch use goes through load_timeframe
+    import streamlit as st
+
+    try:
         # Convert dates to datetime if they're not already
         if not isinstance(start_date, datetime):
             start_date = datetime.combine(start_date, datetime.min.time())
-            st.write(f"Debug: Converted start_date to {start_date}")
         if not isinstance(end_date, datetime):
             end_date = datetime.combine(end_date, datetime.max.time())
-            st.write(f"Debug: Converted end_date to {end_date}")
 
         # Handle special cases
         if interval == 'max':
             interval = '1d'
-        elif interval == '3m':
-            # For 3min data, we'll fetch 1min data and resample it
-            return fetch_and_resample_three_min(symbol, start_date, end_date)
-
-        # For intraday data, enforce date range limitations
-        current_date = datetime.now()
-        if interval == '1m':
-            max_days = 7
-            start_date = max(start_date, current_date - timedelta(days=max_days))
-            st.write(f"Debug: Adjusted 1m start_date to {start_date}")
-        elif interval == '15m':
-            max_days = 60
-            start_date = max(start_date, current_date - timedelta(days=max_days))
-            st.write(f"Debug: Adjusted 15m start_date to {start_date}")
-
-        # Ensure end_date is not in the future
-        end_date = min(end_date, current_date)
-        st.write(f"Debug: Final date range - Start: {start_date}, End: {end_date}")
 
         try:
-            # Create Ticker object and fetch data
-            stock = yf.Ticker(symbol)
-            df = stock.history(
-                start=start_date,
-                end=end_date,
-                interval=interval,
-                prepost=False
-            )
+            df = load_timeframe(symbol, start_date, end_date, interval, provider=get_provider(provider))
 
             if df.empty:
                 st.warning(f"No data available for {symbol} in the selected date range with {interval} interval.")
                 return pd.DataFrame()
 
-            # Reset index to make date a column and ensure proper datetime format
-            df = df.reset_index()
-
-            # Debug logging for column names
-            st.write(f"Debug: Available columns: {df.columns.tolist()}")
-
-            # Handle different date column names
-            date_column = 'Datetime' if 'Datetime' in df.columns else 'Date'
-            if date_column in df.columns:
-                df['Date'] = pd.to_datetime(df[date_column])
-                if date_column == 'Datetime':
-                    df = df.drop('Datetime', axis=1)
-            else:
-                st.error(f"No date column found. Available columns: {df.columns.tolist()}")
-                return pd.DataFrame()
-
             # Verify required columns exist
             required_columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
             if not all(col in df.columns for col in required_columns):
@@ -84,86 +60,83 @@ def fetch_stock_data(symbol: str, start_date, end_date, interval: str = "1d") ->
 
         except Exception as e:
             st.error(f"Error fetching data for {symbol}: {str(e)}")
-            st.write(f"Debug: Full error details: {type(e).__name__}: {str(e)}")
             return pd.DataFrame()
 
     except Exception as e:
         st.error(f"Error processing dates: {str(e)}")
-        st.write(f"Debug: Full error details: {type(e).__name__}: {str(e)}")
         return pd.DataFrame()
 
-def fetch_and_resample_three_min(symbol: str, start_date, end_date) -> pd.DataFrame:
+def load_timeframe(symbol: str, start_date: datetime, end_date: datetime, timeframe: str,
+                   provider: DataProvider = None, priority: int = INTERACTIVE) -> pd.DataFrame:
     """
-    Custom function to create 3-minute data by resampling 1-minute data
+    Load bars for any supported timeframe, derived from the symbol's stored
+    base series. This is the Streamlit-free core of fetch_stock_data.
+    priority orders the provider requests, see modules/scheduler.py.
     """
-    try:
-        st.write(f"Debug: Fetching 1-minute data for 3-minute resampling")
-
-        # Calculate the maximum allowed range for 1-minute data (7 days)
-        max_range = timedelta(days=7)
-        current_date = datetime.now()
-
-        # Adjust the date range to fetch only the last 7 days of data
-        adjusted_start = max(start_date, current_date - max_range)
-        adjusted_end = min(end_date, current_date)
+    # Every timeframe is derived from one stored base series per symbol
+    current_date = datetime.now()
+    base = base_interval(timeframe, start_date, current_date)
 
-        st.write(f"Debug: Adjusted date range for 3min - Start: {adjusted_start}, End: {adjusted_end}")
+    # For intraday data, enforce the provider's date range limitations
+    max_days = PROVIDER_INTERVALS[base]
+    if max_days is not None:
+        start_date = max(start_date, current_date - timedelta(days=max_days))
 
-        # Fetch 1-minute data
-        stock = yf.Ticker(symbol)
-        df = stock.history(
-            start=adjusted_start,
-            end=adjusted_end,
-            interval='1m',
-            prepost=False
-        )
-
-        if df.empty:
-            st.warning(f"No data available for {symbol} in the selected date range for 3-minute intervals.")
-            return pd.DataFrame()
-
-        # Debug logging for column names
-        st.write(f"Debug: Available columns before resampling: {df.reset_index().columns.tolist()}")
-
-        # Reset index to make date a column
-        df = df.reset_index()
-        date_column = 'Datetime' if 'Datetime' in df.columns else 'Date'
-        if date_column in df.columns:
-            df['Date'] = pd.to_datetime(df[date_column])
-            if date_column == 'Datetime':
-                df = df.drop('Datetime', axis=1)
-        else:
-            st.error(f"No date column found for 3min data. Available columns: {df.columns.tolist()}")
-            return pd.DataFrame()
-
-        # Resample to 3-minute intervals
-        df.set_index('Date', inplace=True)
-        resampled = df.resample('3T').agg({
-            'Open': 'first',
-            'High': 'max',
-            'Low': 'min',
-            'Close': 'last',
-            'Volume': 'sum'
-        }).dropna()
-
-        # Reset index to make date a column again
-        resampled = resampled.reset_index()
+    # Ensure end_date is not in the future
+    end_date = min(end_date, current_date)
 
-        # Debug logging for final resampled data
-        st.write(f"Debug: Final resampled columns: {resampled.columns.tolist()}")
+    with span("load_timeframe", timeframe=timeframe, base=base):
+        df = load_range(symbol, start_date, end_date, base, provider=provider, priority=priority)
+        return get_resampled(symbol, df, base, timeframe)
 
-        return resampled
-
-    except Exception as e:
-        st.error(f"Error creating 3-minute data for {symbol}: {str(e)}")
-        st.write(f"Debug: Full error details: {type(e).__name__}: {str(e)}")
-        return pd.DataFrame()
+def load_range(symbol: str, start_date: datetime, end_date: datetime, interval: str,
+               max_workers: int = DEFAULT_MAX_WORKERS, provider: DataProvider = None,
+               priority: int = INTERACTIVE) -> pd.DataFrame:
+    """
+    Serve a date range from the on-disk store, downloading only the head
+    and/or tail that the store does not hold yet. Gaps longer than one
+    provider request are backfilled as concurrent chunks.
 
-def cache_data(symbol: str, start_date, end_date, interval: str = "1d") -> pd.DataFrame:
+    Provider requests go through the provider's rate-limited scheduler.
+    While one caller backfills a symbol, others needing the same symbol
+    and interval wait for it and then only fetch what is still missing.
+    """
+    provider = provider or get_provider()
+    store = get_store(provider.name)
+    scheduler = get_scheduler(provider)
+
+    def fetch(symbol, chunk_start, chunk_end, interval):
+        key = (symbol.upper(), chunk_start, chunk_end, interval)
+        return scheduler.call(key, provider.history, symbol, chunk_start, chunk_end, interval, priority=priority)
+
+    filled = []
+
+    def fill(gaps):
+        filled.append(True)
+        for gap_start, gap_end in gaps:
+            with span("backfill", provider=provider.name, interval=interval):
+                backfill(fetch, store, symbol, gap_start, gap_end, interval, max_workers=max_workers)
+
+    flight_key = (provider.name, symbol.upper(), interval)
+    missing = store.missing_ranges(symbol, interval, start_date, end_date)
+    record_cache("store", hit=not missing)
+    if missing:
+        _backfills.do(flight_key, lambda: fill(missing))
+        if not filled:
+            # Another caller's backfill finished; fetch whatever it did not cover
+            missing = store.missing_ranges(symbol, interval, start_date, end_date)
+            if missing:
+                _backfills.do(flight_key, lambda: fill(missing))
+    with span("store.load", interval=interval):
+        return store.load(symbol, interval, start_date, end_date)
+
+def cache_data(symbol: str, start_date, end_date, interval: str = "1d", provider: str = None) -> pd.DataFrame:
     """
     Wrapper function to handle data caching and preprocessing
     """
-    df = fetch_stock_data(symbol, start_date, end_date, interval)
+    import streamlit as st
+
+    df = fetch_stock_data(symbol, start_date, end_date, interval, get_provider(provider).name)
 
     if not df.empty:
         # Ensure all required columns exist
@@ -0,0 +1,280 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from modules.quality import action_factor, apply_actions, corporate_actions, normalize_bars
+
+# Root directory of the on-disk store, overridable for deployments and CI
+DEFAULT_STORE_DIR = os.environ.get(
+    "STOCKCHART_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".ohlcv_store")
+)
+
+META_FILE = "meta.json"
+
+
+class OHLCVStore:
+    """
+    Persistent columnar OHLCV store keyed by (symbol, interval)
+
+    Every column of a series is kept as its own .npy file so reads can be
+    memory-mapped, and meta.json records which date ranges have already been
+    requested from the provider. Only the ranges that are not covered yet
+    need to be downloaded and appended. Bars are normalized on the way in
+    (modules/quality.py) with their quality flags stored as a 'Flags'
+    column.
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        self.root = root
+        self._lock = threading.RLock()
+
+    def _inside_root(self, *names: str) -> str:
+        path = os.path.join(self.root, *(_path_component(name) for name in names))
+        root = os.path.realpath(self.root)
+        if os.path.commonpath([root, os.path.realpath(path)]) != root:
+            raise ValueError(f"Store key {names!r} resolves outside {self.root}")
+        return path
+
+    def _key_dir(self, symbol: str, interval: str) -> str:
+        return self._inside_root(symbol.upper(), interval)
+
+    def _read_meta(self, symbol: str, interval: str) -> dict:
+        path = os.path.join(self._key_dir(symbol, interval), META_FILE)
+        if not os.path.exists(path):
+            return {'columns': [], 'tz': None, 'ranges': []}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_meta(self, symbol: str, interval: str, meta: dict):
+        key_dir = self._key_dir(symbol, interval)
+        tmp_path = os.path.join(key_dir, META_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(key_dir, META_FILE))
+
+    def covered_ranges(self, symbol: str, interval: str):
+        """
+        Return the merged list of (start, end) ranges already held in the store
+        """
+        with self._lock:
+            meta = self._read_meta(symbol, interval)
+        return [(datetime.fromisoformat(s), datetime.fromisoformat(e)) for s, e in meta['ranges']]
+
+    def missing_ranges(self, symbol: str, interval: str, start: datetime, end: datetime):
+        """
+        Return the parts of [start, end] that are not covered yet, normally
+        just the head and/or tail of the requested range
+        """
+        missing = []
+        cursor = start
+        for covered_start, covered_end in self.covered_ranges(symbol, interval):
+            if covered_end <= cursor:
+                continue
+            if covered_start >= end:
+                break
+            if covered_start > cursor:
+                missing.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+            if cursor >= end:
+                break
+        if cursor < end:
+            missing.append((cursor, end))
+        return missing
+
+    def actions(self, symbol: str, interval: str) -> list:
+        """
+        Splits and dividends seen for a series, each with the price 'factor'
+        applied to the bars before it (see quality.adjustment_factors)
+        """
+        with self._lock:
+            return self._read_meta(symbol, interval).get('actions') or []
+
+    def quality(self, symbol: str, interval: str) -> dict:
+        """
+        Report of the series' last normalization, see quality.normalize_bars
+        """
+        with self._lock:
+            return self._read_meta(symbol, interval).get('quality') or {}
+
+    def has_data(self, symbol: str, interval: str) -> bool:
+        with self._lock:
+            return bool(self._read_meta(symbol, interval)['columns'])
+
+    def load(self, symbol: str, interval: str, start: datetime = None, end: datetime = None) -> pd.DataFrame:
+        """
+        Load the stored series, optionally restricted to [start, end]
+
+        Bounds are compared against exchange wall-clock time, matching how
+        yfinance interprets naive start/end dates. attrs['store_revision']
+        changes whenever the stored series is rewritten.
+        """
+        with self._lock:
+            meta = self._read_meta(symbol, interval)
+            if not meta['columns']:
+                return pd.DataFrame()
+
+            key_dir = self._key_dir(symbol, interval)
+            dates = np.load(os.path.join(key_dir, "Date.npy"), mmap_mode='r')
+            wall_clock = pd.to_datetime(np.asarray(dates), unit='ns', utc=True)
+            if meta['tz']:
+                wall_clock = wall_clock.tz_convert(meta['tz'])
+            wall_clock = wall_clock.tz_localize(None)
+
+            lo = 0 if start is None else int(wall_clock.searchsorted(pd.Timestamp(start), side='left'))
+            hi = len(wall_clock) if end is None else int(wall_clock.searchsorted(pd.Timestamp(end), side='right'))
+
+            data = {}
+            for column in meta['columns']:
+                values = np.load(os.path.join(key_dir, f"{column}.npy"), mmap_mode='r')
+                data[column] = np.array(values[lo:hi])
+
+        date_index = pd.to_datetime(data['Date'], unit='ns', utc=True)
+        if meta['tz']:
+            date_index = date_index.tz_convert(meta['tz'])
+        else:
+            date_index = date_index.tz_localize(None)
+        data['Date'] = date_index
+        frame = pd.DataFrame(data, copy=False)
+        frame.attrs['store_revision'] = meta.get('revision', 0)
+        return frame
+
+    def append(self, symbol: str, interval: str, df: pd.DataFrame, start: datetime, end: datetime):
+        """
+        Merge newly fetched bars into the stored series and mark [start, end]
+        as covered. Newer bars win on duplicate timestamps.
+        """
+        self.append_ranges(symbol, interval, df, [(start, end)])
+
+    def append_ranges(self, symbol: str, interval: str, df: pd.DataFrame, ranges):
+        """
+        Merge bars fetched for several (start, end) ranges in one write, so
+        stitched backfill chunks cost a single rewrite of the series
+        """
+        with self._lock:
+            meta = self._read_meta(symbol, interval)
+            existing = self.load(symbol, interval)
+
+            if df is not None and not df.empty:
+                # Splits and dividends the stored bars do not reflect yet are
+                # applied to them; stores written before actions were
+                # recorded hold the ones already applied as columns
+                recorded = meta.get('actions')
+                if recorded is None:
+                    recorded = corporate_actions(existing)
+                    for action in recorded:
+                        action['factor'] = action_factor(action, adjusted=existing)
+                known = {(action['date'], action['split'], action['dividend']) for action in recorded}
+                new_actions = [action for action in corporate_actions(df)
+                               if (action['date'], action['split'], action['dividend']) not in known]
+                if new_actions and not existing.empty:
+                    existing = apply_actions(existing, new_actions, adjusted=df)
+                for action in new_actions:
+                    action.setdefault('factor', action_factor(action, adjusted=df))
+                meta['actions'] = sorted(recorded + new_actions, key=lambda action: action['date'])
+
+                merged = pd.concat([existing, df], ignore_index=True) if not existing.empty else df.copy()
+                merged, meta['quality'] = normalize_bars(merged, interval)
+                self._write_columns(symbol, interval, merged, meta)
+                last_bar = merged['Date'].iloc[-1]
+            elif existing.empty:
+                # Nothing stored and nothing returned: do not record coverage,
+                # the symbol may simply be invalid
+                return
+            else:
+                last_bar = existing['Date'].iloc[-1]
+
+            # The most recent bar may still be forming, so coverage that
+            # reaches the present stops at the last bar and it is refetched
+            last_bar_wall_clock = (last_bar.tz_localize(None) if last_bar.tzinfo else last_bar).to_pydatetime()
+            recent = datetime.now() - timedelta(days=1)
+            covered = [(datetime.fromisoformat(s), datetime.fromisoformat(e)) for s, e in meta['ranges']]
+            for start, end in ranges:
+                if end >= recent and last_bar_wall_clock > start:
+                    end = min(end, last_bar_wall_clock)
+                covered.append((start, end))
+
+            meta['ranges'] = [[s.isoformat(), e.isoformat()] for s, e in _merge_ranges(covered)]
+            self._write_meta(symbol, interval, meta)
+
+    def _write_columns(self, symbol: str, interval: str, df: pd.DataFrame, meta: dict):
+        key_dir = self._key_dir(symbol, interval)
+        os.makedirs(key_dir, exist_ok=True)
+
+        dates = pd.to_datetime(df['Date'])
+        meta['tz'] = str(dates.dt.tz) if dates.dt.tz is not None else None
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_convert('UTC')
+        columns = {'Date': dates.dt.as_unit('ns').astype('int64').to_numpy()}
+        for column in df.columns:
+            if column != 'Date' and pd.api.types.is_numeric_dtype(df[column]):
+                columns[column] = df[column].to_numpy()
+
+        for column, values in columns.items():
+            tmp_path = os.path.join(key_dir, f"{column}.tmp.npy")
+            np.save(tmp_path, values)
+            os.replace(tmp_path, os.path.join(key_dir, f"{column}.npy"))
+        meta['columns'] = list(columns)
+        # Corporate actions and re-fetches rewrite interior bars, so every
+        # rewrite gets a new revision; a clock stamp does not repeat after clear()
+        meta['revision'] = time.time_ns()
+
+    def clear(self, symbol: str = None, interval: str = None):
+        """
+        Remove stored data for one key, one symbol or the whole store
+        """
+        with self._lock:
+            if symbol is None:
+                path = self.root
+            elif interval is None:
+                path = self._inside_root(symbol.upper())
+            else:
+                path = self._key_dir(symbol, interval)
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _path_component(name: str) -> str:
+    """
+    name as one directory name: characters other than letters, digits and
+    . ^ = _ - ~ are percent-encoded, so symbols like BRK/B or ../x cannot
+    leave the store
+    """
+    component = quote(name, safe='^=')
+    if component in ('', '.', '..'):
+        raise ValueError(f"Invalid store key {name!r}")
+    return component
+
+
+def _merge_ranges(ranges):
+    """
+    Merge overlapping or touching (start, end) ranges
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(namespace: str = 'yahoo') -> OHLCVStore:
+    """
+    Return the process-wide store for one data provider, so replayed and
+    live data never mix
+    """
+    with _stores_lock:
+        if namespace not in _stores:
+            _stores[namespace] = OHLCVStore(os.path.join(DEFAULT_STORE_DIR, namespace))
+        return _stores[namespace]
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+# Plot area width of the page layout (utils.setup_page caps the app at 1200px)
+DEFAULT_PIXEL_WIDTH = 1200
+
+
+def bucket_bounds(n: int, n_buckets: int) -> np.ndarray:
+    """
+    Start index of each of n_buckets nearly equal-sized buckets over n bars
+    """
+    n_buckets = max(1, min(n, n_buckets))
+    return np.unique(np.linspace(0, n, n_buckets + 1).astype(np.int64)[:-1])
+
+
+def aggregate_ohlc(df: pd.DataFrame, n_buckets: int) -> pd.DataFrame:
+    """
+    Merge consecutive bars into at most n_buckets OHLCV bars
+
+    Each bucket keeps its first open, last close, highest high, lowest low
+    and total volume, so the price envelope of the original series is
+    preserved exactly. Buckets are labelled with their first timestamp.
+    """
+    if len(df) <= n_buckets:
+        return df
+
+    starts = bucket_bounds(len(df), n_buckets)
+    ends = np.append(starts[1:], len(df)) - 1
+    return pd.DataFrame({
+        'Date': df['Date'].to_numpy()[starts],
+        'Open': df['Open'].to_numpy()[starts],
+        'High': np.fmax.reduceat(df['High'].to_numpy(dtype=np.float64), starts),
+        'Low': np.fmin.reduceat(df['Low'].to_numpy(dtype=np.float64), starts),
+        'Close': df['Close'].to_numpy()[ends],
+        'Volume': np.add.reduceat(np.nan_to_num(df['Volume'].to_numpy(dtype=np.float64)), starts)
+    })
+
+
+def lttb_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices selected by Largest-Triangle-Three-Buckets downsampling
+
+    Points are spaced evenly in x (bar positions). The first and last points
+    are always kept; from every bucket in between the point forming the
+    largest triangle with the previous pick and the next bucket's mean is
+    chosen. NaN points are only picked when a bucket has nothing else.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=np.float64)
+    x = np.arange(n, dtype=np.float64)
+    bounds = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # Mean of every bucket, used as the third triangle vertex
+    bucket_x = np.append((bounds[:-1] + bounds[1:] - 1) / 2.0, n - 1)
+    sums = np.add.reduceat(np.nan_to_num(y[1:n - 1]), bounds[:-1] - 1)
+    counts = np.add.reduceat((~np.isnan(y[1:n - 1])).astype(np.float64), bounds[:-1] - 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bucket_y = np.append(sums / counts, y[-1])
+
+    # Plain floats and ints keep the per-bucket overhead down; areas are
+    # never negative, so NaN areas become -1 and argmax skips them
+    bounds = bounds.tolist()
+    bucket_x = bucket_x.tolist()
+    bucket_y = bucket_y.tolist()
+    previous = 0
+    for i in range(n_out - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        next_x, next_y = bucket_x[i + 1], bucket_y[i + 1]
+        if next_y != next_y:
+            next_y = np.nanmean(y[lo:hi]) if not np.all(np.isnan(y[lo:hi])) else 0.0
+        previous_y = float(y[previous])
+        if previous_y != previous_y:
+            previous_y = next_y
+        area = np.abs((previous - next_x) * (y[lo:hi] - previous_y)
+                      - (previous - x[lo:hi]) * (next_y - previous_y))
+        area[np.isnan(area)] = -1.0
+        previous = lo + int(area.argmax())
+        selected[i + 1] = previous
+    return selected
+
+
+def visible_window(df: pd.DataFrame, x_range=None):
+    """
+    Positional slice of df covering x_range = (start, end), or all of it
+    """
+    if x_range is None:
+        return 0, len(df)
+    dates = pd.DatetimeIndex(df['Date'])
+    start, end = (pd.Timestamp(x) for x in x_range)
+    if dates.tz is not None:
+        start = start.tz_localize(dates.tz) if start.tzinfo is None else start
+        end = end.tz_localize(dates.tz) if end.tzinfo is None else end
+    return int(dates.searchsorted(start, side='left')), int(dates.searchsorted(end, side='right'))
+
+
+def downsample_for_display(df: pd.DataFrame, trend_data: dict, max_points: int = DEFAULT_PIXEL_WIDTH,
+                           x_range=None, pyramid=None):
+    """
+    Reduce a series to about one bar per horizontal pixel of the visible window
+
+    Returns (candles, overlays): candles is the OHLC-aggregated frame and
+    overlays maps each trend_data series to its LTTB-selected (dates, values).
+    With a BarPyramid of df the candles are read from its precomputed
+    levels instead, so their cost depends on max_points rather than on the
+    window length; the window is found by the pyramid's binary search and
+    overlays still go through LTTB, keeping their spikes.
+    """
+    if pyramid is not None:
+        start, end = x_range if x_range is not None else (None, None)
+        level, level_lo, level_hi = pyramid.locate(start, end, max_points)
+        candles = pyramid.levels[level][level_lo:level_hi].to_frame()
+        lo, hi = pyramid.positions(start, end)
+    else:
+        lo, hi = visible_window(df, x_range)
+        candles = aggregate_ohlc(df.iloc[lo:hi], max_points)
+
+    # Only the picked dates are converted to timestamps
+    dates = df['Date'].iloc[lo:hi]
+    overlays = {}
+    for key in ('sma_fast', 'sma_slow', 'volatility'):
+        if key not in trend_data:
+            continue
+        values = np.asarray(trend_data[key], dtype=np.float64)[lo:hi]
+        keep = lttb_indices(values, max_points)
+        overlays[key] = (dates.iloc[keep].to_numpy(), values[keep])
+    return candles, overlays
@@ -0,0 +1,254 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+def trend_windows(timeframe: str = "1d"):
+    """
+    Fast and slow moving average periods used for a timeframe
+    """
+    if timeframe == "1m":
+        return 5, 15
+    elif timeframe in ["3m", "5m", "15m", "1h"]:
+        return 10, 30
+    return 20, 50
+
+
+def classify_trend(price, sma_fast, sma_slow, volatility, volatility_mean) -> str:
+    """
+    Trend label from the latest price, moving averages and volatility
+    """
+    if price > sma_fast and sma_fast > sma_slow:
+        return "Strong Uptrend" if volatility > volatility_mean else "Uptrend"
+    elif price < sma_fast and sma_fast < sma_slow:
+        return "Strong Downtrend" if volatility > volatility_mean else "Downtrend"
+    return "High Volatility Sideways" if volatility > volatility_mean else "Sideways"
+
+
+class _RunningSum:
+    """
+    Kahan-compensated sum over a fixed-size window
+
+    Like a pandas rolling mean, the mean is NaN while a NaN is inside the
+    window; NaNs are counted rather than added, so they leave with it.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.compensation = 0.0
+        self.nans = 0
+
+    def _add(self, value: float):
+        y = value - self.compensation
+        t = self.total + y
+        self.compensation = (t - self.total) - y
+        self.total = t
+
+    def push(self, value: float):
+        self.values.append(value)
+        if math.isnan(value):
+            self.nans += 1
+        else:
+            self._add(value)
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            if math.isnan(old):
+                self.nans -= 1
+            else:
+                self._add(-old)
+
+    def mean(self) -> float:
+        if len(self.values) < self.window or self.nans:
+            return math.nan
+        return self.total / self.window
+
+    def state(self):
+        return self.total, self.compensation, self.nans, self.values[0] if self.values else None, len(self.values)
+
+    def restore(self, state):
+        # Undo the most recent push
+        self.total, self.compensation, self.nans, first, length = state
+        self.values.pop()
+        if first is not None and len(self.values) < length:
+            self.values.appendleft(first)
+
+
+class _RollingVariance:
+    """
+    Welford-style sample variance over a fixed-size window
+
+    Values are added and removed one at a time over the finite values in
+    the window; the variance is NaN while a NaN or infinity is inside it,
+    as with a pandas rolling std.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.nans = 0
+
+    def _add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def _remove(self, value: float):
+        self.count -= 1
+        if self.count == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self.m2 -= delta * (value - self.mean)
+
+    def push(self, value: float):
+        self.values.append(value)
+        if not math.isfinite(value):
+            self.nans += 1
+        else:
+            self._add(value)
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            if not math.isfinite(old):
+                self.nans -= 1
+            else:
+                self._remove(old)
+
+    def std(self) -> float:
+        if len(self.values) < self.window or self.window < 2 or self.nans:
+            return math.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.window - 1))
+
+    def state(self):
+        return self.count, self.mean, self.m2, self.nans, self.values[0] if self.values else None, len(self.values)
+
+    def restore(self, state):
+        self.count, self.mean, self.m2, self.nans, first, length = state
+        self.values.pop()
+        if first is not None and len(self.values) < length:
+            self.values.appendleft(first)
+
+
+class TrendEngine:
+    """
+    Incremental version of calculate_trend
+
+    Each appended close updates the fast/slow SMAs, the volatility of
+    percentage changes, the running mean of that volatility and the trend
+    label in constant time. The most recent bar can be replaced while it
+    is still forming. result() returns the same structure as
+    calculate_trend, which remains the batch reference implementation.
+    """
+
+    def __init__(self, timeframe: str = "1d"):
+        self.timeframe = timeframe
+        self.fast_ma, self.slow_ma = trend_windows(timeframe)
+        self._fast = _RunningSum(self.fast_ma)
+        self._slow = _RunningSum(self.slow_ma)
+        # Price changes only start at the second bar, so the volatility
+        # window holds the fast_ma most recent valid changes
+        self._changes = _RollingVariance(self.fast_ma)
+        self._volatility_total = 0.0
+        self._volatility_count = 0
+        self._closes = []
+        self._sma_fast = []
+        self._sma_slow = []
+        self._volatility = []
+        self._checkpoint = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, timeframe: str = "1d") -> "TrendEngine":
+        engine = cls(timeframe)
+        engine.extend(df['Close'].to_numpy(dtype=np.float64))
+        return engine
+
+    def __len__(self):
+        return len(self._closes)
+
+    def extend(self, closes):
+        for close in closes:
+            self.update(float(close))
+
+    def update(self, close: float, replace_last: bool = False):
+        """
+        Append a bar's close, or replace the close of the last bar
+        """
+        if replace_last and self._closes:
+            self._rollback()
+
+        previous = self._closes[-1] if self._closes else None
+        self._checkpoint = (
+            self._fast.state(), self._slow.state(), self._changes.state(),
+            self._volatility_total, self._volatility_count
+        )
+
+        self._fast.push(close)
+        self._slow.push(close)
+        self._closes.append(close)
+        self._sma_fast.append(self._fast.mean())
+        self._sma_slow.append(self._slow.mean())
+
+        if previous is None:
+            self._volatility.append(math.nan)
+            self._checkpoint += (False,)
+            return
+
+        if previous == 0:
+            # As pandas: x / 0 is +-inf, and 0 / 0 or nan / 0 is nan
+            change = math.nan if close == 0 or math.isnan(close) else math.copysign(math.inf, close)
+        else:
+            change = close / previous - 1
+        self._changes.push(change)
+        volatility = self._changes.std()
+        self._volatility.append(volatility)
+        if not math.isnan(volatility):
+            self._volatility_total += volatility
+            self._volatility_count += 1
+        self._checkpoint += (True,)
+
+    def _rollback(self):
+        fast_state, slow_state, changes_state, total, count, pushed_change = self._checkpoint
+        self._fast.restore(fast_state)
+        self._slow.restore(slow_state)
+        if pushed_change:
+            self._changes.restore(changes_state)
+        self._volatility_total = total
+        self._volatility_count = count
+        for values in (self._closes, self._sma_fast, self._sma_slow, self._volatility):
+            values.pop()
+        self._checkpoint = None
+
+    @property
+    def volatility_mean(self) -> float:
+        if self._volatility_count == 0:
+            return math.nan
+        return self._volatility_total / self._volatility_count
+
+    @property
+    def trend(self) -> str:
+        return classify_trend(
+            self._closes[-1], self._sma_fast[-1], self._sma_slow[-1],
+            self._volatility[-1], self.volatility_mean
+        )
+
+    def result(self, index=None, tail: int = None):
+        """
+        Same dictionary as calculate_trend, for the bars seen so far or,
+        with tail, only the most recent tail bars
+        """
+        start = len(self._closes) - tail if tail is not None else 0
+        return {
+            'trend': self.trend,
+            'sma_fast': pd.Series(self._sma_fast[start:], index=index, dtype=np.float64),
+            'sma_slow': pd.Series(self._sma_slow[start:], index=index, dtype=np.float64),
+            'volatility': pd.Series(self._volatility[start:], index=index, dtype=np.float64)
+        }
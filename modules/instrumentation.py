@@ -0,0 +1,358 @@
+import functools
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+
+# Collection is off unless STOCKCHART_INSTRUMENTATION is set or enable() is called
+_enabled = os.environ.get("STOCKCHART_INSTRUMENTATION", "").lower() in ("1", "true", "yes", "on")
+
+# Recent span events kept for the diagnostics panel and JSON lines export
+EVENT_LIMIT = 10000
+
+# Upper bounds of the span duration histogram, in seconds
+SPAN_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, math.inf)
+
+METRIC_PREFIX = "stockchart"
+
+_lock = threading.Lock()
+_local = threading.local()
+_events = deque(maxlen=EVENT_LIMIT)
+_span_stats = {}
+_counters = {}
+# Gauges are read from callbacks when exported, so they cost nothing meanwhile
+_gauges = {}
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """
+    Drop all collected spans, events and counters
+    """
+    with _lock:
+        _events.clear()
+        _span_stats.clear()
+        _counters.clear()
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class _NullSpan:
+    """
+    Shared do-nothing span returned while collection is disabled
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _local.stack.pop()
+        _record_span(self.name, self.labels, self.parent, self.wall_start, duration, exc_type is not None)
+        return False
+
+
+def _record_span(name: str, labels: dict, parent, wall_start: float, duration: float, failed: bool):
+    key = (name, _label_key(labels))
+    event = {
+        'type': 'span',
+        'name': name,
+        'labels': dict(labels),
+        'parent': parent,
+        'start': wall_start,
+        'seconds': duration,
+        'thread': threading.current_thread().name,
+        'error': failed
+    }
+    with _lock:
+        stats = _span_stats.get(key)
+        if stats is None:
+            stats = _span_stats[key] = {
+                'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0,
+                'buckets': [0] * len(SPAN_BUCKETS)
+            }
+        stats['count'] += 1
+        stats['errors'] += failed
+        stats['total'] += duration
+        stats['max'] = max(stats['max'], duration)
+        for i, bound in enumerate(SPAN_BUCKETS):
+            if duration <= bound:
+                stats['buckets'][i] += 1
+                break
+        _events.append(event)
+
+
+def span(name: str, **labels):
+    """
+    Context manager timing a block of code
+
+        with span("provider.fetch", interval="1m"):
+            df = fetch()
+
+    Statistics are aggregated per name and labels, so labels should take
+    few distinct values (an interval, not a symbol). Spans nest per
+    thread; each event records its parent's name. While collection is
+    disabled this returns a shared no-op object.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, labels)
+
+
+def timed(name: str, **labels):
+    """
+    Decorator wrapping every call of a function in a span
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name, dict(labels)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(name: str, seconds: float, **labels):
+    """
+    Record a duration measured elsewhere, e.g. time spent queued, as a span
+    that ended now
+    """
+    if not _enabled:
+        return
+    _record_span(name, labels, None, time.time() - seconds, seconds, False)
+
+
+def increment(name: str, value: float = 1, **labels):
+    """
+    Add value to a counter
+    """
+    if not _enabled:
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def record_cache(cache: str, hit: bool):
+    """
+    Count one lookup of a named cache
+    """
+    if not _enabled:
+        return
+    increment("cache_requests", cache=cache)
+    if not hit:
+        increment("cache_misses", cache=cache)
+
+
+def register_gauge(name: str, read, **labels):
+    """
+    Export the value returned by read() as a gauge
+
+    Registration replaces any earlier callback for the same name and labels.
+    Gauges are reported whether or not collection is enabled.
+    """
+    with _lock:
+        _gauges[(name, _label_key(labels))] = read
+
+
+def _read_gauges():
+    with _lock:
+        gauges = list(_gauges.items())
+    values = []
+    for (name, labels), read in gauges:
+        try:
+            values.append(((name, labels), float(read())))
+        except Exception:
+            continue
+    return values
+
+
+def snapshot() -> dict:
+    """
+    Aggregated view of everything collected so far
+
+    Returns {'spans': [...], 'counters': [...], 'gauges': [...], 'caches': [...]}:
+    per span name and labels the call count, total/mean/max seconds; every
+    counter and gauge value; and the hit rate of each cache seen by
+    record_cache.
+    """
+    with _lock:
+        spans = [
+            {'name': name, 'labels': dict(labels), 'count': stats['count'], 'errors': stats['errors'],
+             'total_seconds': stats['total'], 'mean_seconds': stats['total'] / stats['count'],
+             'max_seconds': stats['max']}
+            for (name, labels), stats in _span_stats.items()
+        ]
+        counters = [
+            {'name': name, 'labels': dict(labels), 'value': value}
+            for (name, labels), value in _counters.items()
+        ]
+
+    gauges = [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in _read_gauges()]
+
+    caches = {}
+    for counter in counters:
+        if counter['name'] in ("cache_requests", "cache_misses"):
+            entry = caches.setdefault(counter['labels'].get('cache'), {'requests': 0, 'misses': 0})
+            entry['requests' if counter['name'] == "cache_requests" else 'misses'] += counter['value']
+    cache_rows = [
+        {'cache': cache, 'requests': entry['requests'], 'hits': entry['requests'] - entry['misses'],
+         'hit_rate': (entry['requests'] - entry['misses']) / entry['requests'] if entry['requests'] else math.nan}
+        for cache, entry in sorted(caches.items())
+    ]
+
+    spans.sort(key=lambda row: -row['total_seconds'])
+    counters.sort(key=lambda row: (row['name'], sorted(row['labels'].items())))
+    gauges.sort(key=lambda row: (row['name'], sorted(row['labels'].items())))
+    return {'spans': spans, 'counters': counters, 'gauges': gauges, 'caches': cache_rows}
+
+
+def recent_events(limit: int = None):
+    with _lock:
+        events = list(_events)
+    return events[-limit:] if limit else events
+
+
+def to_jsonl() -> str:
+    """
+    Recent span events followed by the current counter values, one JSON
+    object per line
+    """
+    lines = [json.dumps(event, default=str) for event in recent_events()]
+    now = time.time()
+    for counter in snapshot()['counters']:
+        lines.append(json.dumps({'type': 'counter', 'time': now, **counter}, default=str))
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def export_jsonl(path: str):
+    with open(path, "a") as f:
+        f.write(to_jsonl())
+
+
+def _metric_name(name: str) -> str:
+    return f"{METRIC_PREFIX}_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _format_labels(labels, **extra) -> str:
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in items
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def prometheus_text() -> str:
+    """
+    Spans and counters in the Prometheus text exposition format
+
+    Spans become one histogram, <prefix>_span_seconds, labelled with the
+    span name; counters become <prefix>_<name>_total and gauges
+    <prefix>_<name>.
+    """
+    with _lock:
+        span_stats = {key: dict(stats, buckets=list(stats['buckets'])) for key, stats in _span_stats.items()}
+        counters = dict(_counters)
+
+    lines = []
+    histogram = _metric_name("span_seconds")
+    if span_stats:
+        lines.append(f"# HELP {histogram} Duration of instrumented code spans")
+        lines.append(f"# TYPE {histogram} histogram")
+    for (name, labels), stats in sorted(span_stats.items()):
+        cumulative = 0
+        for bound, count in zip(SPAN_BUCKETS, stats['buckets']):
+            cumulative += count
+            le = "+Inf" if math.isinf(bound) else repr(bound)
+            lines.append(f"{histogram}_bucket{_format_labels(labels, span=name, le=le)} {cumulative}")
+        lines.append(f"{histogram}_sum{_format_labels(labels, span=name)} {stats['total']!r}")
+        lines.append(f"{histogram}_count{_format_labels(labels, span=name)} {stats['count']}")
+
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        metric = _metric_name(name) + "_total"
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} counter")
+            seen.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    for (name, labels), value in sorted(_read_gauges()):
+        metric = _metric_name(name)
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} gauge")
+            seen.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value!r}")
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """
+    Serve prometheus_text() at http://host:port/metrics from a daemon thread
+
+    Returns the server; call shutdown() on it to stop serving.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
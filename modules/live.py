@@ -0,0 +1,385 @@
+import base64
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from modules.data_handler import load_range
+from modules.data_store import get_store
+from modules.indicators import TrendEngine
+from modules.instrumentation import span
+from modules.providers import get_provider
+from modules.quality import normalize_bars
+from modules.resampler import PROVIDER_INTERVALS, base_interval, resample_ohlcv
+from modules.scheduler import INTERACTIVE, get_scheduler
+from modules.trendlines import TrendlineEngine
+from modules.visualization import build_chart_payload
+
+# Bars shown by the live chart, one regular session of 1m bars
+LIVE_WINDOW_BARS = 390
+
+# How often the page polls for new bars, in seconds
+LIVE_POLL_SECONDS = 10
+
+# New bars are written to the on-disk store once every this many polls
+FLUSH_EVERY_POLLS = 30
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class _BarBuffer:
+    """
+    Growable column arrays for the bars of one series
+
+    Appending and replacing the last bar are amortized O(1); tail() copies
+    out only the requested bars.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        dates = pd.DatetimeIndex(df['Date'])
+        self.tz = dates.tz
+        self.length = len(df)
+        capacity = max(64, 2 * self.length)
+        self.dates = np.empty(capacity, dtype=np.int64)
+        self.dates[:self.length] = dates.as_unit('ns').asi8
+        self.values = np.empty((len(OHLCV_COLUMNS), capacity), dtype=np.float64)
+        for i, column in enumerate(OHLCV_COLUMNS):
+            self.values[i, :self.length] = df[column].to_numpy(dtype=np.float64)
+
+    def __len__(self):
+        return self.length
+
+    def _grow(self):
+        capacity = 2 * len(self.dates)
+        self.dates = np.resize(self.dates, capacity)
+        values = np.empty((len(OHLCV_COLUMNS), capacity), dtype=np.float64)
+        values[:, :self.length] = self.values[:, :self.length]
+        self.values = values
+
+    def append(self, date: int, values):
+        if self.length == len(self.dates):
+            self._grow()
+        self.dates[self.length] = date
+        self.values[:, self.length] = values
+        self.length += 1
+
+    def set_last(self, values):
+        self.values[:, self.length - 1] = values
+
+    @property
+    def last_date(self) -> int:
+        return int(self.dates[self.length - 1])
+
+    def timestamp(self, date: int) -> pd.Timestamp:
+        stamp = pd.Timestamp(date, unit='ns', tz='UTC')
+        return stamp.tz_convert(self.tz) if self.tz is not None else stamp.tz_localize(None)
+
+    def last(self):
+        return self.timestamp(self.last_date), *self.values[:, self.length - 1]
+
+    def tail(self, n: int = None) -> pd.DataFrame:
+        start = 0 if n is None else max(0, self.length - n)
+        dates = pd.to_datetime(self.dates[start:self.length], unit='ns', utc=True)
+        dates = dates.tz_convert(self.tz) if self.tz is not None else dates.tz_localize(None)
+        frame = {'Date': dates}
+        for i, column in enumerate(OHLCV_COLUMNS):
+            frame[column] = self.values[i, start:self.length].copy()
+        return pd.DataFrame(frame, index=pd.RangeIndex(start, self.length))
+
+
+def _date_ns(dates) -> np.ndarray:
+    return pd.DatetimeIndex(dates).as_unit('ns').asi8
+
+
+class LiveSeries:
+    """
+    A symbol's series kept current by polling only for new bars
+
+    The history is loaded once from the store. Each poll() asks the
+    provider for the base-interval bars since the last one held, normalizes
+    them like bars entering the store (modules/quality.py), re-derives
+    just the still-open timeframe bar from them, and feeds the changes to a
+    TrendEngine and a TrendlineEngine, so the cost of a tick does not
+    depend on how much history is loaded. Support/resistance levels are
+    re-clustered only when a new swing point is confirmed. New base bars
+    are merged into the on-disk store every flush_every polls.
+    """
+
+    def __init__(self, symbol: str, timeframe: str, start_date: datetime, provider=None,
+                 flush_every: int = FLUSH_EVERY_POLLS, now: datetime = None):
+        self.symbol = symbol.upper()
+        self.timeframe = timeframe
+        self.provider = provider or get_provider()
+        self.flush_every = flush_every
+
+        now = now or datetime.now()
+        self.base = base_interval(timeframe, start_date, now)
+        max_days = PROVIDER_INTERVALS[self.base]
+        if max_days is not None:
+            start_date = max(start_date, now - timedelta(days=max_days))
+
+        base_df = load_range(self.symbol, start_date, now, self.base, provider=self.provider)
+        if base_df.empty:
+            raise ValueError(f"No {self.base} data available for {self.symbol}")
+        bars = resample_ohlcv(base_df, timeframe) if self.base != timeframe else base_df
+
+        self._bars = _BarBuffer(bars)
+        # Base bars of the still-open timeframe bar, re-aggregated on every tick
+        self._open_bucket = base_df[_date_ns(base_df['Date']) >= self._bars.last_date].reset_index(drop=True)
+        self._last_base_date = base_df['Date'].iloc[-1]
+
+        self.trend = TrendEngine.from_frame(bars, timeframe)
+        self.trendline_engine = TrendlineEngine.from_frame(bars.iloc[:-1], timeframe)
+        self.support_resistance = self.trendline_engine.support_resistance()
+
+        self._pending = []
+        self._polls_since_flush = 0
+        self._flush_from = self._wall_clock(self._last_base_date)
+
+    def __len__(self):
+        return len(self._bars)
+
+    @staticmethod
+    def _wall_clock(stamp: pd.Timestamp) -> datetime:
+        return (stamp.tz_localize(None) if stamp.tzinfo else stamp).to_pydatetime()
+
+    def poll(self, now: datetime = None):
+        """
+        Fetch and apply bars newer than the last one held
+
+        Returns None when nothing changed, otherwise a dict with
+        'replaced_last' (the open bar was updated), 'appended' (number of
+        new bars), 'levels_changed' and 'bars', the changed bars.
+        """
+        now = now or datetime.now()
+        since = self._wall_clock(self._last_base_date)
+        scheduler = get_scheduler(self.provider)
+
+        with span("live.poll", interval=self.base):
+            # Sessions following the same symbol share one request per tick
+            fetched = scheduler.call(
+                (self.symbol, since, self.base, 'live'),
+                self.provider.history, self.symbol, since, now + timedelta(minutes=1), self.base,
+                priority=INTERACTIVE
+            )
+        if fetched is None or fetched.empty:
+            return None
+
+        fetched = fetched[fetched['Date'] >= self._last_base_date]
+        if fetched.empty:
+            return None
+        # Clean polled bars as the store would; the open bucket's bars give
+        # a missing close something to carry forward
+        bars, _ = normalize_bars(pd.concat([self._open_bucket, fetched], ignore_index=True), self.base)
+        fetched = bars[bars['Date'] >= self._last_base_date].reset_index(drop=True)
+        if fetched.empty:
+            return None
+        if len(fetched) == 1 and fetched['Date'].iloc[0] == self._last_base_date:
+            # Only the last base bar came back; skip the tick if it has not moved
+            last = self._open_bucket[OHLCV_COLUMNS].to_numpy(dtype=np.float64)[-1]
+            if np.array_equal(fetched[OHLCV_COLUMNS].to_numpy(dtype=np.float64)[0], last):
+                return None
+
+        self._pending.append(fetched)
+        self._polls_since_flush += 1
+        update = self._apply(fetched)
+        if self._polls_since_flush >= self.flush_every:
+            self.flush(now)
+        return update
+
+    def _apply(self, fetched: pd.DataFrame) -> dict:
+        bucket = self._open_bucket
+        bucket = pd.concat([bucket[bucket['Date'] < fetched['Date'].iloc[0]], fetched], ignore_index=True)
+        rows = resample_ohlcv(bucket, self.timeframe) if self.base != self.timeframe else bucket
+        row_dates = _date_ns(rows['Date'])
+        self._open_bucket = bucket[_date_ns(bucket['Date']) >= row_dates[-1]].reset_index(drop=True)
+        self._last_base_date = fetched['Date'].iloc[-1]
+
+        swings = self.trendline_engine.swing_count
+        replaced_last = False
+        appended = 0
+        values = rows[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+        for date, bar in zip(row_dates, values):
+            if date == self._bars.last_date:
+                self._bars.set_last(bar)
+                self.trend.update(float(bar[3]), replace_last=True)
+                replaced_last = True
+            elif date > self._bars.last_date:
+                # The previous bar just closed
+                last_date, _, high, low, close, _ = self._bars.last()
+                self.trendline_engine.update(last_date, high, low, close)
+                self._bars.append(date, bar)
+                self.trend.update(float(bar[3]))
+                appended += 1
+
+        levels_changed = self.trendline_engine.swing_count != swings
+        if levels_changed:
+            self.support_resistance = self.trendline_engine.support_resistance()
+
+        return {
+            'replaced_last': replaced_last,
+            'appended': appended,
+            'levels_changed': levels_changed,
+            'bars': self._bars.tail(appended + replaced_last)
+        }
+
+    def flush(self, now: datetime = None):
+        """
+        Merge the bars received since the last flush into the on-disk store
+        """
+        if not self._pending:
+            return
+        now = now or datetime.now()
+        fetched = pd.concat(self._pending, ignore_index=True).drop_duplicates(subset='Date', keep='last')
+        with span("live.flush", interval=self.base):
+            get_store(self.provider.name).append_ranges(self.symbol, self.base, fetched, [(self._flush_from, now)])
+        self._pending = []
+        self._polls_since_flush = 0
+        self._flush_from = self._wall_clock(self._last_base_date)
+
+    def frame(self, tail: int = None) -> pd.DataFrame:
+        return self._bars.tail(tail)
+
+    def trend_data(self, tail: int = None, index=None) -> dict:
+        return self.trend.result(index=index, tail=tail)
+
+    def trendlines(self, window: int = None) -> dict:
+        """
+        Current trendlines, with starts clipped to the last window bars
+        """
+        last_date, _, _, _, close, _ = self._bars.last()
+        return self.clip_trendlines(self.trendline_engine.lines(last_close=close, last_date=last_date), window)
+
+    def clip_trendlines(self, lines: dict, window: int = None) -> dict:
+        """
+        Trendlines from trendlines() with starts clipped to the last window bars
+        """
+        if window is None:
+            return lines
+
+        first = len(self._bars) - window
+        if first <= 0:
+            return lines
+        first_date = self._bars.timestamp(int(self._bars.dates[first]))
+        clipped = {}
+        for side, side_lines in lines.items():
+            clipped[side] = []
+            for line in side_lines:
+                line = dict(line)
+                if line['start'] < first:
+                    line['y0'] = line['y0'] + line['slope'] * (first - line['start'])
+                    line['x0'] = first_date
+                    line['start'] = first
+                clipped[side].append(line)
+        return clipped
+
+
+def _as_list(values) -> list:
+    """
+    Plain list of a trace array, decoding plotly's base64 typed arrays
+    """
+    if isinstance(values, dict) and 'bdata' in values:
+        return np.frombuffer(base64.b64decode(values['bdata']), dtype=values['dtype']).tolist()
+    return list(values)
+
+
+def _line_signature(trendlines: dict):
+    return tuple(
+        (side, line['start'], line['y0'], line['slope'], line['broken'])
+        for side, lines in sorted(trendlines.items()) for line in lines
+    )
+
+
+class LiveChart:
+    """
+    Chart payload of a LiveSeries' last window bars, patched in place
+
+    apply() extends the candle, volume and indicator traces with new bars,
+    patches the open bar, drops bars that scrolled out of the window and
+    moves trendline ends. The payload is only rebuilt when levels or the
+    set of trendlines change, so a tick costs O(window) at most.
+    """
+
+    def __init__(self, series: LiveSeries, window: int = LIVE_WINDOW_BARS):
+        self.series = series
+        self.window = window
+        self.build()
+
+    def build(self):
+        df = self.series.frame(self.window)
+        trend_data = self.series.trend_data(tail=len(df), index=df.index)
+        lines = self.series.trendlines()
+        trendlines = self.series.clip_trendlines(lines, self.window)
+        payload = build_chart_payload(df, self.series.support_resistance, trend_data, trendlines)
+        self._line_signature = _line_signature(lines)
+
+        for trace in payload['data']:
+            for key in ('x', 'y', 'open', 'high', 'low', 'close'):
+                if key in trace:
+                    trace[key] = _as_list(trace[key])
+            if trace.get('type') == 'bar' and 'color' in trace.get('marker', {}):
+                trace['marker']['color'] = _as_list(trace['marker']['color'])
+
+        self.payload = payload
+        self._volume_mean = float(df['Volume'].mean())
+        self._traces = {trace.get('name'): trace for trace in payload['data']}
+
+    def _patch(self, trace: dict, columns: dict, replace_last: bool):
+        for key, values in columns.items():
+            target = trace['marker']['color'] if key == 'marker.color' else trace[key]
+            if replace_last:
+                target[-1] = values[0]
+                values = values[1:]
+            target.extend(values)
+            overflow = len(target) - self.window
+            if overflow > 0:
+                del target[:overflow]
+
+    def apply(self, update):
+        """
+        Apply a LiveSeries.poll() result and return the delta sent to the chart
+
+        The delta maps trace names to the new points per field ('extend')
+        and, when the open bar changed, its replacement values ('patch').
+        """
+        if update is None:
+            return None
+        lines = self.series.trendlines()
+        if update['levels_changed'] or _line_signature(lines) != self._line_signature:
+            self.build()
+            return {'rebuilt': True}
+
+        bars = update['bars']
+        replace_last = update['replaced_last']
+        trend_data = self.series.trend_data(tail=len(bars))
+        dates = list(bars['Date'])
+        colors = np.where(bars['Close'].to_numpy() < bars['Open'].to_numpy(), '#8B4513', '#B87333').tolist()
+        columns = {
+            'OHLC': {'x': dates, 'open': bars['Open'].tolist(), 'high': bars['High'].tolist(),
+                     'low': bars['Low'].tolist(), 'close': bars['Close'].tolist()},
+            'Fast MA': {'x': dates, 'y': trend_data['sma_fast'].tolist()},
+            'Slow MA': {'x': dates, 'y': trend_data['sma_slow'].tolist()},
+            'Volume': {'x': dates, 'y': bars['Volume'].tolist(), 'marker.color': colors},
+            'Volatility': {'x': dates, 'y': (trend_data['volatility'] * self._volume_mean).tolist()}
+        }
+
+        delta = {'rebuilt': False, 'patch': {}, 'extend': {}}
+        for name, fields in columns.items():
+            trace = self._traces.get(name)
+            if trace is None:
+                continue
+            self._patch(trace, fields, replace_last)
+            if replace_last:
+                delta['patch'][name] = {key: values[0] for key, values in fields.items()}
+            delta['extend'][name] = {key: values[replace_last:] for key, values in fields.items()}
+
+        # Trendlines run to the last bar and start inside the window
+        trendlines = self.series.clip_trendlines(lines, self.window)
+        for side in ('support', 'resistance'):
+            for i, line in enumerate(trendlines.get(f'{side}_lines', [])):
+                for name, trace in self._traces.items():
+                    if name and name.startswith(f"{side.title()} Trendline {i+1} "):
+                        trace['x'] = [line['x0'], line['x1']]
+                        trace['y'] = [line['y0'], line['y1']]
+                        delta['patch'][name] = {'x': trace['x'], 'y': trace['y']}
+        return delta
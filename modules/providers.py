@@ -0,0 +1,325 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from modules.resampler import TIMEFRAME_NANOS
+
+# Exchange session used for synthetic intraday bars
+SESSION_TZ = 'America/New_York'
+SESSION_OPEN_MINUTES = 9 * 60 + 30
+SESSION_CLOSE_MINUTES = 16 * 60
+
+# Daily persistence of the synthetic price level
+ANCHOR_REVERSION = 0.999
+
+# Seconds a single provider request may take
+DEFAULT_REQUEST_TIMEOUT = 10.0
+
+
+class ProviderError(Exception):
+    """
+    Raised when a provider request fails
+    """
+
+
+class DataProvider:
+    """
+    Source of raw OHLCV history
+
+    history() returns a DataFrame with a 'Date' column plus Open, High,
+    Low, Close and Volume, or an empty DataFrame when there is no data.
+    """
+
+    name = 'base'
+    # Requests per second the provider tolerates (None: unlimited) and how
+    # many may be sent back to back; enforced by modules/scheduler.py
+    rate_limit = None
+    burst = 1
+    # Seconds a single request may take before it fails (None: no limit)
+    timeout = DEFAULT_REQUEST_TIMEOUT
+
+    def history(self, symbol: str, start_date: datetime, end_date: datetime, interval: str) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class YahooProvider(DataProvider):
+    """
+    Live data from Yahoo Finance through yfinance
+
+    yfinance keeps one shared HTTP session for all tickers (a
+    requests.Session in the pinned 0.2.x releases), so connections to
+    Yahoo are reused across symbols and threads; each request is bounded
+    by timeout.
+    """
+
+    name = 'yahoo'
+    rate_limit = 2.0
+    burst = 5
+
+    def __init__(self, timeout: float = DEFAULT_REQUEST_TIMEOUT):
+        self.timeout = timeout
+
+    def history(self, symbol: str, start_date: datetime, end_date: datetime, interval: str) -> pd.DataFrame:
+        import yfinance as yf
+
+        stock = yf.Ticker(symbol)
+        df = stock.history(
+            start=start_date,
+            end=end_date,
+            interval=interval,
+            prepost=False,
+            timeout=self.timeout
+        )
+
+        if df.empty:
+            return pd.DataFrame()
+
+        # Reset index to make date a column and ensure proper datetime format
+        df = df.reset_index()
+
+        # Handle different date column names
+        date_column = 'Datetime' if 'Datetime' in df.columns else 'Date'
+        if date_column not in df.columns:
+            raise ProviderError(f"No date column found. Available columns: {df.columns.tolist()}")
+        df['Date'] = pd.to_datetime(df[date_column])
+        if date_column == 'Datetime':
+            df = df.drop('Datetime', axis=1)
+
+        return df
+
+
+class ReplayProvider(DataProvider):
+    """
+    Offline provider for benchmarks and load tests
+
+    Serves {SYMBOL}_{interval}.csv/.parquet (or {SYMBOL}.csv/.parquet)
+    fixtures from fixtures_dir when present, and otherwise a synthetic
+    random walk. Synthetic bars are a pure function of (seed, symbol,
+    interval, timestamp), so overlapping requests always agree.
+    Every request can be delayed by latency seconds plus an exponential
+    jitter, and fails with ProviderError with probability error_rate or
+    when the delay exceeds timeout.
+    rate_limit and burst declare a Yahoo-like request budget for the
+    scheduler; calls counts the requests actually served.
+    """
+
+    name = 'replay'
+
+    def __init__(self, fixtures_dir: str = None, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0, volatility: float = 0.001,
+                 rate_limit: float = None, burst: int = 1, timeout: float = None):
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.volatility = volatility
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.timeout = timeout
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def history(self, symbol: str, start_date: datetime, end_date: datetime, interval: str) -> pd.DataFrame:
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self._random.expovariate(1 / self.jitter) if self.jitter > 0 else 0.0)
+            fail = self._random.random() < self.error_rate
+        if self.timeout is not None and delay > self.timeout:
+            time.sleep(self.timeout)
+            raise ProviderError(f"Replay request for {symbol} {interval} timed out after {self.timeout}s")
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise ProviderError(f"Injected replay error for {symbol} {interval}")
+
+        fixture = self._load_fixture(symbol, interval)
+        if fixture is not None:
+            wall_clock = fixture['Date'].dt.tz_localize(None) if fixture['Date'].dt.tz is not None else fixture['Date']
+            mask = (wall_clock >= pd.Timestamp(start_date)) & (wall_clock < pd.Timestamp(end_date))
+            return fixture[mask].reset_index(drop=True)
+
+        return synthetic_ohlcv(symbol, start_date, end_date, interval, seed=self.seed, volatility=self.volatility)
+
+    def _load_fixture(self, symbol: str, interval: str):
+        if not self.fixtures_dir:
+            return None
+        for name in (f"{symbol.upper()}_{interval}", symbol.upper()):
+            for extension, reader in (('.parquet', pd.read_parquet), ('.csv', pd.read_csv)):
+                path = os.path.join(self.fixtures_dir, name + extension)
+                if os.path.exists(path):
+                    df = reader(path)
+                    if 'Datetime' in df.columns:
+                        df = df.rename(columns={'Datetime': 'Date'})
+                    df['Date'] = _parse_dates(df['Date'])
+                    return df.sort_values('Date').reset_index(drop=True)
+        return None
+
+
+def _parse_dates(dates: pd.Series) -> pd.Series:
+    """
+    Parse fixture timestamps, keeping exchange time for offset-aware values
+    """
+    if len(dates) and pd.Timestamp(dates.iloc[0]).tzinfo is not None:
+        return pd.to_datetime(dates, utc=True).dt.tz_convert(SESSION_TZ)
+    return pd.to_datetime(dates)
+
+
+def _hash_uniform(*keys) -> np.ndarray:
+    """
+    Counter-based uniform(0, 1) numbers from int64 keys (splitmix64)
+    """
+    with np.errstate(over='ignore'):
+        x = np.zeros(np.broadcast(*keys).shape, dtype=np.uint64)
+        for key in keys:
+            x = (x ^ np.asarray(key).astype(np.uint64)) + np.uint64(0x9E3779B97F4A7C15)
+            x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            x = x ^ (x >> np.uint64(31))
+    return ((x >> np.uint64(11)).astype(np.float64) + 0.5) / float(1 << 53)
+
+
+def _hash_normal(*keys) -> np.ndarray:
+    u1 = _hash_uniform(*keys, 1)
+    u2 = _hash_uniform(*keys, 2)
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+
+def _symbol_key(symbol: str, seed: int) -> int:
+    key = seed
+    for char in symbol.upper():
+        key = (key * 131 + ord(char)) % (1 << 62)
+    return key
+
+
+def session_timestamps(start_date: datetime, end_date: datetime, interval: str) -> pd.DatetimeIndex:
+    """
+    Bar timestamps the exchange would print between start_date and end_date
+    """
+    if interval == '1mo':
+        grid = pd.date_range(pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date), freq='MS')
+    elif interval == '1d':
+        grid = pd.date_range(pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date), freq='D')
+        grid = grid[grid.dayofweek < 5]
+    else:
+        step = pd.Timedelta(TIMEFRAME_NANOS[interval], unit='ns')
+        grid = pd.date_range(pd.Timestamp(start_date).ceil(step), pd.Timestamp(end_date), freq=step)
+        minutes = grid.hour * 60 + grid.minute
+        grid = grid[(grid.dayofweek < 5) & (minutes >= SESSION_OPEN_MINUTES) & (minutes < SESSION_CLOSE_MINUTES)]
+    grid = grid[(grid >= pd.Timestamp(start_date)) & (grid < pd.Timestamp(end_date))]
+    return grid.tz_localize(SESSION_TZ, ambiguous=np.ones(len(grid), dtype=bool), nonexistent='shift_forward')
+
+
+def synthetic_ohlcv(symbol: str, start_date: datetime, end_date: datetime, interval: str = '1d',
+                    seed: int = 0, volatility: float = 0.001, start_price: float = 100.0) -> pd.DataFrame:
+    """
+    Deterministic random-walk OHLCV bars
+
+    Each session opens at a level taken from a daily random walk anchored at
+    2000-01-03, and intraday closes walk from that open with per-bar returns
+    hashed from the bar timestamp.
+    """
+    # Intraday paths start at the session open, so generate whole days
+    timestamps = session_timestamps(pd.Timestamp(start_date).normalize(), end_date, interval)
+    if len(timestamps) == 0:
+        return pd.DataFrame()
+
+    symbol_key = _symbol_key(symbol, seed)
+    wall_clock = timestamps.tz_localize(None)
+    bar_keys = wall_clock.as_unit('ns').asi8
+    day_ordinal = np.clip((wall_clock.normalize() - pd.Timestamp('2000-01-03')).days.to_numpy(), 0, None)
+    daily_volatility = volatility * np.sqrt(390)
+
+    # Daily anchor walk from the origin up to the last requested day. It is
+    # slightly mean-reverting (AR(1) in log price) so prices stay in a
+    # realistic band over decades
+    day_returns = daily_volatility * _hash_normal(symbol_key, np.arange(day_ordinal.max() + 1), 0)
+    decay = ANCHOR_REVERSION ** np.arange(len(day_returns))
+    log_level = decay * np.cumsum(day_returns / decay)
+    day_open = start_price * np.exp(np.r_[0.0, log_level[:-1]])
+    session_open = day_open[day_ordinal]
+
+    if interval in ('1d', '1mo'):
+        bar_volatility = daily_volatility * (np.sqrt(21) if interval == '1mo' else 1.0)
+        open_ = session_open
+        close = open_ * np.exp(bar_volatility * _hash_normal(symbol_key, bar_keys, 3))
+    else:
+        bar_volatility = volatility * np.sqrt(TIMEFRAME_NANOS[interval] / TIMEFRAME_NANOS['1m'])
+        log_returns = bar_volatility * _hash_normal(symbol_key, bar_keys, 4)
+        new_session = np.r_[True, day_ordinal[1:] != day_ordinal[:-1]]
+        cumulative = np.cumsum(log_returns)
+        session_base = (cumulative - log_returns)[new_session][np.cumsum(new_session) - 1]
+        close = session_open * np.exp(cumulative - session_base)
+        open_ = np.r_[session_open[0], close[:-1]]
+        open_[new_session] = session_open[new_session]
+
+    wick = bar_volatility * np.abs(_hash_normal(symbol_key, bar_keys, 6)) / 2
+    high = np.maximum(open_, close) * np.exp(wick)
+    low = np.minimum(open_, close) * np.exp(-wick * _hash_uniform(symbol_key, bar_keys, 7))
+    volume = np.floor(1e5 * np.exp(0.5 * _hash_normal(symbol_key, bar_keys, 8)))
+
+    df = pd.DataFrame({
+        'Date': timestamps,
+        'Open': open_,
+        'High': high,
+        'Low': low,
+        'Close': close,
+        'Volume': volume
+    })
+    return df[wall_clock >= pd.Timestamp(start_date)].reset_index(drop=True)
+
+
+_providers = {}
+_builtins_registered = False
+_default_provider_name = None
+_providers_lock = threading.Lock()
+
+
+def register_provider(provider: DataProvider, default: bool = False):
+    """
+    Make a provider available by name, optionally as the default
+
+    A provider registered as 'yahoo' or 'replay' replaces the built-in one.
+    """
+    global _default_provider_name
+    with _providers_lock:
+        _providers[provider.name] = provider
+        if default:
+            _default_provider_name = provider.name
+
+
+def get_provider(name: str = None) -> DataProvider:
+    """
+    Return a registered provider, or the default one
+
+    The default is chosen by STOCKCHART_PROVIDER ('yahoo' or 'replay'),
+    and STOCKCHART_FETCH_TIMEOUT bounds every request in seconds.
+    The replay provider reads STOCKCHART_REPLAY_DIR, STOCKCHART_REPLAY_LATENCY,
+    STOCKCHART_REPLAY_JITTER, STOCKCHART_REPLAY_ERROR_RATE,
+    STOCKCHART_REPLAY_SEED and STOCKCHART_REPLAY_RATE.
+    """
+    global _builtins_registered, _default_provider_name
+    with _providers_lock:
+        if not _builtins_registered:
+            # Built-ins fill in around providers registered before first use
+            _builtins_registered = True
+            timeout = os.environ.get('STOCKCHART_FETCH_TIMEOUT')
+            _providers.setdefault('yahoo', YahooProvider(timeout=float(timeout) if timeout else DEFAULT_REQUEST_TIMEOUT))
+            _providers.setdefault('replay', ReplayProvider(
+                fixtures_dir=os.environ.get('STOCKCHART_REPLAY_DIR'),
+                latency=float(os.environ.get('STOCKCHART_REPLAY_LATENCY', 0)),
+                jitter=float(os.environ.get('STOCKCHART_REPLAY_JITTER', 0)),
+                error_rate=float(os.environ.get('STOCKCHART_REPLAY_ERROR_RATE', 0)),
+                seed=int(os.environ.get('STOCKCHART_REPLAY_SEED', 0)),
+                rate_limit=float(os.environ['STOCKCHART_REPLAY_RATE']) if os.environ.get('STOCKCHART_REPLAY_RATE') else None,
+                timeout=float(timeout) if timeout else None
+            ))
+        if _default_provider_name is None:
+            _default_provider_name = os.environ.get('STOCKCHART_PROVIDER', 'yahoo')
+        return _providers[name or _default_provider_name]
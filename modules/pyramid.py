@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from modules.bars import Bars
+
+# Consecutive bars merged per level; 2 keeps any query between half and
+# all of the requested points, for one extra copy of the base in total
+PYRAMID_FACTOR = 2
+
+# Levels stop once they are this short
+PYRAMID_MIN_BARS = 256
+
+
+def build_levels(bars: Bars, factor: int = PYRAMID_FACTOR, min_bars: int = PYRAMID_MIN_BARS) -> list:
+    """
+    Coarser and coarser copies of bars, each merging factor consecutive
+    bars of the previous level
+
+    Bucket i of level k covers base bars [i * factor**k, (i + 1) * factor**k),
+    labelled with its first timestamp, keeping the first open, last close,
+    highest high, lowest low and total volume like aggregate_ohlc.
+    Returns [bars, level 1, level 2, ...].
+    """
+    levels = [bars]
+    while len(levels[-1]) > min_bars:
+        previous = levels[-1]
+        starts = np.arange(0, len(previous), factor)
+        ends = np.minimum(starts + factor, len(previous)) - 1
+        levels.append(Bars(
+            previous.dates[starts],
+            previous.open[starts],
+            np.fmax.reduceat(previous.high, starts),
+            np.fmin.reduceat(previous.low, starts),
+            previous.close[ends],
+            np.add.reduceat(np.nan_to_num(previous.volume), starts),
+            tz=previous.tz,
+            unit=previous.unit
+        ))
+    return levels
+
+
+class BarPyramid:
+    """
+    Multi-resolution OHLCV levels of one series for range queries
+
+    query(start, end, max_points) finds the range in the base timestamps
+    with two binary searches and returns a view of the finest level that
+    fits it in max_points bars: O(log n + k), whatever the range length.
+    """
+
+    def __init__(self, levels: list, factor: int = PYRAMID_FACTOR):
+        self.levels = levels
+        self.factor = factor
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, factor: int = PYRAMID_FACTOR,
+                   min_bars: int = PYRAMID_MIN_BARS) -> "BarPyramid":
+        return cls(build_levels(Bars.from_frame(df), factor, min_bars), factor)
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels[1:])
+
+    def _epoch(self, value) -> int:
+        base = self.levels[0]
+        stamp = pd.Timestamp(value)
+        if base.tz is not None:
+            stamp = stamp.tz_localize(base.tz) if stamp.tzinfo is None else stamp
+        elif stamp.tzinfo is not None:
+            stamp = stamp.tz_localize(None)
+        # Timestamp.value is always in nanoseconds; asm8 keeps the unit
+        return int(stamp.as_unit(base.unit).asm8.view(np.int64))
+
+    def positions(self, start=None, end=None):
+        """
+        Base bar range [lo, hi) covering start..end (naive times are in the
+        series' own timezone)
+        """
+        dates = self.levels[0].dates
+        lo = 0 if start is None else int(np.searchsorted(dates, self._epoch(start), side='left'))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, self._epoch(end), side='right'))
+        return lo, hi
+
+    def locate(self, start=None, end=None, max_points: int = None):
+        """
+        (level, lo, hi): the finest level whose buckets covering the range
+        number at most max_points, and their positions in it
+        """
+        lo, hi = self.positions(start, end)
+        level = 0
+        if max_points is not None:
+            while level + 1 < len(self.levels) and hi - lo > max_points:
+                level += 1
+                lo, hi = lo // self.factor, -(-hi // self.factor)
+        return level, lo, hi
+
+    def query(self, start=None, end=None, max_points: int = None) -> Bars:
+        """
+        Bars of the range at the finest resolution that fits max_points
+        """
+        level, lo, hi = self.locate(start, end, max_points)
+        return self.levels[level][lo:hi]
@@ -0,0 +1,248 @@
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay,
+                                    USMartinLutherKingJr, USMemorialDay, USPresidentsDay,
+                                    USThanksgivingDay, nearest_workday)
+
+from modules.resampler import INTRADAY_TIMEFRAMES, TIMEFRAME_NANOS
+
+# Bit flags kept per bar in the stored 'Flags' column
+FLAG_GAP = 1           # bars or whole sessions are missing right before this bar
+FLAG_FILLED = 2        # prices were missing or invalid and were filled in
+FLAG_REPAIRED = 4      # high/low did not contain open and close and were widened
+FLAG_ZERO_VOLUME = 8   # nothing traded
+FLAG_ADJUSTED = 16     # rescaled by the store for a split or dividend seen later
+
+# Flags recording a fix; the data no longer shows why, so they are kept
+STICKY_FLAGS = FLAG_FILLED | FLAG_REPAIRED | FLAG_ADJUSTED
+
+FLAG_NAMES = {
+    FLAG_GAP: 'gap',
+    FLAG_FILLED: 'filled',
+    FLAG_REPAIRED: 'repaired',
+    FLAG_ZERO_VOLUME: 'zero_volume',
+    FLAG_ADJUSTED: 'adjusted',
+}
+
+OHLC_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+# Corporate action columns returned by yfinance
+DIVIDEND_COLUMN = 'Dividends'
+SPLIT_COLUMN = 'Stock Splits'
+
+
+class ExchangeHolidayCalendar(AbstractHolidayCalendar):
+    """
+    Full-day US equity market holidays, so closed sessions are not gaps
+    """
+    rules = [
+        Holiday('New Years Day', month=1, day=1, observance=nearest_workday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday)
+    ]
+
+
+def _holidays(first_day, last_day) -> np.ndarray:
+    return ExchangeHolidayCalendar().holidays(first_day, last_day).to_numpy().astype('datetime64[D]')
+
+
+def session_gaps(dates, interval: str) -> np.ndarray:
+    """
+    True for every bar preceded by missing bars
+
+    A bar follows a gap when a trading day was skipped since the previous
+    bar or, for intraday intervals, when it is more than one bar after the
+    previous bar of the same session.
+    """
+    dates = pd.DatetimeIndex(dates)
+    gaps = np.zeros(len(dates), dtype=bool)
+    if len(dates) < 2:
+        return gaps
+
+    wall_clock = dates.tz_localize(None) if dates.tz is not None else dates
+    days = wall_clock.to_numpy().astype('datetime64[D]')
+    holidays = _holidays(days[0], days[-1])
+    gaps[1:] = np.busday_count(days[:-1], days[1:], holidays=holidays) > 1
+
+    if interval in INTRADAY_TIMEFRAMES:
+        nanos = wall_clock.as_unit('ns').asi8
+        same_session = days[1:] == days[:-1]
+        gaps[1:] |= same_session & (np.diff(nanos) > TIMEFRAME_NANOS[interval])
+    return gaps
+
+
+def normalize_bars(df: pd.DataFrame, interval: str):
+    """
+    Validate and clean a series as it enters the store
+
+    In one vectorized pass: bars without a timestamp are dropped and
+    duplicate timestamps keep the last bar; non-positive prices count as
+    missing, a missing close carries the previous close forward and a
+    missing open, high or low takes the bar's close (bars before the first
+    close are dropped); missing volume is zero; high and low are widened to
+    contain open and close. Each bar's 'Flags' records what was done and
+    whether it follows a gap or traded nothing, on top of the fixes already
+    flagged by earlier runs.
+
+    Returns (df, report), report counting dropped and duplicate rows and the
+    bars carrying each flag.
+    """
+    rows = len(df)
+    df = df[df['Date'].notna()]
+    dropped = rows - len(df)
+    df = df.drop_duplicates(subset='Date', keep='last')
+    duplicates = rows - dropped - len(df)
+    df = df.sort_values('Date', kind='stable').reset_index(drop=True)
+
+    if 'Flags' in df.columns:
+        flags = df['Flags'].fillna(0).to_numpy(dtype=np.uint8) & STICKY_FLAGS
+    else:
+        flags = np.zeros(len(df), dtype=np.uint8)
+
+    prices = df[OHLC_COLUMNS].to_numpy(dtype=np.float64, copy=True)
+    prices[~(prices > 0)] = np.nan
+    missing = np.isnan(prices).any(axis=1)
+
+    # Forward-fill the close through the positions of its last valid value
+    close = prices[:, 3]
+    last_valid = np.maximum.accumulate(np.where(np.isnan(close), 0, np.arange(len(close))))
+    close = close[last_valid] if len(close) else close
+    prices[:, 3] = close
+    for column in range(3):
+        prices[:, column] = np.where(np.isnan(prices[:, column]), close, prices[:, column])
+
+    high = np.max(prices, axis=1)
+    low = np.min(prices, axis=1)
+    repaired = (high > prices[:, 1]) | (low < prices[:, 2])
+    prices[:, 1] = high
+    prices[:, 2] = low
+
+    volume = df['Volume'].to_numpy(dtype=np.float64, copy=True)
+    volume[~(volume > 0)] = 0.0
+
+    flags |= np.where(missing, FLAG_FILLED, 0).astype(np.uint8)
+    flags |= np.where(repaired & ~missing, FLAG_REPAIRED, 0).astype(np.uint8)
+    flags |= np.where(volume == 0, FLAG_ZERO_VOLUME, 0).astype(np.uint8)
+    flags |= np.where(session_gaps(df['Date'], interval), FLAG_GAP, 0).astype(np.uint8)
+
+    df = df.copy()
+    for column, values in zip(OHLC_COLUMNS, prices.T):
+        df[column] = values
+    if not pd.api.types.is_integer_dtype(df['Volume']):
+        df['Volume'] = volume
+    df['Flags'] = flags
+
+    # Nothing to carry into bars before the first valid close
+    valid = ~np.isnan(close)
+    if not valid.all():
+        dropped += int((~valid).sum())
+        df = df[valid].reset_index(drop=True)
+        flags = flags[valid]
+
+    report = {'rows': len(df), 'dropped': dropped, 'duplicates': duplicates}
+    for flag, name in FLAG_NAMES.items():
+        report[name] = int(np.count_nonzero(flags & flag))
+    return df, report
+
+
+def corporate_actions(df: pd.DataFrame) -> list:
+    """
+    Splits and dividends in a provider frame as [{'date', 'split', 'dividend'}]
+    """
+    if df is None or df.empty:
+        return []
+    none = np.zeros(len(df))
+    split = df[SPLIT_COLUMN].fillna(0).to_numpy(dtype=np.float64) if SPLIT_COLUMN in df.columns else none
+    dividend = df[DIVIDEND_COLUMN].fillna(0).to_numpy(dtype=np.float64) if DIVIDEND_COLUMN in df.columns else none
+    dates = pd.DatetimeIndex(df['Date'])
+    return [
+        {'date': dates[row].isoformat(), 'split': float(split[row]), 'dividend': float(dividend[row])}
+        for row in np.flatnonzero((split != 0) | (dividend != 0))
+    ]
+
+
+def _previous_close(df: pd.DataFrame, date: pd.Timestamp):
+    position = pd.DatetimeIndex(df['Date']).searchsorted(date, side='left')
+    return float(df['Close'].iloc[position - 1]) if position > 0 else None
+
+
+def action_factor(action: dict, raw: pd.DataFrame = None, adjusted: pd.DataFrame = None) -> float:
+    """
+    Price factor of one action for bars before its date
+
+    Splits scale prices by 1 / ratio. A dividend scales them by
+    1 - dividend / previous close, taken from raw (not yet adjusted) bars,
+    or equivalently close / (close + dividend) from already adjusted ones;
+    the dividend is on the post-split basis when both fall on one bar.
+    """
+    split = 1.0 / action['split'] if action['split'] else 1.0
+    if not action['dividend']:
+        return split
+    date = pd.Timestamp(action['date'])
+    if raw is not None and not raw.empty:
+        close = _previous_close(raw, date)
+        if close:
+            return split * (1.0 - action['dividend'] / (close * split))
+    if adjusted is not None and not adjusted.empty:
+        close = _previous_close(adjusted, date)
+        if close:
+            return split * close / (close + action['dividend'])
+    return split
+
+
+def apply_actions(df: pd.DataFrame, actions, adjusted: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Rescale stored bars for actions the provider has already applied to
+    newly fetched (adjusted) bars
+
+    Latest actions go first, so each dividend factor is computed on a
+    close already adjusted for later splits. Bars before an action's date
+    are scaled and flagged FLAG_ADJUSTED, and every action gets its
+    'factor'.
+    """
+    df = df.copy()
+    dates = pd.DatetimeIndex(df['Date'])
+    flags = df['Flags'].fillna(0).to_numpy(dtype=np.uint8, copy=True) if 'Flags' in df.columns \
+        else np.zeros(len(df), dtype=np.uint8)
+    for action in sorted(actions, key=lambda action: action['date'], reverse=True):
+        factor = action_factor(action, df, adjusted)
+        action['factor'] = factor
+        position = dates.searchsorted(pd.Timestamp(action['date']), side='left')
+        if position == 0 or factor == 1.0:
+            continue
+        for column in OHLC_COLUMNS:
+            values = df[column].to_numpy(dtype=np.float64, copy=True)
+            values[:position] *= factor
+            df[column] = values
+        if action['split']:
+            volume = df['Volume'].to_numpy(dtype=np.float64, copy=True)
+            volume[:position] *= action['split']
+            df['Volume'] = volume
+            if DIVIDEND_COLUMN in df.columns:
+                dividends = df[DIVIDEND_COLUMN].to_numpy(dtype=np.float64, copy=True)
+                dividends[:position] /= action['split']
+                df[DIVIDEND_COLUMN] = dividends
+        flags[:position] |= FLAG_ADJUSTED
+    df['Flags'] = flags
+    return df
+
+
+def adjustment_factors(dates, actions) -> np.ndarray:
+    """
+    Cumulative price factor of every bar: the stored (adjusted) price
+    divided by the price originally traded
+    """
+    dates = pd.DatetimeIndex(dates)
+    multipliers = np.ones(len(dates) + 1)
+    for action in actions:
+        position = dates.searchsorted(pd.Timestamp(action['date']), side='left')
+        multipliers[position] *= action.get('factor', 1.0)
+    # Product over every action dated after each bar
+    return np.cumprod(multipliers[::-1])[::-1][1:]
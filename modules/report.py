@@ -0,0 +1,383 @@
+import argparse
+import base64
+import html
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from modules.batch import DEFAULT_FETCH_WORKERS, load_symbols, read_symbols
+from modules.confluence import confluence_levels
+from modules.downsampling import DEFAULT_PIXEL_WIDTH
+from modules.providers import get_provider
+from modules.technical_analysis import calculate_support_resistance, calculate_trend
+from modules.trendlines import detect_trendlines
+from modules.visualization import apply_chart_layout, build_chart_payload
+
+PLOTLYJS_MODES = ('cdn', 'inline', 'directory')
+
+# Trace attributes holding one value per bar
+ARRAY_KEYS = ('x', 'y', 'open', 'high', 'low', 'close')
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{plotlyjs}
+<style>
+body {{ background: #28231e; color: #D4AF37; font-family: Georgia, serif; margin: 0 auto; max-width: 1200px; }}
+a {{ color: #B87333; }}
+.chart {{ height: 900px; margin-bottom: 2em; }}
+.error {{ color: #CD5C5C; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+{body}
+<script>
+// Charts are drawn when scrolled near, so long reports open quickly
+const report = {figures};
+const resolve = (value) => (value && value.shared !== undefined) ? report.shared[value.shared] : value;
+const observer = new IntersectionObserver((entries) => {{
+  for (const entry of entries) {{
+    if (!entry.isIntersecting) continue;
+    observer.unobserve(entry.target);
+    const figure = report.figures[entry.target.id];
+    const data = figure.data.map((trace) => Object.fromEntries(
+      Object.entries(trace).map(([key, value]) => [key, resolve(value)])));
+    const layout = Object.assign({{}}, figure.layout, {{template: resolve(figure.layout.template)}});
+    Plotly.newPlot(entry.target, data, layout, {{responsive: true}});
+  }}
+}}, {{rootMargin: '900px'}});
+document.querySelectorAll('.chart').forEach((div) => observer.observe(div));
+</script>
+</body>
+</html>
+"""
+
+
+def _typed_array(values, dtype: str):
+    """
+    values as a plotly.js base64 typed array
+
+    Numbers are cast to dtype. Dates become float64 milliseconds of wall
+    clock time, which 'date' axes read like the timestamps the app sends.
+    Anything else (colors, labels) is returned as is.
+    """
+    if isinstance(values, dict):
+        # Already a typed array; 2-d ones are left alone
+        if 'bdata' not in values or values.get('shape'):
+            return values
+        array = np.frombuffer(base64.b64decode(values['bdata']), dtype=values['dtype'])
+    else:
+        array = np.asarray(values)
+
+    if array.dtype.kind in 'fiu':
+        array = array.astype(dtype)
+    elif array.dtype.kind == 'M' or (array.dtype.kind == 'O' and len(array) and
+                                     isinstance(array[0], (pd.Timestamp, datetime))):
+        dates = pd.DatetimeIndex(array)
+        if dates.tz is not None:
+            dates = dates.tz_localize(None)
+        array = dates.as_unit('ms').asi8.astype(np.float64)
+    else:
+        return values
+    return {'dtype': array.dtype.str.lstrip('<|='), 'bdata': base64.b64encode(array.tobytes()).decode('ascii')}
+
+
+def pack_figure(figure: dict, dtype: str = 'f4') -> dict:
+    """
+    Figure JSON with every per-bar array encoded as a base64 typed array
+
+    Prices and volumes are cast to dtype ('f4' halves the size again and
+    keeps seven significant digits); the x axes are made 'date' axes so
+    the numeric timestamps display as dates.
+    """
+    data = []
+    for trace in figure['data']:
+        trace = dict(trace)
+        for key in ARRAY_KEYS:
+            if key in trace:
+                trace[key] = _typed_array(trace[key], dtype)
+        data.append(trace)
+
+    # The layout may be shared with the chart cache; copy what changes
+    layout = dict(figure['layout'])
+    for axis in ('xaxis', 'xaxis2'):
+        layout[axis] = dict(layout.get(axis, {}), type='date')
+    return {'data': data, 'layout': layout}
+
+
+def render_symbol(symbol: str, df: pd.DataFrame, timeframe: str = "1d", confluence: bool = False,
+                  max_points: int = DEFAULT_PIXEL_WIDTH, dtype: str = 'f4') -> dict:
+    """
+    Analyze one symbol and build its chart as the app does, returning the
+    packed figure with the trend and last close for the report
+    """
+    trend_data = calculate_trend(df, timeframe)
+    if confluence:
+        support_resistance = confluence_levels(df, timeframe)
+    else:
+        support_resistance = calculate_support_resistance(df, timeframe)
+    trendlines = detect_trendlines(df, support_resistance)
+
+    # Same traces and layout as create_price_chart, without building a
+    # validated Figure object for each symbol
+    if max_points is not None and len(df) <= max_points:
+        max_points = None
+    payload = build_chart_payload(df, support_resistance, trend_data, trendlines, max_points)
+    figure = apply_chart_layout(payload, symbol, timeframe, as_dict=True)
+    return {
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'trend': trend_data['trend'],
+        'close': float(df['Close'].iloc[-1]),
+        'last_bar': df['Date'].iloc[-1].isoformat(),
+        'figure': pack_figure(figure, dtype),
+        'error': None
+    }
+
+
+def build_report(symbols, timeframe: str = "1d", start_date: datetime = None, end_date: datetime = None,
+                 provider=None, fetch_workers: int = DEFAULT_FETCH_WORKERS, workers: int = None,
+                 loader=None, confluence: bool = False, max_points: int = DEFAULT_PIXEL_WIDTH,
+                 dtype: str = 'f4') -> list:
+    """
+    Chart every symbol, returning one render_symbol result per symbol in
+    input order
+
+    Symbols are loaded by load_symbols on threads and charted on a pool of
+    worker processes (workers, default one per CPU), since building
+    figures is CPU-bound Python. A symbol that cannot be loaded or charted
+    gets a row with only 'symbol', 'timeframe' and 'error' set.
+    """
+    workers = workers or os.cpu_count() or 1
+    # Fetch threads are running when workers start, so avoid plain fork
+    context = multiprocessing.get_context('forkserver' if sys.platform != 'win32' else 'spawn')
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context) if workers > 1 else None
+    pending = []
+    try:
+        for symbol, df, error in load_symbols(symbols, timeframe, start_date, end_date,
+                                              provider, fetch_workers, loader):
+            if error is not None:
+                pending.append((symbol, None, error))
+            elif pool is not None:
+                pending.append((symbol, pool.submit(render_symbol, symbol, df, timeframe, confluence,
+                                                    max_points, dtype), None))
+            else:
+                try:
+                    pending.append((symbol, render_symbol(symbol, df, timeframe, confluence, max_points, dtype),
+                                    None))
+                except Exception as e:
+                    pending.append((symbol, None, e))
+
+        results = []
+        for symbol, result, error in pending:
+            if error is None and pool is not None:
+                try:
+                    result = result.result()
+                except Exception as e:
+                    error = e
+            if error is not None:
+                result = {'symbol': symbol, 'timeframe': timeframe, 'error': str(error)}
+            results.append(result)
+        return results
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def _plotlyjs_tag(mode: str, out_dir: str) -> str:
+    from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+    if mode == "inline":
+        return f'<script type="text/javascript">{get_plotlyjs()}</script>'
+    if mode == "directory":
+        # One copy of the bundle next to the reports
+        bundle = os.path.join(out_dir, "plotly.min.js")
+        if not os.path.exists(bundle):
+            with open(bundle, "w", encoding="utf-8") as f:
+                f.write(get_plotlyjs())
+        return '<script src="plotly.min.js"></script>'
+    return f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+
+
+def _figures_json(results) -> str:
+    """
+    The figures of a page as {'figures': {div id: figure}, 'shared': [...]}
+
+    Every trace repeats the bar dates and every layout the same template,
+    so identical arrays and templates are stored once in 'shared' and
+    referenced as {'shared': index}.
+    """
+    from plotly.io.json import to_json_plotly
+
+    shared = []
+    index = {}
+
+    def share(value):
+        key = to_json_plotly(value)
+        if key not in index:
+            index[key] = len(shared)
+            shared.append(value)
+        return {'shared': index[key]}
+
+    figures = {}
+    for i, result in enumerate(results):
+        if result['error']:
+            continue
+        data = []
+        for trace in result['figure']['data']:
+            trace = dict(trace)
+            for key in ARRAY_KEYS:
+                if isinstance(trace.get(key), dict) and 'bdata' in trace[key]:
+                    trace[key] = share(trace[key])
+            data.append(trace)
+        layout = dict(result['figure']['layout'])
+        if 'template' in layout:
+            layout['template'] = share(layout['template'])
+        figures[f"chart-{i}"] = {'data': data, 'layout': layout}
+
+    # Keep a closing tag inside a string from ending the script early
+    return to_json_plotly({'figures': figures, 'shared': shared}).replace("</", "<\\/")
+
+
+def _sections(results) -> str:
+    sections = []
+    for i, result in enumerate(results):
+        symbol = html.escape(result['symbol'])
+        if result['error']:
+            sections.append(f'<h2 id="{symbol}">{symbol}</h2>\n'
+                            f'<p class="error">{html.escape(result["error"])}</p>')
+            continue
+        sections.append(
+            f'<h2 id="{symbol}">{symbol}</h2>\n'
+            f'<p>{html.escape(result["trend"])}, last close {result["close"]:,.2f} '
+            f'({html.escape(result["last_bar"])})</p>\n'
+            f'<div class="chart" id="chart-{i}"></div>'
+        )
+    return "\n".join(sections)
+
+
+def _write_page(path: str, title: str, body: str, results, plotlyjs: str):
+    out_dir = os.path.dirname(os.path.abspath(path))
+    page = REPORT_TEMPLATE.format(
+        title=html.escape(title),
+        plotlyjs=_plotlyjs_tag(plotlyjs, out_dir),
+        body=body,
+        figures=_figures_json(results)
+    )
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(page)
+    os.replace(tmp_path, path)
+
+
+def _page_name(symbol: str, taken: set) -> str:
+    # Symbols such as BRK/B or ../x must not leave the output directory
+    name = re.sub(r'[^A-Za-z0-9^=._-]', '_', symbol).lstrip('.') or '_'
+    unique = name
+    suffix = 1
+    while unique.lower() in taken:
+        suffix += 1
+        unique = f"{name}-{suffix}"
+    taken.add(unique.lower())
+    return unique + ".html"
+
+
+def write_report(results, out: str, per_symbol: bool = False, plotlyjs: str = "cdn", title: str = None):
+    """
+    Write the charts as one HTML report, or with per_symbol as one page per
+    symbol plus an index.html in the out directory
+
+    plotly.js is loaded once per page from the CDN, inlined ('inline', for
+    offline viewing) or from a single plotly.min.js written next to the
+    pages ('directory'). Returns the paths written.
+    """
+    if plotlyjs not in PLOTLYJS_MODES:
+        raise ValueError(f"plotlyjs must be one of {', '.join(PLOTLYJS_MODES)}")
+    title = title or f"Watchlist report ({datetime.now():%Y-%m-%d %H:%M})"
+
+    if not per_symbol:
+        _write_page(out, title, _sections(results), results, plotlyjs)
+        return [out]
+
+    os.makedirs(out, exist_ok=True)
+    paths = []
+    links = []
+    taken = {"index"}
+    for result in results:
+        symbol = result['symbol']
+        if result['error']:
+            links.append(f'<li>{html.escape(symbol)}: <span class="error">{html.escape(result["error"])}</span></li>')
+            continue
+        page = _page_name(symbol, taken)
+        path = os.path.join(out, page)
+        _write_page(path, f"{symbol} ({result['timeframe']})", _sections([result]), [result], plotlyjs)
+        paths.append(path)
+        links.append(f'<li><a href="{html.escape(quote(page))}">{html.escape(symbol)}</a>: '
+                     f'{html.escape(result["trend"])}, last close {result["close"]:,.2f}</li>')
+
+    index = os.path.join(out, "index.html")
+    with open(index, "w", encoding="utf-8") as f:
+        f.write(f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{html.escape(title)}</title>\n'
+                f'</head>\n<body>\n<h1>{html.escape(title)}</h1>\n<ul>\n' + "\n".join(links) +
+                '\n</ul>\n</body>\n</html>\n')
+    return paths + [index]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a static HTML chart report for a watchlist")
+    parser.add_argument("symbols", nargs="+",
+                        help="Symbols, or files with one symbol per line ('-' reads stdin)")
+    parser.add_argument("--timeframe", default="1d")
+    parser.add_argument("--days", type=int, default=365, help="History to chart, in days")
+    parser.add_argument("--provider", default=None, help="Data provider name (default: STOCKCHART_PROVIDER)")
+    parser.add_argument("--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS)
+    parser.add_argument("--workers", type=int, default=None, help="Chart-building processes (default: one per CPU)")
+    parser.add_argument("--confluence", action="store_true", help="Draw multi-timeframe confluence zones")
+    parser.add_argument("--max-points", type=int, default=DEFAULT_PIXEL_WIDTH,
+                        help="Aggregate longer series to about this many bars (0 keeps every bar)")
+    parser.add_argument("--float64", action="store_true", help="Embed prices at full double precision")
+    parser.add_argument("--per-symbol", action="store_true",
+                        help="Write one page per symbol and an index.html into the --out directory")
+    parser.add_argument("--plotlyjs", choices=PLOTLYJS_MODES, default="cdn",
+                        help="Load plotly.js from the CDN, inline it, or write one plotly.min.js next to the pages")
+    parser.add_argument("--title", default=None)
+    parser.add_argument("--out", default=None, help="Report file, or directory with --per-symbol "
+                                                    "(default: report.html or report/)")
+    args = parser.parse_args(argv)
+
+    symbols = read_symbols(args.symbols)
+    end_date = datetime.now()
+    results = build_report(
+        symbols,
+        timeframe=args.timeframe,
+        start_date=end_date - timedelta(days=args.days),
+        end_date=end_date,
+        provider=get_provider(args.provider),
+        fetch_workers=args.fetch_workers,
+        workers=args.workers,
+        confluence=args.confluence,
+        max_points=args.max_points or None,
+        dtype='f8' if args.float64 else 'f4'
+    )
+    out = args.out or ("report" if args.per_symbol else "report.html")
+    for path in write_report(results, out, args.per_symbol, args.plotlyjs, args.title):
+        print(path, file=sys.stderr)
+
+    failed = [result['symbol'] for result in results if result['error']]
+    if failed:
+        print(f"No charts for {', '.join(failed)}", file=sys.stderr)
+    return 1 if symbols and len(failed) == len(symbols) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import threading
+
+import numpy as np
+import pandas as pd
+
+from modules.instrumentation import record_cache, span
+
+# Bar length of every fixed-size timeframe, in nanoseconds
+TIMEFRAME_NANOS = {
+    '1m': 60 * 10**9,
+    '3m': 3 * 60 * 10**9,
+    '5m': 5 * 60 * 10**9,
+    '15m': 15 * 60 * 10**9,
+    '1h': 60 * 60 * 10**9,
+    '1d': 24 * 60 * 60 * 10**9,
+}
+
+# Hourly bars are anchored on the 9:30 session open rather than on the hour
+TIMEFRAME_OFFSETS = {
+    '1h': 30 * 60 * 10**9,
+}
+
+# Intervals the provider can serve directly, finest first, with how many
+# days of history it keeps for each (None means unlimited). Ranges longer
+# than one request are backfilled in chunks, see modules/backfill.py.
+# Yahoo rejects 1m requests starting more than 30 days back, hence 29.
+PROVIDER_INTERVALS = OrderedDict([
+    ('1m', 29),
+    ('5m', 60),
+    ('15m', 60),
+    ('1h', 730),
+    ('1d', None),
+])
+
+INTRADAY_TIMEFRAMES = ['1m', '3m', '5m', '15m', '1h']
+
+OHLCV_AGGREGATIONS = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum',
+    'Flags': 'or'
+}
+
+DERIVED_CACHE_SIZE = 32
+
+
+def _base_candidates(timeframe: str):
+    return [
+        interval for interval in PROVIDER_INTERVALS
+        if interval in INTRADAY_TIMEFRAMES
+        and TIMEFRAME_NANOS[timeframe] % TIMEFRAME_NANOS[interval] == 0
+    ]
+
+
+def max_history_days(timeframe: str):
+    """
+    Return how many days back a timeframe can be served, or None if unlimited
+    """
+    if timeframe not in INTRADAY_TIMEFRAMES:
+        return None
+    return PROVIDER_INTERVALS[_base_candidates(timeframe)[-1]]
+
+
+def base_interval(timeframe: str, start_date: datetime, current_date: datetime = None) -> str:
+    """
+    Pick the stored base resolution a timeframe is derived from
+
+    Intraday timeframes come from 1m bars whenever the provider still holds
+    1m history back to start_date, otherwise from the finest coarser interval
+    that divides the timeframe and reaches that far back. Daily and monthly
+    bars always come from the 1d series.
+    """
+    if timeframe not in INTRADAY_TIMEFRAMES:
+        return '1d'
+
+    current_date = current_date or datetime.now()
+    candidates = _base_candidates(timeframe)
+    for interval in candidates:
+        max_days = PROVIDER_INTERVALS[interval]
+        if max_days is None or start_date >= current_date - timedelta(days=max_days):
+            return interval
+    # Nothing reaches back far enough, use the coarsest and let it be clamped
+    return candidates[-1]
+
+
+def resample_ohlcv(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    """
+    Aggregate a sorted OHLCV frame into coarser bars
+
+    Bucket boundaries are computed once from exchange wall-clock timestamps,
+    then every column is reduced with a single ufunc.reduceat call.
+    Buckets without any source bars are never created.
+    """
+    if df.empty:
+        return df
+
+    dates = pd.DatetimeIndex(df['Date'])
+    tz = dates.tz
+    wall_clock = dates.tz_localize(None) if tz is not None else dates
+
+    if timeframe == '1mo':
+        keys = wall_clock.year.to_numpy() * 12 + wall_clock.month.to_numpy() - 1
+        labels_of = lambda k: pd.to_datetime({'year': k // 12, 'month': k % 12 + 1, 'day': 1})
+    else:
+        step = TIMEFRAME_NANOS[timeframe]
+        offset = TIMEFRAME_OFFSETS.get(timeframe, 0)
+        keys = (wall_clock.as_unit('ns').asi8 - offset) // step
+        labels_of = lambda k: pd.to_datetime(k * step + offset, unit='ns')
+
+    starts = np.flatnonzero(np.diff(keys, prepend=keys[0] - 1))
+    ends = np.append(starts[1:], len(keys)) - 1
+
+    labels = pd.DatetimeIndex(labels_of(keys[starts]))
+    if tz is not None:
+        labels = labels.tz_localize(tz, ambiguous=np.ones(len(labels), dtype=bool), nonexistent='shift_forward')
+
+    resampled = {'Date': labels}
+    for column, how in OHLCV_AGGREGATIONS.items():
+        if column not in df.columns:
+            continue
+        if how == 'or':
+            # Quality flags of every source bar carry over, see modules/quality.py
+            resampled[column] = np.bitwise_or.reduceat(df[column].fillna(0).to_numpy(dtype=np.uint8), starts)
+            continue
+        values = df[column].to_numpy(dtype=np.float64)
+        if how == 'first':
+            resampled[column] = values[starts]
+        elif how == 'last':
+            resampled[column] = values[ends]
+        elif how == 'max':
+            resampled[column] = np.fmax.reduceat(values, starts)
+        elif how == 'min':
+            resampled[column] = np.fmin.reduceat(values, starts)
+        else:
+            resampled[column] = np.add.reduceat(np.nan_to_num(values), starts)
+
+    return pd.DataFrame(resampled)
+
+
+_derived_cache = OrderedDict()
+_derived_lock = threading.Lock()
+
+
+def get_resampled(symbol: str, df: pd.DataFrame, base: str, timeframe: str) -> pd.DataFrame:
+    """
+    Return df resampled to timeframe, reusing a previously derived series
+    when the base data has not changed
+    """
+    if base == timeframe or df.empty:
+        return df
+
+    # The last bar may still be forming, so its values are part of the key;
+    # the store revision changes when interior bars are rewritten
+    last = df.iloc[-1]
+    revision = df.attrs.get('store_revision')
+    key = (symbol.upper(), base, timeframe, len(df), df['Date'].iloc[0],
+           last['Date'], last['Close'], last['Volume'], revision)
+    with _derived_lock:
+        if key in _derived_cache:
+            _derived_cache.move_to_end(key)
+            record_cache("resample", hit=True)
+            return _derived_cache[key]
+
+    record_cache("resample", hit=False)
+    with span("resample", base=base, timeframe=timeframe):
+        resampled = resample_ohlcv(df, timeframe)
+    resampled.attrs['store_revision'] = revision
+
+    with _derived_lock:
+        _derived_cache[key] = resampled
+        while len(_derived_cache) > DERIVED_CACHE_SIZE:
+            _derived_cache.popitem(last=False)
+    return resampled
@@ -0,0 +1,256 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from modules.instrumentation import increment, observe, register_gauge
+
+# Request priorities, lower runs first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+# Provider calls running at once, per provider
+DEFAULT_MAX_WORKERS = 4
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one
+
+    The first caller runs fn; callers arriving while it is still running
+    wait for and share its result (or exception). Nothing is cached once
+    the call has finished.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            increment("coalesced_requests", flight=self.name)
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class TokenBucket:
+    """
+    Token bucket allowing rate requests per second with bursts of burst
+    """
+
+    def __init__(self, rate: float = None, burst: int = 1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.tokens = float(self.burst)
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """
+        Seconds until a token is available, 0 if one is available now
+        """
+        if self.rate is None:
+            return 0.0
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        if self.rate is None:
+            return
+        self._refill()
+        self.tokens -= 1
+
+
+class _Request:
+    def __init__(self, key, fn, args, priority: int):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.future = Future()
+        self.submitted = time.monotonic()
+        self.sequence = None
+        self.running = False
+
+
+class FetchScheduler:
+    """
+    Rate-limited, prioritized executor for provider requests
+
+    Requests wait in a priority queue (interactive before background, then
+    first come first served) and are started by a dispatcher thread only
+    when the token bucket allows, on a pool of max_workers threads.
+    Submitting a key that is already queued or running returns the
+    existing future instead of a second request; a higher priority
+    submission promotes the queued one.
+    """
+
+    def __init__(self, rate: float = None, burst: int = 1, max_workers: int = DEFAULT_MAX_WORKERS,
+                 name: str = "provider", clock=time.monotonic):
+        self.name = name
+        self._bucket = TokenBucket(rate, burst, clock)
+        self._queue = []
+        self._requests = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"fetch-{name}")
+        self._dispatcher = None
+        self._stats = {'submitted': 0, 'coalesced': 0, 'completed': 0, 'failed': 0, 'throttled': 0,
+                       'wait_total': 0.0, 'wait_max': 0.0}
+
+    def submit(self, key, fn, *args, priority: int = INTERACTIVE) -> Future:
+        """
+        Schedule fn(*args) under key and return its future
+        """
+        with self._condition:
+            request = self._requests.get(key)
+            if request is not None:
+                self._stats['coalesced'] += 1
+                increment("scheduler_coalesced", scheduler=self.name)
+                if not request.running and priority < request.priority:
+                    # Re-queue with the better priority; the old entry goes stale
+                    request.priority = priority
+                    self._push(request)
+                return request.future
+
+            request = self._requests[key] = _Request(key, fn, args, priority)
+            self._stats['submitted'] += 1
+            increment("scheduler_requests", scheduler=self.name, priority=PRIORITY_NAMES.get(priority, priority))
+            self._push(request)
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name=f"dispatch-{self.name}", daemon=True)
+                self._dispatcher.start()
+        return request.future
+
+    def call(self, key, fn, *args, priority: int = INTERACTIVE, timeout: float = None):
+        """
+        Submit and wait for the result
+        """
+        return self.submit(key, fn, *args, priority=priority).result(timeout)
+
+    def queue_depth(self) -> int:
+        with self._condition:
+            return sum(not request.running for request in self._requests.values())
+
+    def in_flight(self) -> int:
+        with self._condition:
+            return sum(request.running for request in self._requests.values())
+
+    def stats(self) -> dict:
+        with self._condition:
+            stats = dict(self._stats)
+            stats['queued'] = sum(not request.running for request in self._requests.values())
+            stats['running'] = len(self._requests) - stats['queued']
+        started = stats['completed'] + stats['failed'] + stats['running']
+        stats['wait_mean'] = stats['wait_total'] / started if started else 0.0
+        return stats
+
+    def _push(self, request: _Request):
+        request.sequence = next(self._sequence)
+        heapq.heappush(self._queue, (request.priority, request.sequence, request.key))
+        self._condition.notify()
+
+    def _pop(self):
+        # Skip entries superseded by a promotion
+        while self._queue:
+            priority, sequence, key = heapq.heappop(self._queue)
+            request = self._requests.get(key)
+            if request is not None and not request.running and request.sequence == sequence:
+                return request
+        return None
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                wait = self._bucket.wait_time()
+                if wait > 0:
+                    # Sleep until a token is due; a new submission may wake us
+                    # but cannot start early, and the best request is picked then
+                    self._stats['throttled'] += 1
+                    increment("scheduler_throttled", scheduler=self.name)
+                    self._condition.wait(wait)
+                    continue
+                request = self._pop()
+                if request is None:
+                    continue
+                self._bucket.consume()
+                request.running = True
+                waited = time.monotonic() - request.submitted
+                self._stats['wait_total'] += waited
+                self._stats['wait_max'] = max(self._stats['wait_max'], waited)
+            observe("scheduler.wait", waited, scheduler=self.name,
+                    priority=PRIORITY_NAMES.get(request.priority, request.priority))
+            self._pool.submit(self._run, request)
+
+    def _run(self, request: _Request):
+        try:
+            result = request.fn(*request.args)
+        except BaseException as e:
+            failed = True
+            outcome = e
+        else:
+            failed = False
+            outcome = result
+        with self._condition:
+            del self._requests[request.key]
+            self._stats['failed' if failed else 'completed'] += 1
+        if failed:
+            request.future.set_exception(outcome)
+        else:
+            request.future.set_result(outcome)
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(provider) -> FetchScheduler:
+    """
+    The scheduler in front of one provider, created on first use
+
+    The provider's rate_limit and burst apply unless STOCKCHART_FETCH_RATE
+    and STOCKCHART_FETCH_BURST override them; STOCKCHART_FETCH_WORKERS sets
+    how many of its requests may run at once.
+    """
+    with _schedulers_lock:
+        scheduler = _schedulers.get(provider.name)
+        if scheduler is None:
+            rate = os.environ.get("STOCKCHART_FETCH_RATE")
+            scheduler = _schedulers[provider.name] = FetchScheduler(
+                rate=float(rate) if rate else provider.rate_limit,
+                burst=int(os.environ.get("STOCKCHART_FETCH_BURST", provider.burst)),
+                max_workers=int(os.environ.get("STOCKCHART_FETCH_WORKERS", DEFAULT_MAX_WORKERS)),
+                name=provider.name
+            )
+            register_gauge("scheduler_queue_depth", scheduler.queue_depth, scheduler=provider.name)
+            register_gauge("scheduler_in_flight", scheduler.in_flight, scheduler=provider.name)
+        return scheduler
@@ -0,0 +1,202 @@
+import argparse
+import multiprocessing
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from modules.bars import PRICE_COLUMNS, Bars
+from modules.batch import DEFAULT_FETCH_WORKERS, read_symbols
+from modules.technical_analysis import calculate_support_resistance, calculate_trend
+
+RESULT_COLUMNS = [
+    'symbol', 'bars', 'close', 'trend', 'volatility',
+    'nearest_support', 'nearest_resistance', 'distance_to_level', 'error'
+]
+
+DEFAULT_SHARD_SIZE = 50
+
+
+def _analyze_shard(shm_name: str, shape, symbols, offsets, timeframe: str):
+    """
+    Worker entry point: analyze every symbol packed in one shared block
+    """
+    # Workers share the parent's resource tracker, which unlinks the block
+    shm = shared_memory.SharedMemory(name=shm_name)
+
+    rows = []
+    try:
+        block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        for symbol, start, stop in zip(symbols, offsets[:-1], offsets[1:]):
+            bars = Bars(None, *block[:, start:stop])
+            try:
+                rows.append(_analyze(symbol, bars, timeframe))
+            except Exception as e:
+                rows.append({'symbol': symbol, 'bars': stop - start, 'error': str(e)})
+            del bars
+        del block
+    finally:
+        shm.close()
+    return rows
+
+
+def _analyze(symbol: str, bars: Bars, timeframe: str) -> dict:
+    trend_data = calculate_trend(bars, timeframe)
+    support_resistance = calculate_support_resistance(bars, timeframe)
+
+    close = float(bars.close[-1])
+    supports = np.asarray(support_resistance['support'], dtype=np.float64)
+    resistances = np.asarray(support_resistance['resistance'], dtype=np.float64)
+    below = supports[supports <= close]
+    above = resistances[resistances >= close]
+    levels = np.concatenate([supports, resistances])
+
+    return {
+        'symbol': symbol,
+        'bars': len(bars),
+        'close': close,
+        'trend': trend_data['trend'],
+        'volatility': float(trend_data['volatility'].iloc[-1]),
+        'nearest_support': float(below.max()) if len(below) else np.nan,
+        'nearest_resistance': float(above.min()) if len(above) else np.nan,
+        'distance_to_level': float(np.abs(levels - close).min() / close) if len(levels) else np.nan,
+        'error': None
+    }
+
+
+def _pack_shard(frames):
+    """
+    Copy a shard's OHLCV columns into one new shared memory block
+    """
+    offsets = np.cumsum([0] + [len(df) for _, df in frames])
+    shape = (len(PRICE_COLUMNS), int(offsets[-1]))
+    shm = shared_memory.SharedMemory(create=True, size=max(1, shape[0] * shape[1] * 8))
+    block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    for (_, df), start, stop in zip(frames, offsets[:-1], offsets[1:]):
+        for i, column in enumerate(PRICE_COLUMNS):
+            block[i, start:stop] = df[column].to_numpy(dtype=np.float64)
+    del block
+    return shm, shape, [symbol for symbol, _ in frames], offsets.tolist()
+
+
+def run_screener(symbols, timeframe: str = "1d", start_date: datetime = None, end_date: datetime = None,
+                 provider=None, workers: int = None, fetch_workers: int = DEFAULT_FETCH_WORKERS,
+                 shard_size: int = DEFAULT_SHARD_SIZE, on_result=None, loader=None) -> pd.DataFrame:
+    """
+    Analyze many symbols in a process pool and return one row per symbol
+
+    Data is fetched on a thread pool and packed shard by shard into shared
+    memory; worker processes analyze each shard from zero-copy views, so no
+    DataFrames are pickled and only the small result rows travel back.
+    on_result, if given, is called with each row as soon as its shard is
+    done. loader(symbol, start_date, end_date, timeframe) can replace the
+    default store-backed data loading. Like modules/batch.py, every symbol
+    gets a row; 'error' is set when it cannot be loaded or analyzed.
+    """
+    if loader is None:
+        from modules.data_handler import load_timeframe
+        from modules.scheduler import BACKGROUND
+
+        # Screens yield to interactive chart requests for provider capacity
+        def loader(symbol, start, end, tf):
+            return load_timeframe(symbol, start, end, tf, provider=provider, priority=BACKGROUND)
+
+    end_date = end_date or datetime.now()
+    start_date = start_date or end_date - timedelta(days=365)
+    shards = [symbols[i:i + shard_size] for i in range(0, len(symbols), shard_size)]
+    rows = []
+
+    def emit(row):
+        rows.append(row)
+        if on_result is not None:
+            on_result(row)
+
+    def fetch_shard(shard):
+        frames = []
+        failed = []
+        for symbol in shard:
+            try:
+                df = loader(symbol, start_date, end_date, timeframe)
+            except Exception as e:
+                failed.append({'symbol': symbol, 'error': str(e)})
+                continue
+            if df is None or len(df) < 2:
+                failed.append({'symbol': symbol, 'error': f"No {timeframe} data"})
+            else:
+                frames.append((symbol, df))
+        return frames, failed
+
+    # Fetch threads are running when workers start, so avoid plain fork
+    context = multiprocessing.get_context('forkserver' if sys.platform != 'win32' else 'spawn')
+    pending_analyses = {}
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context) as analysis_pool:
+        pending_fetches = {fetch_pool.submit(fetch_shard, shard) for shard in shards}
+
+        try:
+            while pending_fetches or pending_analyses:
+                done, _ = wait(set(pending_fetches) | set(pending_analyses), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in pending_fetches:
+                        pending_fetches.discard(future)
+                        frames, failed = future.result()
+                        for row in failed:
+                            emit(row)
+                        if not frames:
+                            continue
+                        shm, shape, shard_symbols, offsets = _pack_shard(frames)
+                        analysis = analysis_pool.submit(_analyze_shard, shm.name, shape, shard_symbols, offsets, timeframe)
+                        pending_analyses[analysis] = shm
+                    else:
+                        shm = pending_analyses.pop(future)
+                        shm.close()
+                        shm.unlink()
+                        for row in future.result():
+                            emit(row)
+        finally:
+            for shm in pending_analyses.values():
+                shm.close()
+                shm.unlink()
+
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run trend and support/resistance analysis over a symbol universe")
+    parser.add_argument("symbols", nargs="+",
+                        help="Symbols, or files with one symbol per line ('-' reads stdin)")
+    parser.add_argument("--timeframe", default="1d")
+    parser.add_argument("--days", type=int, default=365, help="History to analyze, in days")
+    parser.add_argument("--workers", type=int, default=None, help="Analysis processes (default: CPU count)")
+    parser.add_argument("--provider", default=None, help="Data provider name (default: STOCKCHART_PROVIDER)")
+    parser.add_argument("--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS)
+    parser.add_argument("--sort-by", default="distance_to_level", choices=RESULT_COLUMNS)
+    parser.add_argument("--descending", action="store_true")
+    parser.add_argument("--out", default=None, help="CSV file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    from modules.providers import get_provider
+
+    symbols = read_symbols(args.symbols)
+
+    end_date = datetime.now()
+    results = run_screener(
+        symbols,
+        timeframe=args.timeframe,
+        start_date=end_date - timedelta(days=args.days),
+        end_date=end_date,
+        provider=get_provider(args.provider),
+        workers=args.workers,
+        fetch_workers=args.fetch_workers
+    )
+    results = results.sort_values(args.sort_by, ascending=not args.descending)
+    results.to_csv(args.out or sys.stdout, index=False)
+
+
+if __name__ == "__main__":
+    main()
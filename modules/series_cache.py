@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from modules.instrumentation import increment, record_cache, register_gauge
+from modules.scheduler import SingleFlight
+
+# Memory budget of the process-wide series cache, in MiB
+DEFAULT_BUDGET_MB = int(os.environ.get("STOCKCHART_CACHE_MB", "512"))
+
+# Entries are reloaded after this long, like the st.cache_data TTL they replace
+DEFAULT_TTL_SECONDS = 3600
+
+
+def freeze_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Frame sharing df's data with every numeric column made read-only
+
+    Buffers are only copied when pandas hands out a writable view of them,
+    i.e. without copy-on-write, so no caller can change a shared array in
+    place. Datetime columns are shared as they are, and df.attrs are kept.
+    """
+    data = {}
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in "biuf":
+            values = series.to_numpy()
+            if values.flags.writeable:
+                values = values.copy()
+                values.setflags(write=False)
+            data[column] = values
+        else:
+            data[column] = series.array
+    frozen = pd.DataFrame(data, index=df.index, copy=False)
+    frozen.attrs = dict(df.attrs)
+    return frozen
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+class SeriesCache:
+    """
+    Process-wide LRU cache of immutable OHLCV frames
+
+    Every session asking for the same key gets a shallow copy of one shared
+    frame: no pickling and no data copy, while added columns stay private
+    to the caller. Entries expire after ttl seconds, and the least recently
+    used ones are evicted once their total size exceeds budget_bytes.
+    Frames larger than the whole budget are returned without being cached.
+    """
+
+    def __init__(self, budget_bytes: int = DEFAULT_BUDGET_MB * 2**20, ttl: float = DEFAULT_TTL_SECONDS,
+                 name: str = "series"):
+        self.budget_bytes = budget_bytes
+        self.ttl = ttl
+        self.name = name
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+        self._loads = SingleFlight(name)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Shallow copy of the cached frame, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self._hits += 1
+        record_cache(self.name, hit=entry is not None)
+        return entry[0].copy(deep=False) if entry is not None else None
+
+    def put(self, key, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Freeze df, store it under key and return a shallow copy of the frozen frame
+        """
+        frozen = freeze_frame(df)
+        nbytes = frame_nbytes(frozen)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if nbytes <= self.budget_bytes:
+                self._entries[key] = (frozen, nbytes, time.monotonic() + self.ttl)
+                self._bytes += nbytes
+                self._evict()
+        return frozen.copy(deep=False)
+
+    def get_or_load(self, key, loader):
+        """
+        Cached frame for key, calling loader() to build it on a miss
+
+        Concurrent misses on the same key share a single loader() call.
+        Empty results are returned but not cached, so failed loads are
+        retried on the next call.
+        """
+        df = self.get(key)
+        if df is not None:
+            return df
+
+        def load():
+            loaded = loader()
+            if loaded is None or loaded.empty:
+                return loaded
+            return self.put(key, loaded)
+
+        df = self._loads.do(key, load)
+        # Callers sharing one load each get their own shallow copy
+        return df.copy(deep=False) if df is not None else None
+
+    def invalidate(self, predicate=None):
+        """
+        Drop every entry, or those whose key satisfies predicate
+        """
+        with self._lock:
+            for key in [key for key in self._entries if predicate is None or predicate(key)]:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'budget_bytes': self.budget_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions
+            }
+
+    def _remove(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
+
+    def _evict(self):
+        while self._bytes > self.budget_bytes and self._entries:
+            _, (_, nbytes, _) = self._entries.popitem(last=False)
+            self._bytes -= nbytes
+            self._evictions += 1
+            increment("cache_evictions", cache=self.name)
+
+
+_series_cache = None
+_series_cache_lock = threading.Lock()
+
+
+def get_series_cache() -> SeriesCache:
+    """
+    The process-wide cache shared by all sessions
+    """
+    global _series_cache
+    with _series_cache_lock:
+        if _series_cache is None:
+            _series_cache = SeriesCache()
+            register_gauge("cache_bytes", lambda: _series_cache.stats()['bytes'], cache=_series_cache.name)
+            register_gauge("cache_budget_bytes", lambda: _series_cache.budget_bytes, cache=_series_cache.name)
+            register_gauge("cache_entries", lambda: len(_series_cache), cache=_series_cache.name)
+        return _series_cache
@@ -1,85 +1,181 @@
 import pandas as pd
 import numpy as np
-from scipy.signal import argrelextrema
+from modules.bars import as_bars
+from modules.indicators import classify_trend, trend_windows
+from modules.instrumentation import timed
 
-def calculate_support_resistance(df: pd.DataFrame, timeframe: str = "1d"):
+def swing_window(timeframe: str = "1d") -> int:
+    """
+    Bars on each side a swing point must dominate, per timeframe
+    """
+    if timeframe == "1m":
+        return 10  # Smaller window for 1-minute data
+    elif timeframe in ["3m", "5m", "15m", "1h"]:
+        return 15  # Medium window for other intraday data
+    return 20  # Larger window for daily and above
+
+def level_count(timeframe: str = "1d") -> int:
+    """
+    Support and resistance levels kept on each side, per timeframe
+    """
+    # More levels for intraday data
+    return 5 if timeframe in ["1m", "3m", "5m", "15m", "1h"] else 3
+
+def find_swing_points(values: np.ndarray, order: int, kind: str = "low") -> np.ndarray:
+    """
+    Indices of swing lows (or highs): bars that are the extreme of the
+    centered window of 2 * order + 1 bars
+
+    The window extremes come from scipy.ndimage's running min/max filters,
+    which use a monotonic deque (ascending minima) and run in O(n)
+    regardless of order. On plateaus only the first bar of a run of equal
+    extremes within order bars of each other is kept.
+    """
+    from scipy.ndimage import maximum_filter1d, minimum_filter1d
+
+    # float32 prices are filtered as they are, without a float64 copy
+    values = np.asarray(values)
+    if values.dtype.kind != 'f':
+        values = values.astype(np.float64)
+    if len(values) == 0:
+        return np.array([], dtype=np.int64)
+
+    window_filter = minimum_filter1d if kind == "low" else maximum_filter1d
+    extremes = window_filter(values, size=2 * order + 1, mode='nearest')
+    candidates = np.flatnonzero(values == extremes)
+    if len(candidates) < 2:
+        return candidates
+
+    duplicate = np.r_[False, (np.diff(candidates) <= order) & (np.diff(values[candidates]) == 0)]
+    return candidates[~duplicate]
+
+def cluster_levels(prices: np.ndarray, positions: np.ndarray, tolerance: float, n_bars: int):
+    """
+    Merge nearby swing prices into ranked levels
+
+    Prices are sorted and split wherever the gap to the next one exceeds
+    tolerance. Each cluster is represented by the member price nearest its
+    mean, so levels are prices that were actually touched. Strength counts
+    the touches, weighting recent ones up to twice as much as the oldest.
+    Returns (levels, touches, strength, last_touch), strongest first.
+    """
+    if len(prices) == 0:
+        empty = np.array([])
+        return empty, empty.astype(np.int64), empty, empty.astype(np.int64)
+
+    order = np.argsort(prices, kind='stable')
+    sorted_prices = prices[order]
+    sorted_positions = positions[order]
+    cluster_ids = np.r_[0, np.cumsum(np.diff(sorted_prices) > tolerance)]
+    n_clusters = cluster_ids[-1] + 1
+
+    touches = np.bincount(cluster_ids, minlength=n_clusters)
+    means = np.bincount(cluster_ids, weights=sorted_prices, minlength=n_clusters) / touches
+    recency = 1.0 + sorted_positions / max(n_bars - 1, 1)
+    strength = np.bincount(cluster_ids, weights=recency, minlength=n_clusters)
+    last_touch = np.zeros(n_clusters, dtype=np.int64)
+    np.maximum.at(last_touch, cluster_ids, sorted_positions)
+
+    # Member nearest to each cluster mean
+    distance = np.abs(sorted_prices - means[cluster_ids])
+    nearest = np.lexsort((distance, cluster_ids))
+    first_of_cluster = np.r_[True, np.diff(cluster_ids[nearest]) != 0]
+    levels = sorted_prices[nearest[first_of_cluster]]
+
+    ranking = np.lexsort((-last_touch, -strength))
+    return levels[ranking], touches[ranking], strength[ranking], last_touch[ranking]
+
+@timed("analysis.support_resistance")
+def calculate_support_resistance(df, timeframe: str = "1d"):
     """
     Calculate support and resistance levels using local minima/maxima
     Adjusted for different timeframes
-    """
-    df = df.copy()
 
+    Swing points are clustered into levels ranked by strength; 'support'
+    and 'resistance' hold the strongest level prices, and the '*_levels'
+    entries add touch counts and strength for each of them.
+
+    df may be a DataFrame or Bars; either way the low and high arrays are
+    read in place.
+    """
     # Adjust window size based on timeframe
-    if timeframe == "1m":
-        window = 10  # Smaller window for 1-minute data
-    elif timeframe in ["3m", "15m"]:
-        window = 15  # Medium window for other intraday data
-    else:
-        window = 20  # Larger window for daily and above
+    window = swing_window(timeframe)
+
+    bars = as_bars(df)
+    lows = bars.low
+    highs = bars.high
 
     # Find local minima and maxima
-    df['min'] = df.iloc[argrelextrema(df['Low'].values, np.less_equal, order=window)[0]]['Low']
-    df['max'] = df.iloc[argrelextrema(df['High'].values, np.greater_equal, order=window)[0]]['High']
+    swing_lows = find_swing_points(lows, window, "low")
+    swing_highs = find_swing_points(highs, window, "high")
+
+    # Levels closer than an average bar's range are the same level
+    tolerance = float(np.nanmean(np.subtract(highs, lows, dtype=np.float64))) if len(bars) else 0.0
 
-    # Get significant levels
-    support_levels = df['min'].dropna().unique()
-    resistance_levels = df['max'].dropna().unique()
+    return rank_levels(swing_lows, lows[swing_lows], swing_highs, highs[swing_highs],
+                       tolerance, len(bars), timeframe)
 
-    # Adjust number of levels based on timeframe
-    num_levels = 5 if timeframe in ["1m", "3m", "15m"] else 3
+def rank_levels(swing_lows: np.ndarray, low_prices: np.ndarray, swing_highs: np.ndarray,
+                high_prices: np.ndarray, tolerance: float, n_bars: int, timeframe: str = "1d"):
+    """
+    Support/resistance result for swing points found by any detector,
+    in the format of calculate_support_resistance
+    """
+    num_levels = level_count(timeframe)
 
-    # Filter levels to reduce noise
-    if len(support_levels) > num_levels:
-        support_levels = np.percentile(support_levels, np.linspace(0, 100, num_levels))
-    if len(resistance_levels) > num_levels:
-        resistance_levels = np.percentile(resistance_levels, np.linspace(0, 100, num_levels))
+    swing_lows = np.asarray(swing_lows, dtype=np.int64)
+    swing_highs = np.asarray(swing_highs, dtype=np.int64)
+    result = {'swing_lows': swing_lows, 'swing_highs': swing_highs}
+    for side, prices, positions in (('support', np.asarray(low_prices, dtype=np.float64), swing_lows),
+                                    ('resistance', np.asarray(high_prices, dtype=np.float64), swing_highs)):
+        levels, touches, strength, last_touch = cluster_levels(prices, positions, tolerance, n_bars)
+        levels, touches, strength, last_touch = (levels[:num_levels], touches[:num_levels],
+                                                 strength[:num_levels], last_touch[:num_levels])
+        result[side] = levels
+        result[f'{side}_levels'] = [
+            {'price': float(p), 'touches': int(t), 'strength': float(w), 'last_touch': int(i)}
+            for p, t, w, i in zip(levels, touches, strength, last_touch)
+        ]
 
-    return {
-        'support': support_levels,
-        'resistance': resistance_levels
-    }
+    return result
 
-def calculate_trend(df: pd.DataFrame, timeframe: str = "1d"):
+@timed("analysis.trend")
+def calculate_trend(df, timeframe: str = "1d"):
     """
     Calculate trend indicators with timeframe-specific adjustments
-    """
-    df = df.copy()
 
+    This is the batch reference path; TrendEngine in modules/indicators.py
+    produces the same values incrementally as bars are appended. df may be
+    a DataFrame or Bars; the returned series share its index (a RangeIndex
+    for Bars).
+    """
     # Adjust moving average periods based on timeframe
-    if timeframe == "1m":
-        fast_ma = 5
-        slow_ma = 15
-    elif timeframe in ["3m", "15m"]:
-        fast_ma = 10
-        slow_ma = 30
-    else:
-        fast_ma = 20
-        slow_ma = 50
-
-    # Calculate moving averages
-    df['SMA_fast'] = df['Close'].rolling(window=fast_ma).mean()
-    df['SMA_slow'] = df['Close'].rolling(window=slow_ma).mean()
+    fast_ma, slow_ma = trend_windows(timeframe)
+
+    # Calculate moving averages over a view of the close array; the input
+    # is left untouched, it may be shared
+    index = df.index if isinstance(df, pd.DataFrame) else None
+    close = pd.Series(as_bars(df).close, index=index, copy=False)
+    sma_fast = close.rolling(window=fast_ma).mean().rename('SMA_fast')
+    sma_slow = close.rolling(window=slow_ma).mean().rename('SMA_slow')
 
     # Calculate additional trend indicators
-    df['Price_Change'] = df['Close'].pct_change()
-    df['Volatility'] = df['Price_Change'].rolling(window=fast_ma).std()
+    # Missing closes stay missing (pandas 3 behaviour), as in TrendEngine
+    price_change = close.pct_change(fill_method=None)
+    volatility = price_change.rolling(window=fast_ma).std().rename('Volatility')
 
     # Determine trend
-    current_price = df['Close'].iloc[-1]
-    sma_fast = df['SMA_fast'].iloc[-1]
-    sma_slow = df['SMA_slow'].iloc[-1]
-    volatility = df['Volatility'].iloc[-1]
-
-    if current_price > sma_fast and sma_fast > sma_slow:
-        trend = "Strong Uptrend" if volatility > df['Volatility'].mean() else "Uptrend"
-    elif current_price < sma_fast and sma_fast < sma_slow:
-        trend = "Strong Downtrend" if volatility > df['Volatility'].mean() else "Downtrend"
-    else:
-        trend = "High Volatility Sideways" if volatility > df['Volatility'].mean() else "Sideways"
+    trend = classify_trend(
+        close.iloc[-1],
+        sma_fast.iloc[-1],
+        sma_slow.iloc[-1],
+        volatility.iloc[-1],
+        volatility.mean()
+    )
 
     return {
         'trend': trend,
-        'sma_fast': df['SMA_fast'],
-        'sma_slow': df['SMA_slow'],
-        'volatility': df['Volatility']
-    }
\ No newline at end of file
+        'sma_fast': sma_fast,
+        'sma_slow': sma_slow,
+        'volatility': volatility
+    }
@@ -0,0 +1,268 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from modules.bars import as_bars
+from modules.instrumentation import timed
+from modules.technical_analysis import rank_levels, swing_window
+
+# Hull edges considered per side, newest first
+MAX_CANDIDATE_EDGES = 10
+
+
+def _cross(o, a, b) -> float:
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def _push_hull(hull: list, point, side: str):
+    """
+    Add a point with a larger x to a monotone-chain hull in amortized O(1)
+
+    The lower hull of swing lows is kept convex from below (every swing low
+    lies on or above each edge), the upper hull of swing highs from above.
+    """
+    if side == "support":
+        while len(hull) >= 2 and _cross(hull[-2], hull[-1], point) <= 0:
+            hull.pop()
+    else:
+        while len(hull) >= 2 and _cross(hull[-2], hull[-1], point) >= 0:
+            hull.pop()
+    hull.append(point)
+
+
+def _first_cross(line: dict, closes, first: int, tolerance: float, side: str):
+    """
+    Index of the first close beyond line by more than tolerance, or None;
+    closes are the closes from bar first on
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    if not len(closes):
+        return None
+    line_values = line['y0'] + line['slope'] * (np.arange(first, first + len(closes)) - line['start'])
+    if side == "support":
+        crossed = closes < line_values - tolerance
+    else:
+        crossed = closes > line_values + tolerance
+    return first + int(np.argmax(crossed)) if crossed.any() else None
+
+
+def _edge_lines(hull, xs: np.ndarray, ys: np.ndarray, closes, tolerance: float, side: str) -> list:
+    """
+    Candidate lines of the newest hull edges, before ranking
+
+    Support lines are rising lower-hull edges, resistance lines falling
+    upper-hull edges. Each counts its touches (swing points within
+    tolerance from its first point on) and records the first close that
+    broke through it after its last point.
+    """
+    lines = []
+    for (x0, y0), (x1, y1) in list(zip(hull[:-1], hull[1:]))[::-1][:MAX_CANDIDATE_EDGES]:
+        slope = (y1 - y0) / (x1 - x0)
+        if (side == "support" and slope <= 0) or (side == "resistance" and slope >= 0):
+            continue
+
+        after_start = xs >= x0
+        distance = np.abs(ys[after_start] - (y0 + slope * (xs[after_start] - x0)))
+        line = {
+            'start': int(x0),
+            'last_point': int(x1),
+            'y0': float(y0),
+            'slope': float(slope),
+            'touches': int(np.count_nonzero(distance <= tolerance))
+        }
+        line['broken_at'] = _first_cross(line, closes[x1 + 1:], x1 + 1, tolerance, side)
+        lines.append(line)
+    return lines
+
+
+def _ranked_lines(lines, dates, last_index: int, max_lines: int, forming_date=None) -> list:
+    """
+    Candidate lines extended to the last bar, unbroken and most touched first
+
+    forming_date is the date of bar last_index when dates do not hold it yet.
+    """
+    def date(index):
+        return forming_date if forming_date is not None and index == len(dates) else dates[index]
+
+    ranked = []
+    for line in lines:
+        broken_at = line['broken_at']
+        ranked.append({
+            'start': line['start'],
+            'end': last_index,
+            'x0': dates[line['start']],
+            'y0': line['y0'],
+            'x1': date(last_index),
+            'y1': line['y0'] + line['slope'] * (last_index - line['start']),
+            'slope': line['slope'],
+            'touches': line['touches'],
+            'broken': broken_at is not None,
+            'broken_at': date(broken_at) if broken_at is not None else None
+        })
+    ranked.sort(key=lambda line: (line['broken'], -line['touches'], -line['start']))
+    return ranked[:max_lines]
+
+
+def _hull_lines(hull, xs: np.ndarray, ys: np.ndarray, closes, dates, tolerance: float,
+                side: str, max_lines: int):
+    """
+    Turn hull edges into ranked trendlines, each extended to the last bar
+    and reporting whether, and where, a close broke through it
+    """
+    lines = _edge_lines(hull, xs, ys, closes, tolerance, side)
+    return _ranked_lines(lines, dates, len(closes) - 1, max_lines)
+
+
+@timed("analysis.trendlines")
+def detect_trendlines(df, support_resistance: dict, max_lines: int = 2):
+    """
+    Fit rising support and falling resistance lines through the swing points
+    found by calculate_support_resistance
+
+    Swing indices are already in time order, so both hulls are built with a
+    single monotone-chain pass; overall cost is dominated by the O(n) swing
+    detection instead of testing all pairs of swing points.
+    """
+    bars = as_bars(df)
+    lows, highs, closes = bars.low, bars.high, bars.close
+    dates = bars.timestamps()
+    tolerance = float(np.nanmean(np.subtract(highs, lows, dtype=np.float64))) if len(bars) else 0.0
+
+    result = {}
+    for side, swings, values in (("support", support_resistance['swing_lows'], lows),
+                                 ("resistance", support_resistance['swing_highs'], highs)):
+        hull = []
+        for x in swings:
+            _push_hull(hull, (int(x), float(values[x])), side)
+        result[f'{side}_lines'] = _hull_lines(
+            hull, np.asarray(swings), values[swings], closes, dates, tolerance, side, max_lines
+        )
+    return result
+
+
+class TrendlineEngine:
+    """
+    Incremental trendline detection
+
+    Bars are appended one at a time. A bar is confirmed as a swing low/high
+    once order bars have followed it, using monotonic deques of the last
+    2 * order + 1 lows and highs, and confirmed swings are pushed onto the
+    hulls in amortized O(1). lines() ranks the current hull edges, with the
+    still-forming bar optionally taken into account for break status.
+
+    Candidate lines are kept between calls and rebuilt only when a new
+    swing changes the hulls; otherwise lines() only checks the closes added
+    since its last call for breaks, so a tick costs O(new bars), not
+    O(history). Touches and breaks use the tolerance (average bar range)
+    of when they were computed, so they can differ marginally from a full
+    recompute until the next swing.
+    """
+
+    def __init__(self, timeframe: str = "1d", order: int = None, max_lines: int = 2):
+        self.timeframe = timeframe
+        self.order = order or swing_window(timeframe)
+        self.max_lines = max_lines
+        self._dates = []
+        self._closes = []
+        self._range_total = 0.0
+        self._min_window = deque()
+        self._max_window = deque()
+        self._swings = {"support": ([], []), "resistance": ([], [])}
+        self._hulls = {"support": [], "resistance": []}
+        # Candidate lines per side, and how many closes they were checked against
+        self._lines = None
+        self._checked = 0
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, timeframe: str = "1d", **kwargs) -> "TrendlineEngine":
+        engine = cls(timeframe, **kwargs)
+        for date, high, low, close in zip(df['Date'], df['High'], df['Low'], df['Close']):
+            engine.update(date, high, low, close)
+        return engine
+
+    def __len__(self):
+        return len(self._dates)
+
+    def update(self, date, high: float, low: float, close: float):
+        """
+        Append one closed bar
+        """
+        index = len(self._dates)
+        self._dates.append(date)
+        self._closes.append(float(close))
+        self._range_total += float(high) - float(low)
+
+        for side, window, value in (("support", self._min_window, float(low)),
+                                    ("resistance", self._max_window, float(high))):
+            # Strict comparison keeps the earliest of equal extremes in front
+            if side == "support":
+                while window and window[-1][1] > value:
+                    window.pop()
+            else:
+                while window and window[-1][1] < value:
+                    window.pop()
+            window.append((index, value))
+            while window[0][0] < index - 2 * self.order:
+                window.popleft()
+
+            candidate = index - self.order
+            if candidate >= 0 and window[0][0] == candidate:
+                xs, ys = self._swings[side]
+                xs.append(candidate)
+                ys.append(window[0][1])
+                _push_hull(self._hulls[side], (candidate, window[0][1]), side)
+                self._lines = None
+
+    @property
+    def tolerance(self) -> float:
+        return self._range_total / len(self._dates) if self._dates else 0.0
+
+    @property
+    def swing_count(self) -> int:
+        return len(self._swings["support"][0]) + len(self._swings["resistance"][0])
+
+    def support_resistance(self) -> dict:
+        """
+        Levels clustered from the confirmed swing points, in the format of
+        calculate_support_resistance
+
+        Unlike the batch detector, swings within order bars of the end are
+        not known yet.
+        """
+        lows_x, lows_y = self._swings["support"]
+        highs_x, highs_y = self._swings["resistance"]
+        return rank_levels(lows_x, lows_y, highs_x, highs_y, self.tolerance, len(self._dates), self.timeframe)
+
+    def lines(self, last_close: float = None, last_date=None):
+        """
+        Current support and resistance lines, like detect_trendlines
+        """
+        tolerance = self.tolerance
+        if self._lines is None:
+            self._lines = {}
+            for side in ("support", "resistance"):
+                xs, ys = self._swings[side]
+                self._lines[side] = _edge_lines(self._hulls[side], np.asarray(xs), np.asarray(ys),
+                                                self._closes, tolerance, side)
+        else:
+            for side, lines in self._lines.items():
+                for line in lines:
+                    if line['broken_at'] is None:
+                        first = max(self._checked, line['last_point'] + 1)
+                        line['broken_at'] = _first_cross(line, self._closes[first:], first, tolerance, side)
+        self._checked = len(self._closes)
+
+        last_index = len(self._closes) - 1 if last_close is None else len(self._closes)
+        result = {}
+        for side, lines in self._lines.items():
+            if last_close is not None:
+                # The forming bar can break a line without being recorded
+                lines = [
+                    dict(line, broken_at=_first_cross(line, [last_close], last_index, tolerance, side))
+                    if line['broken_at'] is None else line
+                    for line in lines
+                ]
+            result[f'{side}_lines'] = _ranked_lines(lines, self._dates, last_index, self.max_lines,
+                                                    forming_date=last_date)
+        return result
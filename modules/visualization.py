@@ -1,9 +1,14 @@
+from functools import lru_cache
+import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from modules.downsampling import downsample_for_display, visible_window
+from modules.instrumentation import timed
 
 def create_price_chart(df, symbol, support_resistance, trend_data, timeframe="1d", 
                       chart_height=900, price_volume_ratio=0.7, vertical_spacing=0.1,
-                      grid_style={'color': '#483C32', 'width': 1, 'dash': 'dot'}):
+                      grid_style={'color': '#483C32', 'width': 1, 'dash': 'dot'},
+                      trendlines=None, max_points=None, x_range=None):
     """
     Create an interactive price chart with technical indicators and configurable layout
 
@@ -12,121 +17,220 @@ def create_price_chart(df, symbol, support_resistance, trend_data, timeframe="1d
     - price_volume_ratio: Ratio of price chart to volume chart (0.5-0.9)
     - vertical_spacing: Spacing between subplots (0.05-0.2)
     - grid_style: Dictionary with grid styling options
+    - trendlines: Optional output of detect_trendlines to draw sloped lines
+    - max_points: If set, aggregate the visible bars to about this many points
+      (typically the plot width in pixels) and draw line overlays with WebGL
+    - x_range: Optional (start, end) window to show; with max_points the
+      window is re-aggregated at its own, finer resolution
     """
-    # Validate and adjust input parameters
-    chart_height = max(600, min(1500, chart_height))  # Limit height between 600-1500px
-    price_volume_ratio = max(0.5, min(0.9, price_volume_ratio))  # Limit ratio between 0.5-0.9
-    volume_ratio = 1 - price_volume_ratio
-    vertical_spacing = max(0.05, min(0.2, vertical_spacing))  # Limit spacing between 0.05-0.2
+    payload = build_chart_payload(df, support_resistance, trend_data, trendlines, max_points, x_range)
+    return apply_chart_layout(payload, symbol, timeframe, chart_height, price_volume_ratio,
+                              vertical_spacing, grid_style)
 
+def _subplots(symbol, timeframe, price_volume_ratio=0.7, vertical_spacing=0.1):
     # Create figure with secondary y-axis
-    fig = make_subplots(
+    return make_subplots(
         rows=2,
         cols=1,
         shared_xaxes=True,
         vertical_spacing=vertical_spacing,
         subplot_titles=(f'{symbol} Price ({timeframe})', 'Volume'),
-        row_width=[price_volume_ratio, volume_ratio]
+        row_width=[price_volume_ratio, 1 - price_volume_ratio]
     )
 
+def _on_subplot(trace, row):
+    """
+    trace placed on the price (row 1) or volume (row 2) subplot the way
+    add_trace on the two-row figure would, without building the grid
+    """
+    axis = '' if row == 1 else str(row)
+    return trace.update(xaxis=f'x{axis}', yaxis=f'y{axis}')
+
+@timed("chart.payload")
+def build_chart_payload(df, support_resistance, trend_data, trendlines=None, max_points=None, x_range=None,
+                        pyramid=None):
+    """
+    Build the data-dependent part of the chart: traces, level lines and
+    their labels, as plain plotly JSON
+
+    The payload does not depend on any styling option, so it can be cached
+    and combined with apply_chart_layout on every presentation change. A
+    BarPyramid of df serves screen-resolution views from its levels.
+    """
+    # Pick the bars to draw: everything, or a screen-resolution summary
+    volume_mean = df['Volume'].mean()
+    if max_points is not None and len(df) > max_points:
+        candles, overlays = downsample_for_display(df, trend_data, max_points, x_range, pyramid)
+        volume_mean = candles['Volume'].mean()  # Aggregated bars sum volume
+        line_trace = go.Scattergl
+    else:
+        lo, hi = visible_window(df, x_range)
+        candles = df.iloc[lo:hi]
+        overlays = {
+            key: (candles['Date'], np.asarray(trend_data[key])[lo:hi])
+            for key in ('sma_fast', 'sma_slow', 'volatility') if key in trend_data
+        }
+        line_trace = go.Scatter
+
+    data = []
+
     # Add candlestick
-    fig.add_trace(
+    data.append(_on_subplot(
         go.Candlestick(
-            x=df['Date'],
-            open=df['Open'],
-            high=df['High'],
-            low=df['Low'],
-            close=df['Close'],
+            x=candles['Date'],
+            open=candles['Open'],
+            high=candles['High'],
+            low=candles['Low'],
+            close=candles['Close'],
             name='OHLC',
             increasing_line_color='#B87333',  # Copper color for up moves
             decreasing_line_color='#8B4513',  # Saddle brown for down moves
         ),
-        row=1,
-        col=1
-    )
+        row=1
+    ))
 
     # Add moving averages
-    fig.add_trace(
-        go.Scatter(
-            x=df['Date'],
-            y=trend_data['sma_fast'],
+    data.append(_on_subplot(
+        line_trace(
+            x=overlays['sma_fast'][0],
+            y=overlays['sma_fast'][1],
             name='Fast MA',
             line=dict(color='#DAA520', width=1)  # Golden rod color
         ),
-        row=1,
-        col=1
-    )
+        row=1
+    ))
 
-    fig.add_trace(
-        go.Scatter(
-            x=df['Date'],
-            y=trend_data['sma_slow'],
+    data.append(_on_subplot(
+        line_trace(
+            x=overlays['sma_slow'][0],
+            y=overlays['sma_slow'][1],
             name='Slow MA',
             line=dict(color='#CD853F', width=1)  # Peru color
         ),
-        row=1,
-        col=1
-    )
+        row=1
+    ))
 
-    # Add support lines with labels
-    for i, level in enumerate(support_resistance['support']):
-        fig.add_hline(
-            y=level,
-            line_dash="dash",
-            line_color="#228B22",  # Forest green
-            opacity=0.5,
-            row=1,
-            col=1,
-            annotation_text=f"Support {i+1}",
-            annotation_position="left"
-        )
+    # Add support and resistance lines with labels, written as the shapes
+    # and annotations add_hline would create (it costs ~50ms per line)
+    shapes = []
+    annotations = []
+    for side, color in (('support', '#228B22'), ('resistance', '#8B0000')):  # Forest green, dark red
+        for i, level in enumerate(support_resistance[side]):
+            shapes.append({
+                'line': {'color': color, 'dash': 'dash'},
+                'opacity': 0.5,
+                'type': 'line',
+                'x0': 0,
+                'x1': 1,
+                'xref': 'x domain',
+                'y0': float(level),
+                'y1': float(level),
+                'yref': 'y'
+            })
+            annotations.append({
+                'showarrow': False,
+                'text': f"{side.title()} {i+1}",
+                'x': 0,
+                'xanchor': 'right',
+                'xref': 'x domain',
+                'y': float(level),
+                'yanchor': 'middle',
+                'yref': 'y'
+            })
 
-    # Add resistance lines with labels
-    for i, level in enumerate(support_resistance['resistance']):
-        fig.add_hline(
-            y=level,
-            line_dash="dash",
-            line_color="#8B0000",  # Dark red
-            opacity=0.5,
-            row=1,
-            col=1,
-            annotation_text=f"Resistance {i+1}",
-            annotation_position="left"
-        )
+    # Add diagonal trendlines, dotted once price has broken through them
+    if trendlines:
+        for side, color in (('support', '#228B22'), ('resistance', '#8B0000')):
+            for i, line in enumerate(trendlines.get(f'{side}_lines', [])):
+                data.append(_on_subplot(
+                    go.Scatter(
+                        x=[line['x0'], line['x1']],
+                        y=[line['y0'], line['y1']],
+                        mode='lines',
+                        name=f"{side.title()} Trendline {i+1} ({line['touches']} touches)",
+                        line=dict(color=color, width=2, dash='dot' if line['broken'] else 'solid')
+                    ),
+                    row=1
+                ))
 
     # Add volume bars with steampunk colors
-    colors = ['#8B4513' if close < open else '#B87333' for close, open in zip(df['Close'], df['Open'])]
-    fig.add_trace(
+    colors = np.where(candles['Close'].to_numpy() < candles['Open'].to_numpy(), '#8B4513', '#B87333')
+    data.append(_on_subplot(
         go.Bar(
-            x=df['Date'],
-            y=df['Volume'],
+            x=candles['Date'],
+            y=candles['Volume'],
             name='Volume',
             marker_color=colors,
             opacity=0.7
         ),
-        row=2,
-        col=1
-    )
+        row=2
+    ))
 
     # Add volatility as a line on volume subplot
-    if 'volatility' in trend_data:
-        fig.add_trace(
-            go.Scatter(
-                x=df['Date'],
-                y=trend_data['volatility'] * df['Volume'].mean(),
+    if 'volatility' in overlays:
+        data.append(_on_subplot(
+            line_trace(
+                x=overlays['volatility'][0],
+                y=overlays['volatility'][1] * volume_mean,
                 name='Volatility',
                 line=dict(color='#9370DB', width=1)  # Medium purple
             ),
-            row=2,
-            col=1
-        )
+            row=2
+        ))
+
+    return {
+        'data': go.Figure(data=data).to_plotly_json()['data'],
+        'shapes': shapes,
+        'annotations': annotations
+    }
+
+@timed("chart.layout")
+def apply_chart_layout(payload, symbol, timeframe="1d", chart_height=900, price_volume_ratio=0.7,
+                       vertical_spacing=0.1, grid_style={'color': '#483C32', 'width': 1, 'dash': 'dot'},
+                       as_dict=False):
+    """
+    Combine a chart payload with the presentation settings
+
+    Only the layout is built here, so changing height, spacing or grid
+    style never touches the traces. With as_dict=True the figure is
+    returned as a plotly JSON dict that st.plotly_chart accepts.
+    """
+    # Validate and adjust input parameters
+    chart_height = max(600, min(1500, chart_height))  # Limit height between 600-1500px
+    price_volume_ratio = max(0.5, min(0.9, price_volume_ratio))  # Limit ratio between 0.5-0.9
+    vertical_spacing = max(0.05, min(0.2, vertical_spacing))  # Limit spacing between 0.05-0.2
+
+    base = _styled_layout(timeframe, chart_height, price_volume_ratio, vertical_spacing,
+                          grid_style['color'], grid_style['width'], grid_style.get('dash', 'solid'))
+
+    # Only the titles name the symbol, so the cached layout is shared by all
+    titles = [dict(base['annotations'][0], text=f'{symbol} Price ({timeframe})')] + base['annotations'][1:]
+    layout = dict(
+        base,
+        title=dict(base['title'], text=f"{symbol} Technical Analysis ({timeframe})"),
+        shapes=payload['shapes'],
+        annotations=titles + payload['annotations']
+    )
+    if as_dict:
+        return {'data': payload['data'], 'layout': layout}
+    return go.Figure(data=payload['data'], layout=layout)
+
+@lru_cache(maxsize=64)
+def _styled_layout(timeframe, chart_height, price_volume_ratio, vertical_spacing,
+                   grid_color, grid_width, grid_dash):
+    """
+    Layout JSON for one combination of styling options, built on an empty
+    figure and shared read-only between reruns; apply_chart_layout fills
+    in the symbol
+    """
+    fig = _subplots('', timeframe, price_volume_ratio, vertical_spacing)
 
     # Update layout with steampunk theme
     fig.update_layout(
         xaxis_rangeslider_visible=False,
         height=chart_height,
         showlegend=True,
-        title_text=f"{symbol} Technical Analysis ({timeframe})",
+        title_text=f"Technical Analysis ({timeframe})",
         title_x=0.5,
         yaxis_title="Price",
         yaxis2_title="Volume",
@@ -151,19 +255,19 @@ def create_price_chart(df, symbol, support_resistance, trend_data, timeframe="1d
     # Update axes with steampunk grid style
     fig.update_xaxes(
         showgrid=True,
-        gridwidth=grid_style['width'],
-        gridcolor=grid_style['color'],
-        griddash=grid_style.get('dash', 'solid'),
+        gridwidth=grid_width,
+        gridcolor=grid_color,
+        griddash=grid_dash,
         linecolor='#B87333',  # Copper color for axis lines
         tickfont=dict(family="Copperplate Gothic")
     )
     fig.update_yaxes(
         showgrid=True,
-        gridwidth=grid_style['width'],
-        gridcolor=grid_style['color'],
-        griddash=grid_style.get('dash', 'solid'),
+        gridwidth=grid_width,
+        gridcolor=grid_color,
+        griddash=grid_dash,
         linecolor='#B87333',  # Copper color for axis lines
         tickfont=dict(family="Copperplate Gothic")
     )
 
-    return fig
\ No newline at end of file
+    return fig.layout.to_plotly_json()
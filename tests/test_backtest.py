@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.backtest import backtest_grid, backtest_series, pool_results
+from modules.indicators import classify_trend
+
+DIRECTIONS = {
+    'Strong Uptrend': 1, 'Uptrend': 1,
+    'Strong Downtrend': -1, 'Downtrend': -1,
+    'Sideways': 0, 'High Volatility Sideways': 0,
+}
+
+
+def random_walk(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+
+def reference_counts(close: np.ndarray, fast: int, slow: int, volatility_window: int, horizon: int) -> dict:
+    """
+    One grid row computed bar by bar with pandas and classify_trend
+    """
+    close = pd.Series(close)
+    sma_fast = close.rolling(fast).mean()
+    sma_slow = close.rolling(slow).mean()
+    volatility = close.pct_change().rolling(volatility_window).std()
+    # Mean of the volatility seen so far, not of the whole series
+    running_mean = volatility.expanding().mean()
+    forward = close.shift(-horizon) / close - 1
+
+    counts = dict.fromkeys(['signals', 'hits', 'total_return',
+                            'strong_signals', 'strong_hits', 'strong_total_return'], 0.0)
+    for i in range(len(close)):
+        if np.isnan(forward[i]):
+            continue
+        label = classify_trend(close[i], sma_fast[i], sma_slow[i], volatility[i], running_mean[i])
+        direction = DIRECTIONS[label]
+        if direction == 0:
+            continue
+        returned = direction * forward[i]
+        prefixes = ['', 'strong_'] if volatility[i] > running_mean[i] else ['']
+        for prefix in prefixes:
+            counts[f'{prefix}signals'] += 1
+            counts[f'{prefix}hits'] += returned > 0
+            counts[f'{prefix}total_return'] += returned
+    return counts
+
+
+@pytest.mark.parametrize("horizon", [1, 5])
+def test_matches_pandas_reference(horizon):
+    close = random_walk(400)
+    result = backtest_series(close, [5, 10], [20, 30], [5, 15], horizon=horizon)
+    assert len(result) == 8
+    for row in result.itertuples():
+        expected = reference_counts(close, row.fast, row.slow, row.volatility_window, horizon)
+        assert row.signals == expected['signals']
+        assert row.hits == expected['hits']
+        assert row.strong_signals == expected['strong_signals']
+        assert row.strong_hits == expected['strong_hits']
+        assert row.total_return == pytest.approx(expected['total_return'], abs=1e-9)
+        assert row.strong_total_return == pytest.approx(expected['strong_total_return'], abs=1e-9)
+        assert row.hit_rate == pytest.approx(expected['hits'] / expected['signals'])
+
+
+def test_skips_pairs_with_fast_not_below_slow():
+    result = backtest_series(random_walk(100), [10, 20], [10, 20], [5])
+    assert result[['fast', 'slow']].values.tolist() == [[10, 20]]
+
+
+def test_grid_pools_symbols():
+    series = {'A': random_walk(300, seed=1), 'B': random_walk(300, seed=2)}
+    results = backtest_grid(series, [5], [20], [10])
+    pooled = pool_results(results)
+    assert results['symbol'].tolist() == ['A', 'B']
+    assert pooled['signals'].iloc[0] == results['signals'].sum()
+    assert pooled['hit_rate'].iloc[0] == pytest.approx(results['hits'].sum() / results['signals'].sum())
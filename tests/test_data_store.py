@@ -0,0 +1,103 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.data_store import OHLCVStore
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OHLCVStore(str(tmp_path))
+
+
+def daily_bars(start: str, periods: int, close: float = 100.0) -> pd.DataFrame:
+    dates = pd.date_range(start, periods=periods, freq="D", tz="America/New_York")
+    values = close + np.arange(periods, dtype=np.float64)
+    return pd.DataFrame({
+        'Date': dates, 'Open': values, 'High': values + 1, 'Low': values - 1, 'Close': values,
+        'Volume': np.full(periods, 1000.0)
+    })
+
+
+def test_append_load_round_trip(store):
+    df = daily_bars("2024-01-01", 30)
+    store.append("AAPL", "1d", df, datetime(2024, 1, 1), datetime(2024, 1, 30, 23, 59))
+    loaded = store.load("AAPL", "1d")
+    assert (loaded['Date'] == df['Date']).all()
+    assert str(loaded['Date'].dt.tz) == "America/New_York"
+    pd.testing.assert_frame_equal(loaded[COLUMNS], df[COLUMNS])
+
+
+def test_load_restricts_to_wall_clock_range(store):
+    df = daily_bars("2024-01-01", 30)
+    store.append("AAPL", "1d", df, datetime(2024, 1, 1), datetime(2024, 1, 30, 23, 59))
+    loaded = store.load("AAPL", "1d", datetime(2024, 1, 10), datetime(2024, 1, 12, 23, 59))
+    assert loaded['Date'].dt.day.tolist() == [10, 11, 12]
+
+
+def test_coverage_and_missing_ranges(store):
+    store.append("AAPL", "1d", daily_bars("2024-01-01", 10), datetime(2024, 1, 1), datetime(2024, 1, 10))
+    store.append("AAPL", "1d", daily_bars("2024-01-20", 10), datetime(2024, 1, 20), datetime(2024, 1, 29))
+    assert store.covered_ranges("AAPL", "1d") == [
+        (datetime(2024, 1, 1), datetime(2024, 1, 10)),
+        (datetime(2024, 1, 20), datetime(2024, 1, 29)),
+    ]
+    assert store.missing_ranges("AAPL", "1d", datetime(2023, 12, 1), datetime(2024, 2, 1)) == [
+        (datetime(2023, 12, 1), datetime(2024, 1, 1)),
+        (datetime(2024, 1, 10), datetime(2024, 1, 20)),
+        (datetime(2024, 1, 29), datetime(2024, 2, 1)),
+    ]
+    assert store.missing_ranges("AAPL", "1d", datetime(2024, 1, 2), datetime(2024, 1, 9)) == []
+
+    # Filling the gap merges the covered ranges
+    store.append("AAPL", "1d", daily_bars("2024-01-11", 9), datetime(2024, 1, 10), datetime(2024, 1, 20))
+    assert store.covered_ranges("AAPL", "1d") == [(datetime(2024, 1, 1), datetime(2024, 1, 29))]
+    assert len(store.load("AAPL", "1d")) == 29
+
+
+def test_newer_bars_win_on_overlap(store):
+    store.append("AAPL", "1d", daily_bars("2024-01-01", 10), datetime(2024, 1, 1), datetime(2024, 1, 10))
+    store.append("AAPL", "1d", daily_bars("2024-01-06", 10, close=500.0), datetime(2024, 1, 6), datetime(2024, 1, 15))
+    loaded = store.load("AAPL", "1d")
+    assert len(loaded) == 15
+    assert loaded['Date'].is_monotonic_increasing
+    assert loaded['Close'].iloc[4] == 104.0
+    assert loaded['Close'].iloc[5] == 500.0
+
+
+def test_empty_fetch_records_no_coverage(store):
+    store.append("NOPE", "1d", pd.DataFrame(), datetime(2024, 1, 1), datetime(2024, 1, 10))
+    assert not store.has_data("NOPE", "1d")
+    assert store.covered_ranges("NOPE", "1d") == []
+
+
+def test_revision_changes_when_interior_bars_are_rewritten(store):
+    store.append("AAPL", "1d", daily_bars("2024-01-01", 10), datetime(2024, 1, 1), datetime(2024, 1, 10))
+    before = store.load("AAPL", "1d")
+    revised = daily_bars("2024-01-03", 3, close=1.0)
+    store.append("AAPL", "1d", revised, datetime(2024, 1, 3), datetime(2024, 1, 5))
+    after = store.load("AAPL", "1d")
+    assert after['Close'].iloc[-1] == before['Close'].iloc[-1]
+    assert after.attrs['store_revision'] != before.attrs['store_revision']
+
+
+def test_symbols_stay_inside_the_root(store, tmp_path):
+    df = daily_bars("2024-01-01", 5)
+    for symbol in ("BRK/B", "../../escape"):
+        store.append(symbol, "1d", df, datetime(2024, 1, 1), datetime(2024, 1, 5))
+        assert len(store.load(symbol, "1d")) == 5
+    assert not (tmp_path.parent.parent / "ESCAPE").exists()
+    with pytest.raises(ValueError):
+        store.load("..", "1d")
+
+
+def test_clear(store):
+    store.append("AAPL", "1d", daily_bars("2024-01-01", 5), datetime(2024, 1, 1), datetime(2024, 1, 5))
+    store.append("MSFT", "1d", daily_bars("2024-01-01", 5), datetime(2024, 1, 1), datetime(2024, 1, 5))
+    store.clear("AAPL")
+    assert not store.has_data("AAPL", "1d")
+    assert store.has_data("MSFT", "1d")
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.indicators import TrendEngine
+from modules.technical_analysis import calculate_trend
+
+
+def random_walk(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    return pd.DataFrame({
+        'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close, 'Volume': 1000.0
+    })
+
+
+def assert_same_trend(expected: dict, actual: dict):
+    for name in ('sma_fast', 'sma_slow', 'volatility'):
+        np.testing.assert_allclose(actual[name].to_numpy(), expected[name].to_numpy(), rtol=1e-9, atol=1e-12)
+    assert actual['trend'] == expected['trend']
+
+
+@pytest.mark.parametrize("timeframe", ["1m", "5m", "1d"])
+def test_engine_matches_calculate_trend(timeframe):
+    df = random_walk(500)
+    expected = calculate_trend(df, timeframe)
+    actual = TrendEngine.from_frame(df, timeframe).result(index=df.index)
+    assert_same_trend(expected, actual)
+
+
+@pytest.mark.parametrize("timeframe", ["1m", "1d"])
+def test_engine_matches_calculate_trend_with_missing_closes(timeframe):
+    df = random_walk(600, seed=1)
+    close = df['Close'].to_numpy(copy=True)
+    close[::37] = np.nan
+    close[300:305] = np.nan
+    df['Close'] = close
+    expected = calculate_trend(df, timeframe)
+    actual = TrendEngine.from_frame(df, timeframe).result(index=df.index)
+    assert_same_trend(expected, actual)
+
+
+@pytest.mark.parametrize("timeframe", ["1m", "1d"])
+def test_engine_matches_calculate_trend_with_zero_closes(timeframe):
+    df = random_walk(600, seed=2)
+    close = df['Close'].to_numpy(copy=True)
+    # A zero close, two in a row, and one next to a missing close
+    close[100] = 0.0
+    close[250:252] = 0.0
+    close[400] = 0.0
+    close[401] = np.nan
+    df['Close'] = close
+    expected = calculate_trend(df, timeframe)
+    actual = TrendEngine.from_frame(df, timeframe).result(index=df.index)
+    assert_same_trend(expected, actual)
+
+
+def test_replacing_the_last_close_matches_a_recompute():
+    df = random_walk(200, seed=3)
+    engine = TrendEngine.from_frame(df.iloc[:-1])
+    engine.update(1.0)
+    engine.update(float(df['Close'].iloc[-1]), replace_last=True)
+    assert len(engine) == len(df)
+    assert_same_trend(calculate_trend(df), engine.result(index=df.index))
+
+
+def test_result_tail():
+    df = random_walk(200, seed=4)
+    expected = calculate_trend(df)
+    actual = TrendEngine.from_frame(df).result(index=df.index[-10:], tail=10)
+    np.testing.assert_allclose(actual['sma_slow'].to_numpy(), expected['sma_slow'].iloc[-10:].to_numpy())
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.resampler import OHLCV_AGGREGATIONS, resample_ohlcv
+
+# pandas rule and offset equivalent to each timeframe's buckets
+PANDAS_RULES = {
+    '5m': ('5min', None),
+    '15m': ('15min', None),
+    '1h': ('1h', '30min'),
+    '1d': ('1D', None),
+    '1mo': ('MS', None),
+}
+
+
+def minute_bars(days: int = 70, tz: str = None, seed: int = 0) -> pd.DataFrame:
+    """
+    Regular-session one-minute bars on business days, so buckets have gaps
+    """
+    sessions = pd.bdate_range("2024-01-02", periods=days)
+    dates = pd.DatetimeIndex(np.concatenate([
+        pd.date_range(day + pd.Timedelta(hours=9, minutes=30), periods=390, freq="min").to_numpy()
+        for day in sessions
+    ]))
+    if tz is not None:
+        dates = dates.tz_localize(tz)
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, len(dates))))
+    spread = rng.uniform(0, 0.002, len(dates)) * close
+    return pd.DataFrame({
+        'Date': dates,
+        'Open': close + rng.normal(0, 0.1, len(dates)),
+        'High': close + spread,
+        'Low': close - spread,
+        'Close': close,
+        'Volume': rng.integers(1, 1000, len(dates)).astype(np.float64)
+    })
+
+
+def pandas_resample(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    rule, offset = PANDAS_RULES[timeframe]
+    aggregations = {column: how for column, how in OHLCV_AGGREGATIONS.items() if column in df.columns}
+    resampler = df.set_index('Date').resample(rule, offset=offset)
+    expected = resampler.agg(aggregations)
+    # Buckets without source bars are dropped rather than filled
+    expected = expected[resampler['Close'].count() > 0]
+    return expected.reset_index()
+
+
+@pytest.mark.parametrize("timeframe", list(PANDAS_RULES))
+@pytest.mark.parametrize("tz", [None, "America/New_York"])
+def test_matches_pandas_resample(timeframe, tz):
+    df = minute_bars(tz=tz)
+    actual = resample_ohlcv(df, timeframe)
+    expected = pandas_resample(df, timeframe)
+    assert len(actual) == len(expected)
+    assert (pd.DatetimeIndex(actual['Date']) == pd.DatetimeIndex(expected['Date'])).all()
+    for column in ('Open', 'High', 'Low', 'Close', 'Volume'):
+        np.testing.assert_allclose(actual[column].to_numpy(), expected[column].to_numpy(), rtol=1e-12)
+
+
+def test_empty_frame():
+    df = minute_bars(days=1).iloc[:0]
+    assert resample_ohlcv(df, '5m').empty